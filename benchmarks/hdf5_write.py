@@ -0,0 +1,58 @@
+"""
+Benchmark of the time taken to write the HDF5 file of a session, against
+the number of trials and the sampling rate of its measurement.
+
+Sessions are run in a simulation (mouseberry.sim), so that long sessions
+take little time to generate; the writes themselves are timed on the
+real clock.
+
+Usage
+---------
+python -m benchmarks.hdf5_write [max_n_trials]
+"""
+
+import sys
+
+from mouseberry.sim.core import Simulation
+from benchmarks.session import run_session
+
+
+def benchmark_write(n_trials=(10, 50, 200), sampling_rates=(100, 1000),
+                    layouts=('vlen', 'flat', 'packed'), t_trial=1.):
+    """Times Data.write_hdf5() for simulated sessions of each number of
+    trials, sampling rate and measurement layout.
+
+    Returns
+    -----------
+    results : list of dict
+        For each session: its parameters, the number of samples
+        written, the write time (s) and the file size (bytes).
+    """
+    results = []
+    for layout in layouts:
+        for sampling_rate in sampling_rates:
+            for _n_trials in n_trials:
+                with Simulation():
+                    exp, events, msmt = run_session(
+                        sampling_rate, n_trials=_n_trials, t_trial=t_trial,
+                        msment_layout=layout)
+                results.append({
+                    'layout': layout,
+                    'sampling_rate': sampling_rate,
+                    'n_trials': _n_trials,
+                    'n_samples': sum(msmt.n_samples),
+                    't_write_s': exp.timings['write_hdf5'][0],
+                    'file_size_bytes': exp.file_size,
+                })
+    return results
+
+
+if __name__ == '__main__':
+    max_n_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    _n_trials = [n for n in (10, 50, 200, 1000) if n <= max_n_trials]
+
+    for result in benchmark_write(n_trials=_n_trials):
+        print(f"{result['layout']}, {result['sampling_rate']}Hz, "
+              f"{result['n_trials']} trials: "
+              f"{result['t_write_s']*1e3:.1f}ms "
+              f"({result['file_size_bytes']/1e6:.2f}MB)")
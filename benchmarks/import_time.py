@@ -0,0 +1,86 @@
+"""
+Benchmark of the time taken to import mouseberry and its modules, each
+in a fresh interpreter, and of the heavy dependencies each import loads.
+
+Usage
+---------
+python -m benchmarks.import_time [n_repeats]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+TARGETS = ['mouseberry',
+           'mouseberry.groups.core',
+           'mouseberry.tools.pulses',
+           'mouseberry.eventtypes.audio',
+           'mouseberry.eventtypes.pi_io',
+           'mouseberry.data.load']
+
+HEAVY_DEPS = ['numpy', 'h5py', 'scipy', 'sounddevice', 'picamera',
+              'RPi', 'pigpio', 'paramiko']
+
+_SNIPPET = """
+import json, sys, time
+_t = time.perf_counter()
+try:
+    import {target}
+    _error = None
+except Exception as e:
+    _error = repr(e)
+_t = time.perf_counter() - _t
+print(json.dumps({{'t': _t, 'error': _error,
+                  'deps': [dep for dep in {deps!r} if dep in sys.modules]}}))
+"""
+
+
+def time_import(target, n_repeats=5):
+    """Imports target in n_repeats fresh interpreters.
+
+    Returns
+    -----------
+    result : dict
+        Median and minimum import time (ms), the heavy dependencies
+        loaded, and the import error if the import failed (eg
+        RPi.GPIO missing off the Pi).
+    """
+    _root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    _env = dict(os.environ)
+    _env['PYTHONPATH'] = _root
+    if 'PYTHONPATH' in os.environ:
+        _env['PYTHONPATH'] += os.pathsep + os.environ['PYTHONPATH']
+
+    runs = []
+    for ind in range(n_repeats):
+        _out = subprocess.run(
+            [sys.executable, '-c',
+             _SNIPPET.format(target=target, deps=HEAVY_DEPS)],
+            capture_output=True, text=True, env=_env, check=True).stdout
+        runs.append(json.loads(_out.splitlines()[-1]))
+
+    _t = np.array([run['t'] for run in runs]) * 1e3
+    return {'target': target,
+            'median_ms': float(np.median(_t)),
+            'min_ms': float(np.min(_t)),
+            'deps': runs[-1]['deps'],
+            'error': runs[-1]['error']}
+
+
+def benchmark_imports(targets=TARGETS, n_repeats=5):
+    """Times the import of each of targets. See time_import().
+    """
+    return [time_import(target, n_repeats) for target in targets]
+
+
+if __name__ == '__main__':
+    n_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for result in benchmark_imports(n_repeats=n_repeats):
+        if result['error'] is not None:
+            print(f"{result['target']}: {result['error']}")
+            continue
+        print(f"{result['target']}: {result['median_ms']:.1f}ms "
+              f"(loads {', '.join(result['deps']) or 'no heavy deps'})")
@@ -0,0 +1,145 @@
+"""
+Runs all benchmarks headless, on mock hardware, and saves the results as
+JSON (with the commit and machine they were run on), so that runs can be
+compared across commits and machines.
+
+Usage
+---------
+python -m benchmarks.run_all [--out results.json] [--quick]
+    [--compare old_results.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import h5py
+import numpy as np
+
+from benchmarks.trigger_latency import measure_trigger_latency
+from benchmarks.session import benchmark_sessions, distribution
+from benchmarks.hdf5_write import benchmark_write
+from benchmarks.import_time import benchmark_imports
+
+
+def machine_info():
+    """Returns the commit of the repository and a description of the
+    machine and software the benchmarks run on.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'commit': commit,
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'n_cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'h5py': h5py.__version__}
+
+
+def run_all(quick=False):
+    """Runs every benchmark and returns the results as a dict.
+    """
+    if quick is True:
+        _n_imports, _n_triggers, _n_trials_session = 3, 200, 5
+        _n_trials_write, _sampling_rates = (10, 50), (100, 1000)
+    else:
+        _n_imports, _n_triggers, _n_trials_session = 10, 1000, 20
+        _n_trials_write, _sampling_rates = (10, 50, 200), (100, 1000, 5000)
+
+    results = {'machine': machine_info(),
+               'import_time': benchmark_imports(n_repeats=_n_imports),
+               'trigger_latency_us': {}}
+    for worker_pool, label in [(False, 'thread_per_event'),
+                               (True, 'worker_pool')]:
+        results['trigger_latency_us'][label] = distribution(
+            measure_trigger_latency(worker_pool, _n_triggers))
+
+    results['sessions'] = benchmark_sessions(
+        sampling_rates=_sampling_rates, n_trials=_n_trials_session)
+    results['hdf5_write'] = benchmark_write(
+        n_trials=_n_trials_write, sampling_rates=_sampling_rates[:2])
+    return results
+
+
+def _key_metrics(results):
+    """Flattens the main metrics of results into {name: value}.
+    """
+    metrics = {}
+    for result in results.get('import_time', []):
+        if result['error'] is None:
+            metrics[f"import {result['target']} (median ms)"] = \
+                result['median_ms']
+    for label, dist in results['trigger_latency_us'].items():
+        metrics[f'trigger latency, {label} (median us)'] = dist['median']
+    for session in results['sessions']:
+        _label = f"session {session['sampling_rate']}Hz"
+        metrics[f'{_label}: onset error (median us)'] = \
+            session['onset_error_us']['median']
+        metrics[f'{_label}: onset error (p99 us)'] = \
+            session['onset_error_us']['p99']
+        metrics[f'{_label}: achieved rate (median Hz)'] = \
+            session['achieved_rate_hz']['median']
+        metrics[f'{_label}: trial overhead (median us)'] = sum(
+            dist['median'] for dist in session['trial_overhead_us'].values())
+    for write in results['hdf5_write']:
+        _label = (f"write {write['layout']}, {write['sampling_rate']}Hz, "
+                  f"{write['n_trials']} trials (ms)")
+        metrics[_label] = write['t_write_s'] * 1e3
+    return metrics
+
+
+def compare(old, new):
+    """Prints the main metrics of two sets of results side by side.
+    """
+    _old, _new = _key_metrics(old), _key_metrics(new)
+    print(f"old: {old['machine']['commit']} on {old['machine']['host']}")
+    print(f"new: {new['machine']['commit']} on {new['machine']['host']}")
+    for name in _new:
+        if name not in _old:
+            continue
+        _ratio = _new[name] / _old[name] if _old[name] != 0 else np.nan
+        print(f'{name}: {_old[name]:.1f} -> {_new[name]:.1f} '
+              f'(x{_ratio:.2f})')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs all benchmarks and '
+                                     'saves the results as JSON.')
+    parser.add_argument('--out', default=None,
+                        help='Output file. Defaults to '
+                        'bench_{commit}_{host}.json.')
+    parser.add_argument('--quick', action='store_true',
+                        help='Runs fewer trials and triggers.')
+    parser.add_argument('--compare', default=None,
+                        help='Previous results to compare to.')
+    args = parser.parse_args()
+
+    results = run_all(quick=args.quick)
+
+    fname = args.out
+    if fname is None:
+        _commit = results['machine']['commit'] or 'nocommit'
+        fname = f"bench_{_commit[:8]}_{results['machine']['host']}.json"
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results saved in {fname}.', file=sys.stderr)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    else:
+        for name, value in _key_metrics(results).items():
+            print(f'{name}: {value:.1f}')
@@ -0,0 +1,202 @@
+"""
+Benchmark of the timing of whole sessions on mock hardware (real clock):
+scheduled vs actual event onsets, achieved vs requested sampling rate,
+and the bookkeeping overhead of each trial.
+
+Usage
+---------
+python -m benchmarks.session [n_trials]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from mouseberry.groups.core import Event, TrialType, Experiment
+from mouseberry.eventtypes.mock import MeasurementMock
+
+# real clock, also under a simulation (see benchmarks.hdf5_write)
+_perf_counter = time.perf_counter
+
+
+def distribution(x, scale=1e6):
+    """Summarizes a distribution of durations (s) as a dict, with
+    values in units of 1/scale s (us by default).
+    """
+    x = np.asarray(x, dtype=np.float64) * scale
+    if len(x) == 0:
+        return {'n': 0}
+    return {'n': len(x),
+            'mean': float(np.mean(x)),
+            'std': float(np.std(x)),
+            'min': float(np.min(x)),
+            'median': float(np.median(x)),
+            'p90': float(np.percentile(x, 90)),
+            'p99': float(np.percentile(x, 99)),
+            'max': float(np.max(x))}
+
+
+class BenchEvent(Event):
+    """Event with a fixed start time, which does nothing for t_dur and
+    records its scheduling latency and onset error.
+    """
+    def __init__(self, name, t_start, t_dur=0.):
+        super().__init__(name=name)
+        self.t_start = t_start
+        self.t_dur = t_dur
+        self.latencies = []
+        self.onset_errors = []
+
+    def on_assign_tstart(self):
+        return self.t_start
+
+    def on_trigger(self):
+        self.latencies.append(self._logged_t_latency)
+        self.onset_errors.append(self._logged_t_start - self._t_start)
+        if self.t_dur > 0:
+            time.sleep(self.t_dur)
+
+
+class BenchMeasurement(MeasurementMock):
+    """MeasurementMock which records the number of samples, the achieved
+    sampling rate and the sampling intervals of each trial.
+    """
+    def __init__(self, name, sampling_rate):
+        super().__init__(name=name, sampling_rate=sampling_rate)
+        self.n_samples = []
+        self.rates = []
+        self.intervals = []
+
+    def on_stop(self):
+        super().on_stop()
+        _t = np.array(self.t)
+        self.n_samples.append(len(_t))
+        if len(_t) > 1:
+            self.rates.append((len(_t) - 1) / (_t[-1] - _t[0]))
+            self.intervals.append(np.diff(_t))
+
+
+class TimedExperiment(Experiment):
+    """Experiment which times its per-trial bookkeeping and its HDF5
+    write (on the real clock) in .timings, and stores the size of its
+    file in .file_size (bytes).
+    """
+    _timed = ['_start_curr_trial', '_end_curr_trial', '_prepare_trial']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = {name: [] for name in self._timed
+                        + ['store_trial', 'write_hdf5']}
+        for name in self._timed:
+            setattr(self, name, self._timer(getattr(self, name), name))
+
+    def _timer(self, method, name):
+        def timed(*args, **kwargs):
+            _t = _perf_counter()
+            result = method(*args, **kwargs)
+            self.timings[name].append(_perf_counter() - _t)
+            return result
+        return timed
+
+    def _start_experiment(self):
+        super()._start_experiment()
+        self.data.store_attrs_from_curr_trial = self._timer(
+            self.data.store_attrs_from_curr_trial, 'store_trial')
+        self.data.write_hdf5 = self._timer(self.data.write_hdf5,
+                                           'write_hdf5')
+
+    def _write_file(self):
+        super()._write_file()
+        self.file_size = os.path.getsize(self.data.fname)
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    """Runs the block in a temporary working directory (for the data/
+    and log/ folders of experiments), with console reports hidden.
+    """
+    _cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                yield folder
+        finally:
+            os.chdir(_cwd)
+
+
+def run_session(sampling_rate, n_trials=10, n_events=4, t_trial=0.5,
+                iti=0.2, **exp_kwargs):
+    """Runs a session of n_trials on mock hardware, with n_events evenly
+    spaced over t_trial seconds, and a MeasurementMock sampled at
+    sampling_rate.
+
+    Returns
+    -----------
+    exp : TimedExperiment
+    events : list of BenchEvent
+    msmt : BenchMeasurement
+    """
+    events = [BenchEvent(f'ev{ind}', t_start=ind * t_trial / n_events)
+              for ind in range(n_events)]
+    msmt = BenchMeasurement('bench_msmt', sampling_rate=sampling_rate)
+    ttype = TrialType('bench', p=1, events=events)
+
+    exp = TimedExperiment(n_trials=n_trials, iti=iti, mouse='bench',
+                          exp_cond=f'_{sampling_rate}Hz', **exp_kwargs)
+    with scratch_dir():
+        exp.run(ttype, msmt)
+    return exp, events, msmt
+
+
+def benchmark_sessions(sampling_rates=(100, 1000, 5000), n_trials=10,
+                       **exp_kwargs):
+    """Runs one session per sampling rate, and summarizes its timing.
+
+    Returns
+    -----------
+    results : list of dict
+        For each session: the distributions of scheduling latencies
+        and onset errors (us), the achieved sampling rates (Hz) and
+        sampling intervals (us), and the duration of each step of
+        per-trial bookkeeping (us).
+    """
+    results = []
+    for sampling_rate in sampling_rates:
+        exp, events, msmt = run_session(sampling_rate, n_trials=n_trials,
+                                        **exp_kwargs)
+        results.append({
+            'sampling_rate': sampling_rate,
+            'n_trials': n_trials,
+            'scheduling_latency_us': distribution(
+                np.concatenate([ev.latencies for ev in events])),
+            'onset_error_us': distribution(
+                np.concatenate([ev.onset_errors for ev in events])),
+            'achieved_rate_hz': distribution(msmt.rates, scale=1),
+            'sampling_interval_us': distribution(
+                np.concatenate(msmt.intervals)),
+            'trial_overhead_us': {
+                name: distribution(timings)
+                for name, timings in exp.timings.items()
+                if name != 'write_hdf5'},
+        })
+    return results
+
+
+if __name__ == '__main__':
+    n_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for result in benchmark_sessions(n_trials=n_trials):
+        _onset = result['onset_error_us']
+        _rate = result['achieved_rate_hz']
+        _overhead = sum(timings['median'] for timings
+                        in result['trial_overhead_us'].values())
+        print(f"{result['sampling_rate']}Hz: "
+              f"onset error median {_onset['median']:.1f}us, "
+              f"p99 {_onset['p99']:.1f}us; "
+              f"achieved rate {_rate['median']:.1f}Hz; "
+              f"trial overhead {_overhead:.0f}us")
@@ -0,0 +1,115 @@
+"""
+Benchmark of the latency between Event.trigger() and the logged start
+time of the event (._logged_t_start), comparing a new thread per event
+with dispatch onto the Experiment worker pool.
+
+Usage
+---------
+python -m benchmarks.trigger_latency [n_triggers]
+"""
+
+import sys
+import time
+import numpy as np
+from types import SimpleNamespace
+
+from mouseberry.groups.core import Event, TrialType, Experiment
+
+
+class _QuietReporter(object):
+    """Stand-in for Reporter() which discards all messages.
+    """
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+    def tabin(self):
+        pass
+
+    def tabout(self):
+        pass
+
+
+class _NullEvent(Event):
+    """Event with a constant start time and an empty trigger.
+    """
+    def __init__(self, name):
+        super().__init__(name=name)
+
+    def on_assign_tstart(self):
+        return 0
+
+    def on_trigger(self):
+        pass
+
+
+def _setup_exp(worker_pool, n_events=4):
+    """Builds an Experiment with a single TrialType, without running it.
+    """
+    events = [_NullEvent(name=f'ev{ind}') for ind in range(n_events)]
+    ttype = TrialType(name='bench', p=1, events=events)
+
+    exp = Experiment(n_trials=1, iti=0, worker_pool=worker_pool)
+    exp._parse_run_args([ttype])
+    exp.reporter = _QuietReporter()
+    exp._setup_workers()
+
+    exp._curr_ttype = ttype
+    ttype._t_start_trial_abs = time.time()
+    ttype.measurements = SimpleNamespace()
+    return exp, events
+
+
+def measure_trigger_latency(worker_pool, n_triggers=1000):
+    """Measures trigger-to-start latency for a number of triggers.
+
+    Parameters
+    -----------
+    worker_pool : bool
+        Whether events are dispatched onto a worker pool (True)
+        or onto a new thread per trigger (False).
+    n_triggers : int
+        Number of triggers to measure.
+
+    Returns
+    -----------
+    latency : np.ndarray
+        Latency of each trigger (s).
+    """
+    exp, events = _setup_exp(worker_pool)
+    t_trial_start = exp._curr_ttype._t_start_trial_abs
+
+    latency = np.empty(n_triggers)
+    for ind in range(n_triggers):
+        event = events[ind % len(events)]
+        event.trial_start()
+        event._logged_t_latency = 0
+
+        _t_trigger = time.time()
+        event.trigger()
+        event._trigger_thread.join()
+        latency[ind] = event._logged_t_start + t_trial_start - _t_trigger
+
+    if exp._workers is not None:
+        exp._workers.stop()
+    return latency
+
+
+def _summarize(latency):
+    return (f'median {np.median(latency)*1e6:.1f}us, '
+            f'p99 {np.percentile(latency, 99)*1e6:.1f}us, '
+            f'max {np.max(latency)*1e6:.1f}us')
+
+
+if __name__ == '__main__':
+    n_triggers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    for worker_pool, label in [(False, 'thread per event'),
+                               (True, 'worker pool')]:
+        latency = measure_trigger_latency(worker_pool, n_triggers)
+        print(f'{label}: {_summarize(latency)}')
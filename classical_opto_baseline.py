@@ -1,6 +1,5 @@
 import mouseberry as mb
 import time
-import scipy.stats
 
 # Trialtypes
 # *****************************
@@ -37,7 +36,7 @@ trial_none.add_end_time(2)
 
 # experiment
 # ***************************
-tdist_iti = mb.TimeDist(t_dist=scipy.stats.norm,
+tdist_iti = mb.TimeDist(t_dist=mb.dists.norm,
                         t_args={'scale': 2},
                         t_min=0.1)
 meas = mb.Lickometer(name='licks', pin_in=10, pin_led=[11, 9],
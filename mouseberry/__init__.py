@@ -1,10 +1,62 @@
+"""
+mouseberry: behavioral experiments on the Raspberry Pi.
+
+Classes and modules are imported lazily, when first accessed (eg mb.Tone
+imports mouseberry.eventtypes.audio, and mb.dists mouseberry.tools.dists),
+so that importing mouseberry, or a single module of it, only loads the
+dependencies it needs.
+"""
+
+import importlib
 import os
 
-from .groups.core import *
-from .eventtypes.audio import Tone
-from .tools.time import pick_time, TimeDist
+# name -> module defining it
+_lazy_attrs = {
+    'Event': 'mouseberry.groups.core',
+    'Measurement': 'mouseberry.groups.core',
+    'BufferedMeasurement': 'mouseberry.groups.core',
+    'TrialType': 'mouseberry.groups.core',
+    'Experiment': 'mouseberry.groups.core',
+    'Tone': 'mouseberry.eventtypes.audio',
+    'pick_time': 'mouseberry.tools.time',
+    'TimeDist': 'mouseberry.tools.time',
+    'Scheduler': 'mouseberry.tools.scheduler',
+    'SleepScheduler': 'mouseberry.tools.scheduler',
+    'HybridScheduler': 'mouseberry.tools.scheduler',
+    'Session': 'mouseberry.data.load',
+    'Video': 'mouseberry.video.core',
+    'ROI': 'mouseberry.video.roi',
+}
 
 if os.uname()[4].startswith('arm'):
-    from .video.core import Video
-    from .eventtypes.pi_io import *
-    from .eventtypes.aversive import Looming
+    _lazy_attrs.update({
+        'RewardSolenoid': 'mouseberry.eventtypes.pi_io',
+        'RewardStepper': 'mouseberry.eventtypes.pi_io',
+        'GenericStim': 'mouseberry.eventtypes.pi_io',
+        'Lickometer': 'mouseberry.eventtypes.pi_io',
+        'Looming': 'mouseberry.eventtypes.aversive',
+    })
+
+# name -> module
+_lazy_modules = {name: f'mouseberry.{name}' for name in
+                 ['data', 'eventtypes', 'groups', 'sim', 'tools', 'video']}
+_lazy_modules['dists'] = 'mouseberry.tools.dists'
+
+__all__ = list(_lazy_attrs)
+
+
+def __getattr__(name):
+    if name in _lazy_attrs:
+        value = getattr(importlib.import_module(_lazy_attrs[name]), name)
+    elif name in _lazy_modules:
+        value = importlib.import_module(_lazy_modules[name])
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute '
+                             f'{name!r}')
+    globals()[name] = value  # later accesses skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attrs)
+                  | set(_lazy_modules))
@@ -0,0 +1,203 @@
+"""
+Aggregation of summary statistics across many session files.
+"""
+
+import os
+import glob
+import pickle
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from mouseberry.data.load import Session
+
+__all__ = ['summarize_session', 'aggregate_sessions']
+
+# Default windows for a classical conditioning trial (cue, then reward),
+# with cues named tone* and rewards rew* (eg tone_sm, rew_sm). Other
+# events, such as opto stimuli, can occur in between.
+# Bounds are event names, times (s), markers ('rank', k) or ('prefix', s),
+# or None (trial end). See Session.window_bound().
+DEFAULT_WINDOWS = {'baseline': (0., ('prefix', 'tone')),
+                   'anticipatory': (('prefix', 'tone'), ('prefix', 'rew')),
+                   'consumption': (('prefix', 'rew'), None)}
+
+
+def summarize_session(fname, msmt='licks', windows=None):
+    """Computes per-trialtype summaries of a binary measurement
+    (eg licks) in a set of windows of each trial.
+
+    Parameters
+    -----------
+    fname : str
+        Path to the session file.
+    msmt : str
+        Name of the measurement.
+    windows : dict (optional)
+        Maps the name of each window to its (start, end) bounds.
+        Defaults to DEFAULT_WINDOWS.
+
+    Returns
+    -----------
+    rows : list
+        One dict per trialtype, plus one for all trials (trialtype '*').
+        For each window, holds the mean onset rate ('rate_{window}', Hz),
+        mean number of onsets ('n_{window}') and fraction of trials
+        with at least one onset ('p_{window}').
+    """
+    if windows is None:
+        windows = DEFAULT_WINDOWS
+
+    rows = []
+    with Session(fname) as sess:
+        _ttypes = list(np.unique(sess.trials['name']))
+
+        for ttype in ['*'] + _ttypes:
+            _ttype_arg = None if ttype == '*' else ttype
+            row = {'fname': os.path.basename(fname),
+                   'mouse_id': str(sess.attrs.get('mouse_id', '')),
+                   'cond': str(sess.attrs.get('cond', '')),
+                   't_experiment': float(sess.attrs.get('t_experiment',
+                                                        np.nan)),
+                   'trialtype': ttype,
+                   'n_trials': int(np.sum(sess.trial_mask(_ttype_arg)))}
+
+            for window, (t_start, t_end) in windows.items():
+                inds, onsets = sess.onsets_between(
+                    msmt, t_start, t_end, trialtype=_ttype_arg)
+                _dur = sess.window_bound(t_end)[inds] \
+                    - sess.window_bound(t_start)[inds]
+                _n = onsets.lengths
+
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    row[f'rate_{window}'] = float(np.mean(_n / _dur)) \
+                        if len(inds) > 0 else np.nan
+                row[f'n_{window}'] = float(np.mean(_n)) \
+                    if len(inds) > 0 else np.nan
+                row[f'p_{window}'] = float(np.mean(_n > 0)) \
+                    if len(inds) > 0 else np.nan
+            rows.append(row)
+    return rows
+
+
+def _summarize_session_safe(fname, msmt, windows):
+    """Wrapper for process pools: returns None for unreadable files
+    (eg sessions still being written).
+    """
+    try:
+        return summarize_session(fname, msmt=msmt, windows=windows)
+    except (OSError, KeyError) as err:
+        logging.warning(f'Skipping {fname}: {err}')
+        return None
+
+
+def aggregate_sessions(folder='data', pattern='mouse*.hdf5', msmt='licks',
+                       windows=None, n_workers=None, cache=True,
+                       fname_csv=None):
+    """Summarizes every session file in a folder, in parallel, into one
+    consolidated table.
+
+    Per-file results are cached (keyed by file modification time and
+    by msmt and windows), so re-running after new sessions arrive only
+    processes the new or modified files.
+
+    Parameters
+    -----------
+    folder : str
+        Folder containing the session files (default 'data').
+    pattern : str
+        Glob pattern of session files within the folder.
+    msmt : str
+        Name of the measurement to summarize.
+    windows : dict (optional)
+        Windows of each trial. See summarize_session().
+    n_workers : int (optional)
+        Number of processes. Defaults to the number of CPUs.
+    cache : bool
+        Whether to read and update the cache file
+        ({folder}/.mb_aggregate_cache.pkl).
+    fname_csv : str (optional)
+        If set, the table is also saved as a csv file.
+
+    Returns
+    -----------
+    table : np.ndarray
+        Structured array with one entry per session and trialtype.
+        (See summarize_session() for the fields.)
+    """
+    if windows is None:
+        windows = DEFAULT_WINDOWS
+
+    fnames = sorted(glob.glob(os.path.join(folder, pattern)))
+    _params = (msmt, repr(sorted(windows.items())))
+
+    # Load cache, and find files which are new or modified
+    # ----------
+    _fname_cache = os.path.join(folder, '.mb_aggregate_cache.pkl')
+    _cache = {}
+    if cache is True and os.path.isfile(_fname_cache):
+        with open(_fname_cache, 'rb') as f:
+            _cache = pickle.load(f)
+
+    _to_process = []
+    for fname in fnames:
+        _entry = _cache.get(fname)
+        if _entry is None or _entry['mtime'] != os.path.getmtime(fname) \
+                or _entry['params'] != _params:
+            _to_process.append(fname)
+
+    # Summarize in a process pool
+    # ----------
+    if len(_to_process) > 0:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            _results = pool.map(_summarize_session_safe, _to_process,
+                                [msmt]*len(_to_process),
+                                [windows]*len(_to_process))
+            for fname, rows in zip(_to_process, _results):
+                if rows is not None:
+                    _cache[fname] = {'mtime': os.path.getmtime(fname),
+                                     'params': _params,
+                                     'rows': rows}
+
+        if cache is True:
+            with open(_fname_cache, 'wb') as f:
+                pickle.dump(_cache, f)
+
+    rows = [row for fname in fnames if fname in _cache
+            for row in _cache[fname]['rows']]
+    table = _rows_to_table(rows)
+
+    if fname_csv is not None:
+        _save_csv(table, fname_csv)
+    return table
+
+
+def _rows_to_table(rows):
+    """Converts a list of dicts with the same keys to a structured array.
+    """
+    if len(rows) == 0:
+        return np.empty(0, dtype=[('fname', 'U1')])
+
+    _dtype = []
+    for key, val in rows[0].items():
+        if isinstance(val, str):
+            _max_len = max(len(row[key]) for row in rows)
+            _dtype.append((key, f'U{max(_max_len, 1)}'))
+        elif isinstance(val, int):
+            _dtype.append((key, np.int64))
+        else:
+            _dtype.append((key, np.float64))
+
+    table = np.empty(len(rows), dtype=_dtype)
+    for ind, row in enumerate(rows):
+        table[ind] = tuple(row[key] for key, _ in _dtype)
+    return table
+
+
+def _save_csv(table, fname):
+    """Saves a structured array as a csv file with a header.
+    """
+    _fmts = ['%s' if table.dtype[key].kind == 'U' else '%.10g'
+             for key in table.dtype.names]
+    np.savetxt(fname, table, delimiter=',', fmt=_fmts,
+               header=','.join(table.dtype.names), comments='')
@@ -0,0 +1,153 @@
+"""
+Preallocated storage for measurements.
+"""
+
+import numpy as np
+
+__all__ = ['MeasurementBuffer']
+
+
+class MeasurementBuffer(object):
+    """Preallocated ring buffer storing the times and values of a
+    measurement as typed NumPy arrays.
+
+    Memory is allocated once, when the buffer is created, and reused
+    for every trial after .reset(). If more than .capacity datapoints are
+    appended in a trial, the oldest ones are overwritten.
+
+    The buffer has a single writer (the measurement thread) and any
+    number of readers. The writer stores a datapoint before publishing
+    it by incrementing the datapoint count, so readers never see a
+    partially-written datapoint and no lock is needed.
+
+    Parameters
+    -----------
+    capacity : int
+        Maximum number of datapoints stored per trial.
+    data_dtype : np.dtype
+        Dtype of the values. (Default uint8, for binary measurements)
+    t_dtype : np.dtype
+        Dtype of the times. (Default float64)
+    """
+
+    def __init__(self, capacity, data_dtype=np.uint8, t_dtype=np.float64):
+        self.capacity = int(capacity)
+        self._t = np.zeros(self.capacity, dtype=t_dtype)
+        self._data = np.zeros(self.capacity, dtype=data_dtype)
+        self._n_written = 0
+
+        # Running count of onsets (0 -> 1 transitions), up to and
+        # including each datapoint. Allows O(log n) windowed counts.
+        self._cum_onsets = np.zeros(self.capacity, dtype=np.int64)
+        self._n_onsets = 0
+        self._prev_datum = None
+
+    def __len__(self):
+        return min(self._n_written, self.capacity)
+
+    @property
+    def n_dropped(self):
+        """Number of datapoints overwritten since the last reset.
+        """
+        return max(self._n_written - self.capacity, 0)
+
+    @property
+    def n_onsets(self):
+        """Number of onsets (0 -> 1 transitions) since the last reset.
+        """
+        return self._n_onsets
+
+    def reset(self):
+        """Empties the buffer, without reallocating it.
+        """
+        self._n_written = 0
+        self._n_onsets = 0
+        self._prev_datum = None
+
+    def append(self, t, datum):
+        """Appends a datapoint. Must only be called from a single thread.
+
+        Parameters
+        -----------
+        t : float
+            Time of the datapoint.
+        datum : int or float
+            Value of the datapoint.
+        """
+        _ind = self._n_written % self.capacity
+        if self._prev_datum is not None and datum > 0.5 \
+                and self._prev_datum < 0.5:
+            self._n_onsets += 1
+        self._prev_datum = datum
+
+        self._t[_ind] = t
+        self._data[_ind] = datum
+        self._cum_onsets[_ind] = self._n_onsets
+        self._n_written += 1  # publish only after the write
+
+    @property
+    def t(self):
+        """Times of all stored datapoints, in order.
+        """
+        return self._view(self._t, self._n_written)
+
+    @property
+    def data(self):
+        """Values of all stored datapoints, in order.
+        """
+        return self._view(self._data, self._n_written)
+
+    def views(self):
+        """Returns times and values with a matching number of datapoints.
+
+        Returns
+        -----------
+        t : np.ndarray
+            Times of all stored datapoints.
+        data : np.ndarray
+            Values of all stored datapoints.
+        """
+        _n_written = self._n_written
+        return (self._view(self._t, _n_written),
+                self._view(self._data, _n_written))
+
+    def count_onsets(self, t_start, t_end):
+        """Counts the onsets (0 -> 1 transitions) between t_start and
+        t_end, in O(log n) time.
+
+        Gives the same result as mouseberry.data.encoding.count_onsets(),
+        using binary search on the (sorted) times and the running count
+        of onsets rather than scanning the data.
+
+        Parameters
+        -----------
+        t_start : float
+            Start of the window (s)
+        t_end : float
+            End of the window (s)
+
+        Returns
+        -----------
+        n_onsets : int
+            Number of onsets in the window.
+        """
+        _n_written = self._n_written
+        _t = self._view(self._t, _n_written)
+        ind_start, ind_end = np.searchsorted(_t, [t_start, t_end])
+        ind_start = max(ind_start, 1)  # onsets need a preceding datum
+        if ind_end <= ind_start:
+            return 0
+
+        _cum_onsets = self._view(self._cum_onsets, _n_written)
+        return int(_cum_onsets[ind_end-1] - _cum_onsets[ind_start-1])
+
+    def _view(self, array, n_written):
+        """Returns a zero-copy view of the first n_written datapoints
+        if the buffer has not wrapped around. Otherwise, returns an
+        ordered copy of the last .capacity datapoints.
+        """
+        if n_written <= self.capacity:
+            return array[:n_written]
+
+        _ind = n_written % self.capacity
+        return np.concatenate((array[_ind:], array[:_ind]))
@@ -2,6 +2,7 @@
 Data storage functions for hdf5
 """
 
+import getpass
 import os
 import time
 from types import SimpleNamespace
@@ -9,6 +10,10 @@ import numpy as np
 import h5py
 
 from mouseberry.tools.filesys import prepare_folder
+from mouseberry.data.ragged import RaggedArray
+from mouseberry.data.encoding import (encode_t_us, decode_t_us,
+                                      pack_binary, unpack_binary)
+from mouseberry.groups.plan import plan_to_hdf5
 
 
 class Data():
@@ -21,6 +26,34 @@ class Data():
     parent : Experiment class instance
         The parent class of the Data class instance, which should be an
           Experiment instance.
+    folder_name : str
+        Folder in which to store the hdf5 file.
+    stream : bool
+        If False, the hdf5 file is written by .write_hdf5() once the
+        experiment is over. If True, the file is created at the start of
+        the experiment, each trial is appended to it (and flushed) by
+        .store_attrs_from_curr_trial(), and the trial is then released
+        from memory. The layout of the file is the same in both cases.
+    msment_layout : str
+        Layout of measurements in the hdf5 file.
+        - 'vlen' (default): t and data are variable-length datasets with
+        one row per trial.
+        - 'flat': t and data are flat datasets holding all trials
+        back-to-back, with an offsets index marking the start of each trial
+        (see mouseberry.data.ragged.RaggedArray). All trials are written
+        in a single call per dataset.
+        - 'packed': as 'flat', with t stored as int32 differences in
+        microseconds, and the data of binary measurements bit-packed
+        (see mouseberry.data.encoding). read_measurement() decodes it.
+    compression : str (optional)
+        Compression filter of the measurement datasets in the 'flat' and
+        'packed' layouts: 'gzip', 'lzf' or 'none'. Defaults to 'gzip'
+        for 'packed', and 'none' for 'flat' (whose files Session can
+        memory-map).
+    event_groups : bool
+        If True, the attributes of each event of each trial are also
+        stored in a group trial{ind_trial}/{event}. All attributes are
+        always stored in the columnar event table (trials/events/table).
 
     Info
     --------
@@ -45,6 +78,9 @@ class Data():
         self.trials.events[trial_ind]
             .ex_event.t_start
             .ex_event.t_end
+            .ex_event.t_latency
+            .ex_event.n_{ex_measurement}  # onsets during the event
+            .ex_event.rate_{ex_measurement}  # onset rate during the event
             .ex_trial.ex_parameter  # all params stored
 
     hdf5 file info
@@ -52,7 +88,22 @@ class Data():
     exp : group
     '''
 
-    def __init__(self, parent, folder_name='data'):
+    _trial_attr_dtypes = {'name': h5py.string_dtype(encoding='utf-8'),
+                          't_start': 'f',
+                          't_end': 'f'}
+    _sh_ev_attr_dtypes = {'name': h5py.string_dtype(encoding='utf-8'),
+                          't_start': 'f',
+                          't_end': 'f',
+                          't_latency': 'f'}
+    _str_dtype = h5py.string_dtype(encoding='utf-8')
+
+    _compression_kwargs = {'gzip': {'compression': 'gzip',
+                                    'compression_opts': 4, 'shuffle': True},
+                           'lzf': {'compression': 'lzf', 'shuffle': True},
+                           'none': {}}
+
+    def __init__(self, parent, folder_name='data', stream=False,
+                 msment_layout='vlen', compression=None, event_groups=True):
         self._parent = parent
         assert hasattr(self._parent, 'fname'), ('The parent Experiment class '
                                                 'instance must have a .fname '
@@ -69,6 +120,23 @@ class Data():
         self.store_attrs_from_exp()
         self.setup_trial_attrs()
 
+        assert msment_layout in ['vlen', 'flat', 'packed'], \
+            (f"msment_layout must be 'vlen', 'flat' or 'packed', not "
+             f"{msment_layout}.")
+        self.msment_layout = msment_layout
+
+        if compression is None:
+            compression = 'gzip' if msment_layout == 'packed' else 'none'
+        assert compression in self._compression_kwargs, \
+            (f"compression must be 'gzip', 'lzf' or 'none', not "
+             f"{compression}.")
+        self.compression = compression
+        self.event_groups = event_groups
+
+        self.stream = stream
+        if self.stream is True:
+            self._open_stream()
+
     def store_attrs_from_exp(self):
         """ Stores all relevant attributes located in parent Experiment
         class instance as attributes within Data.
@@ -80,9 +148,18 @@ class Data():
         # self.exp.t_experiment = time.strftime("%Y.%b.%d_%H:%M:",
         #                                       time.localtime(time.time()))
         self.exp.t_experiment = self._parent._t_start_exp
-        self.exp.user = os.getlogin()
+        try:
+            self.exp.user = os.getlogin()
+        except OSError:  # no controlling terminal (eg headless runs)
+            self.exp.user = getpass.getuser()
         self.exp.sysinfo = os.uname()
 
+        if self._parent._plan is not None:
+            if self._parent._plan_seed is not None:
+                self.exp.plan_seed = self._parent._plan_seed
+            if self._parent.block_size is not None:
+                self.exp.plan_block_size = self._parent.block_size
+
     def setup_trial_attrs(self):
         """Setups trial_attrs, including measurement and event attributes, and
         the total number of trials.
@@ -122,14 +199,15 @@ class Data():
 
         # Store measurements
         # ----------------
+        # (copied, since buffered measurements reuse memory every trial)
         curr_msment_keys = curr_trial.measurements.__dict__.keys()
         for msment_key in curr_msment_keys:
             _measure_in_data = getattr(self.trials.measurements,
                                        msment_key)
-            _measure_in_data.t[ind_trial] = getattr(
-                curr_trial.measurements, msment_key).t
-            _measure_in_data.data[ind_trial] = getattr(
-                curr_trial.measurements, msment_key).data
+            _t, _data = getattr(curr_trial.measurements,
+                                msment_key)._views()
+            _measure_in_data.t[ind_trial] = np.array(_t)
+            _measure_in_data.data[ind_trial] = np.array(_data)
 
         # Store event starts and stops
         # ------------------
@@ -151,12 +229,23 @@ class Data():
                     event_attr_val = getattr(curr_event, event_attr)
                     setattr(curr_event_in_data, event_attr, event_attr_val)
 
-            # Log real start and end time
+            # Log real start and end time, and scheduling latency
             curr_event_in_data.t_start = curr_event._logged_t_start
             curr_event_in_data.t_end = curr_event._logged_t_end
+            curr_event_in_data.t_latency = curr_event._logged_t_latency
+
+            # Log measurement stats during the event (eg n_licks, rate_licks)
+            for msmt_name, (n_onsets, rate) in \
+                    curr_event._logged_msmt_stats.items():
+                setattr(curr_event_in_data, f'n_{msmt_name}', n_onsets)
+                setattr(curr_event_in_data, f'rate_{msmt_name}', rate)
+
+        if self.stream is True:
+            self._stream_trial(ind_trial)
 
     def write_hdf5(self):
         """Writes an HDF5 file after an experiment is terminated.
+        (If streaming, closes the already-written file instead.)
 
         Notes on file storage
         ---------------
@@ -165,6 +254,11 @@ class Data():
             /.attrs['n_trials']
             /.attrs['t_experiment']
             /.attrs['user']
+            /.attrs['plan_seed']  # if the experiment has a session plan
+
+        plan[ind_trial] : session plan, if the experiment has one
+            (fields 'trialtype', 'iti', 't_start_{event}', ...;
+            see mouseberry.groups.plan)
 
         trials : group containing trial info, measurements and events.
             trials/name[ind_trial]
@@ -176,19 +270,85 @@ class Data():
             # for shared attributes like t_event_start
             trials/events/t_start[ind_trial, ind_event]
             trials/events/t_end[ind_trial, ind_event]
+            trials/events/t_latency[ind_trial, ind_event]
             trials/events/name[ind_trial, ind_event]
 
-            ** 2. POSIX directory storing attributes
+            ** 2. Columnar event table, one entry per event of each trial
+            # for all attributes, typed by infer_hdf5_dtype()
+            trials/events/table/ind_trial[ind_row]
+            trials/events/table/ind_event[ind_row]
+            trials/events/table/name[ind_row]
+            trials/events/table/t_start[ind_row]
+            trials/events/table/n_ex_meas[ind_row]  # onsets during event
+            trials/events/table/rate_ex_meas[ind_row]
+            trials/events/table/any_attribute[ind_row]
+
+            ** 3. POSIX directory storing attributes (if event_groups)
             # for unique attributes like v_rew, tone_freq
             trial0/l_rew/.attrs['t_start']
             trial0/l_rew/.attrs['t_end']
+            trial0/l_rew/.attrs['t_latency']
             trial0/l_rew/.attrs['name']
             trial0/l_rew/.attrs['any_attribute']
 
             --- Measurement storage ---
+            ** msment_layout = 'vlen'
             trials/measurements/ex_meas/data[ind_trial] : actual data
             trials/measurements/ex_meas/t[ind_trial] : time of each datapoint
+
+            ** msment_layout = 'flat'
+            trials/measurements/ex_meas/data[offsets[i]:offsets[i+1]]
+            trials/measurements/ex_meas/t[offsets[i]:offsets[i+1]]
+            trials/measurements/ex_meas/offsets[ind_trial]
+
+            ** msment_layout = 'packed'
+            As 'flat', with each trial of t encoded by encode_t_us()
+            (int32, us), and each trial of data bit-packed by
+            pack_binary() (uint8, padded to a whole byte), for binary
+            measurements. offsets index the decoded datapoints.
+            trials/measurements/ex_meas/.attrs['t_codec'] : 'delta_us'
+            trials/measurements/ex_meas/.attrs['data_codec'] : 'packbits'
+                or 'raw'
+
+            trials/measurements/ex_meas/.attrs['layout'] : 'vlen', 'flat'
+                or 'packed'
+            trials/measurements/ex_meas/.attrs['encoding'] : 'samples' or
+                'edges' (see mouseberry.data.encoding)
+
+            (read_measurement() reads any layout.)
+        """
+
+        if self.stream is True:
+            # All trials are already on disk; just close the file.
+            self._file.close()
+            return
+
+        with h5py.File(self.fname, 'w') as f:
+            n_trials = self._parent._n_trials_completed
+            self._create_layout(f, n_trials)
+
+            if self.msment_layout in ['flat', 'packed']:
+                self._write_msments_flat(f, n_trials)
+
+            self._write_trials(f, 0, n_trials)
+
+    def _create_layout(self, f, n_trials, resizable=False):
+        """Creates the groups and datasets of the hdf5 file, and stores
+        the experiment attributes. (See .write_hdf5() for the layout.)
+
+        Parameters
+        ------------
+        f : h5py.File
+            File opened for writing.
+        n_trials : int
+            Number of trials to allocate space for.
+        resizable : bool
+            If True, datasets are chunked and can be extended along the
+            trial axis with ._resize_datasets().
         """
+        trials = f.create_group('trials')
+        events = trials.create_group('events')
+        measurements = trials.create_group('measurements')
 
         # Precompute the maximum number of events the TrialTypes possess
         max_n_events = 0
@@ -197,98 +357,354 @@ class Data():
             if _n_events > max_n_events:
                 max_n_events = _n_events
 
-        # Store the file
-        with h5py.File(self.fname, 'w') as f:
-            trials = f.create_group('trials')
-            events = trials.create_group('events')
-            measurements = trials.create_group('measurements')
-
-            n_trials = self._parent._n_trials_completed
+        # Keyword arguments making datasets resizable along the trial axis
+        def _resizable_kwargs(shape):
+            if resizable is False:
+                return {}
+            return {'maxshape': (None,) + shape[1:],
+                    'chunks': (64,) + shape[1:]}
+
+        # Experiment attributes
+        # ------------
+        for attr in self.exp.__dict__.keys():
+            f.attrs[attr] = getattr(self.exp, attr)
+
+        # Session plan
+        # ------------
+        if self._parent._plan is not None:
+            f.create_dataset('plan', data=plan_to_hdf5(self._parent._plan))
+
+        # Measurements
+        # --------------
+        measurement_names = self.trials.measurements.__dict__.keys()
+        measurement_dtype = h5py.vlen_dtype(np.dtype('float64'))
+        for name in measurement_names:
+            msment_in_h5 = measurements.create_group(name)
+            msment_in_h5.attrs['encoding'] = getattr(
+                self._parent.measurements, name).encoding
+            msment_in_h5.attrs['layout'] = self.msment_layout
+            if self.msment_layout == 'packed':
+                msment_in_h5.attrs['t_codec'] = 'delta_us'
+                msment_in_h5.attrs['data_codec'] = 'packbits' \
+                    if self._packs_binary(name) else 'raw'
+
+            if self.msment_layout == 'vlen':
+                for dset_name in ['t', 'data']:
+                    msment_in_h5.create_dataset(
+                        dset_name, (n_trials,), dtype=measurement_dtype,
+                        **_resizable_kwargs((n_trials,)))
+            elif resizable is True:
+                # flat or packed
+                # (if not resizable, written by ._write_msments_flat())
+                _dtypes = self._msment_stored_dtypes(name)
+                for dset_name in ['t', 'data']:
+                    msment_in_h5.create_dataset(
+                        dset_name, (0,), dtype=_dtypes[dset_name],
+                        maxshape=(None,), chunks=(4096,),
+                        **self._compression_kwargs[self.compression])
+                msment_in_h5.create_dataset(
+                    'offsets', (1,), dtype=np.int64,
+                    maxshape=(None,), chunks=(64,))
+
+        # Trial attributes: t_start, etc.
+        # ex: /trials/name[ind_trial]
+        # -----------------
+        for attr_name in self._trial_attr_dtypes.keys():
+            trials.create_dataset(attr_name,
+                                  (n_trials,),
+                                  dtype=self._trial_attr_dtypes[attr_name],
+                                  **_resizable_kwargs((n_trials,)))
+
+        # Event attributes: name, t_event_start, etc.
+        # ex: /trials/events/t_event_start[ind_trial, ind_event]
+        # -----------------
+        for attr_name in self._sh_ev_attr_dtypes.keys():
+            events.create_dataset(attr_name,
+                                  (n_trials, max_n_events),
+                                  dtype=self._sh_ev_attr_dtypes[attr_name],
+                                  fillvalue=None,
+                                  **_resizable_kwargs(
+                                      (n_trials, max_n_events)))
+
+    def _resize_datasets(self, f, n_trials):
+        """Resizes all datasets of a resizable file along the trial axis.
+        """
+        for attr_name in self._trial_attr_dtypes.keys():
+            f[f'trials/{attr_name}'].resize(n_trials, axis=0)
+        for attr_name in self._sh_ev_attr_dtypes.keys():
+            f[f'trials/events/{attr_name}'].resize(n_trials, axis=0)
+        if self.msment_layout == 'vlen':
+            for name in self.trials.measurements.__dict__.keys():
+                for dset_name in ['t', 'data']:
+                    f[f'trials/measurements/{name}/{dset_name}'].resize(
+                        n_trials, axis=0)
+
+    def _write_trials(self, f, ind_start, ind_end):
+        """Writes the attributes, measurements and events of a range of
+        stored trials to an hdf5 file created by ._create_layout().
+
+        Trial attributes, fast-indexing event datasets and the event
+        table are written with one call per dataset for the whole range.
+        """
+        # Trial attributes
+        # -----------------
+        for attr_name in self._trial_attr_dtypes.keys():
+            f[f'trials/{attr_name}'][ind_start:ind_end] = \
+                getattr(self.trials, attr_name)[ind_start:ind_end]
+
+        # Measurements (flat layout is written separately)
+        # --------------
+        if self.msment_layout == 'vlen':
+            for name in self.trials.measurements.__dict__.keys():
+                msment_in_data = getattr(self.trials.measurements, name)
+                msment_in_h5 = f[f'trials/measurements/{name}']
+                for ind_trial in range(ind_start, ind_end):
+                    msment_in_h5['t'][ind_trial] = \
+                        msment_in_data.t[ind_trial]
+                    msment_in_h5['data'][ind_trial] = \
+                        msment_in_data.data[ind_trial]
+
+        # Events
+        # ------------
+        rows = self._event_rows(ind_start, ind_end)
+
+        # 1. Fast indexing: fill a block of [trial, event], write it once
+        for shared_attr in self._sh_ev_attr_dtypes.keys():
+            _dset = f[f'trials/events/{shared_attr}']
+            if h5py.check_string_dtype(_dset.dtype) is not None:
+                _block = np.full((ind_end-ind_start, _dset.shape[1]), '',
+                                 dtype=object)
+            else:
+                _block = np.full((ind_end-ind_start, _dset.shape[1]),
+                                 _dset.fillvalue, dtype=_dset.dtype)
+            for row in rows:
+                _block[row['ind_trial']-ind_start, row['ind_event']] = \
+                    row[shared_attr]
+            _dset[ind_start:ind_end, :] = _block
+
+        # 2. Columnar event table
+        self._append_event_table(f, rows)
+
+        # 3. POSIX directory storing attributes (optional)
+        if self.event_groups is True:
+            for row in rows:
+                _curr_h5 = f.require_group(f'trial{row["ind_trial"]}')\
+                    .create_group(row['name'])
+                for attr, attr_val in row.items():
+                    if attr in ['ind_trial', 'ind_event']:
+                        continue
+                    elif attr in self._sh_ev_attr_dtypes.keys():
+                        _curr_h5.attrs[attr] = attr_val
+                    else:
+                        _curr_h5.attrs[attr] = str(attr_val)
+
+    def _event_rows(self, ind_start, ind_end):
+        """Collects the stored events of a range of trials as a list of
+        rows (dicts), one per event, holding the trial and event indices
+        and all public attributes of the event.
+        """
+        rows = []
+        for ind_trial in range(ind_start, ind_end):
+            _curr_trial = self.trials.events[ind_trial]
+            for ind_event, event_name in enumerate(_curr_trial.__dict__):
+                _curr_event = getattr(_curr_trial, event_name)
+
+                row = {'ind_trial': ind_trial, 'ind_event': ind_event}
+                for attr, attr_val in _curr_event.__dict__.items():
+                    if attr.startswith('_') is False:
+                        row[attr] = attr_val
+                rows.append(row)
+        return rows
+
+    def _append_event_table(self, f, rows):
+        """Appends rows to the columnar event table in
+        trials/events/table, which holds one dataset per event attribute
+        and one entry per event of each trial.
+
+        Columns of numbers (ints or floats) are stored as float64, so
+        that ints and floats can be mixed, and missing values are nan.
+        Other columns are stored as strings ('' if missing). The
+        ind_trial and ind_event columns are int64. New columns are
+        backfilled in the same way for the rows which were already
+        written. A numeric column which later receives other values is
+        converted to strings.
+        """
+        table = f.require_group('trials/events/table')
+        n_rows_old = table.attrs.get('n_rows', 0)
+        n_rows_new = n_rows_old + len(rows)
+
+        # Union of all attributes, in order of first appearance
+        _col_names = list(table.keys())
+        for row in rows:
+            for attr in row.keys():
+                if attr not in _col_names:
+                    _col_names.append(attr)
+
+        for col_name in _col_names:
+            _vals = [row.get(col_name) for row in rows]
+            _dtype = self._column_dtype(col_name, _vals)
+
+            if col_name in table and _dtype == self._str_dtype \
+                    and table[col_name].dtype.kind == 'f':
+                self._widen_to_string(table, col_name)
+
+            if col_name not in table:
+                _fillvalue = np.nan if _dtype == np.float64 else None
+                if self.stream is True:
+                    table.create_dataset(col_name, (n_rows_old,),
+                                         dtype=_dtype, fillvalue=_fillvalue,
+                                         maxshape=(None,), chunks=(256,))
+                else:
+                    table.create_dataset(col_name, (n_rows_new,),
+                                         dtype=_dtype, fillvalue=_fillvalue)
+
+            _dset = table[col_name]
+            if _dset.shape[0] < n_rows_new:
+                _dset.resize(n_rows_new, axis=0)
+            _dset[n_rows_old:n_rows_new] = _to_column(_vals, _dset.dtype)
+
+        table.attrs['n_rows'] = n_rows_new
+
+    def _column_dtype(self, col_name, vals):
+        """Returns the dtype of an event table column for a list of
+        values (None if missing): int64 for ind_trial and ind_event,
+        float64 if all values are numbers, and strings otherwise.
+        """
+        if col_name in ['ind_trial', 'ind_event']:
+            return np.int64
+        if all(val is None or infer_hdf5_dtype(val) in ['f', 'i8']
+               for val in vals):
+            return np.float64
+        return self._str_dtype
+
+    def _widen_to_string(self, table, col_name):
+        """Converts a numeric column of the event table to strings, keeping
+        its values.
+        """
+        _old = table[col_name][()]
+        del table[col_name]
+        _kwargs = {'maxshape': (None,), 'chunks': (256,)} \
+            if self.stream is True else {}
+        table.create_dataset(col_name, data=_to_column(
+            [None if np.isnan(val) else
+             int(val) if float(val).is_integer() else float(val)
+             for val in _old], self._str_dtype), dtype=self._str_dtype,
+            **_kwargs)
+
+    def _msment_data_dtype(self, name):
+        """Returns the dtype of a measurement's data: the dtype of its
+        buffer for BufferedMeasurements, and float64 otherwise.
+        """
+        _msment = getattr(self._parent.measurements, name)
+        if hasattr(_msment, '_buffer'):
+            return _msment._buffer.data.dtype
+        return np.float64
+
+    def _packs_binary(self, name):
+        """Whether the data of a measurement is bit-packed in the 'packed'
+        layout: for binary measurements (which report onset stats) with
+        integer or boolean data.
+        """
+        _msment = getattr(self._parent.measurements, name)
+        return _msment.report_stats is True \
+            and np.dtype(self._msment_data_dtype(name)).kind in 'bu'
 
-            # Experiment attributes
-            # ------------
-            for attr in self.exp.__dict__.keys():
-                f.attrs[attr] = getattr(self.exp, attr)
+    def _msment_stored_dtypes(self, name):
+        """Returns the dtypes of the t and data datasets of a measurement
+        in the 'flat' or 'packed' layout.
+        """
+        if self.msment_layout == 'packed':
+            return {'t': np.int32,
+                    'data': np.uint8 if self._packs_binary(name)
+                    else self._msment_data_dtype(name)}
+        return {'t': np.float64, 'data': self._msment_data_dtype(name)}
+
+    def _encode_trial(self, name, t, data):
+        """Returns the t and data of a trial of a measurement as stored
+        in the 'flat' or 'packed' layout.
+        """
+        _dtypes = self._msment_stored_dtypes(name)
+        if self.msment_layout == 'packed':
+            t = encode_t_us(t)
+            if self._packs_binary(name):
+                data = pack_binary(data)
+        return (np.asarray(t, dtype=_dtypes['t']),
+                np.asarray(data, dtype=_dtypes['data']))
+
+    def _write_msments_flat(self, f, n_trials):
+        """Writes all trials of each measurement with the 'flat' or
+        'packed' layout, in a single call per dataset.
+        """
+        for name in self.trials.measurements.__dict__.keys():
+            msment_in_data = getattr(self.trials.measurements, name)
+            msment_in_h5 = f[f'trials/measurements/{name}']
+            _dtypes = self._msment_stored_dtypes(name)
+
+            _trials = [self._encode_trial(name, msment_in_data.t[ind],
+                                          msment_in_data.data[ind])
+                       for ind in range(n_trials)]
+            _offsets = np.zeros(n_trials+1, dtype=np.int64)
+            np.cumsum([len(_t) for _t in msment_in_data.t[0:n_trials]],
+                      out=_offsets[1:])
+
+            for ind_dset, dset_name in enumerate(['t', 'data']):
+                _values = np.concatenate(
+                    [np.empty(0, dtype=_dtypes[dset_name])]
+                    + [_trial[ind_dset] for _trial in _trials])
+                # (h5py cannot compress empty datasets)
+                _kwargs = self._compression_kwargs[self.compression] \
+                    if len(_values) > 0 else {}
+                msment_in_h5.create_dataset(dset_name, data=_values,
+                                            **_kwargs)
+            msment_in_h5.create_dataset('offsets', data=_offsets)
+
+    def _append_msments_flat(self, f, ind_trial):
+        """Appends a single trial of each measurement to resizable
+        datasets with the 'flat' or 'packed' layout.
+        """
+        for name in self.trials.measurements.__dict__.keys():
+            msment_in_data = getattr(self.trials.measurements, name)
+            msment_in_h5 = f[f'trials/measurements/{name}']
+
+            _trial = self._encode_trial(name, msment_in_data.t[ind_trial],
+                                        msment_in_data.data[ind_trial])
+            for dset_name, _values in zip(['t', 'data'], _trial):
+                _dset = msment_in_h5[dset_name]
+                _ind_start = _dset.shape[0]
+                _dset.resize(_ind_start + len(_values), axis=0)
+                _dset[_ind_start:] = _values
+
+            _offsets = msment_in_h5['offsets']
+            _n_trials = _offsets.shape[0]
+            _offsets.resize(_n_trials+1, axis=0)
+            _offsets[_n_trials] = _offsets[_n_trials-1] \
+                + len(msment_in_data.t[ind_trial])
+
+    def _open_stream(self):
+        """Creates the hdf5 file at the start of the experiment,
+        with datasets which are extended as each trial is stored.
+        """
+        self._file = h5py.File(self.fname, 'w')
+        self._create_layout(self._file, 0, resizable=True)
+        self._n_trials_streamed = 0
+
+    def _stream_trial(self, ind_trial):
+        """Appends a stored trial to the open hdf5 file and flushes it
+        to disk. The trial's measurements and events are then released
+        from memory.
+        """
+        self._n_trials_streamed += 1
+        self._resize_datasets(self._file, self._n_trials_streamed)
+        self._write_trials(self._file, ind_trial, ind_trial+1)
+        if self.msment_layout in ['flat', 'packed']:
+            self._append_msments_flat(self._file, ind_trial)
+        self._file.flush()
 
-            # Measurements
-            # --------------
-            measurement_names = self.trials.measurements.__dict__.keys()
-            measurement_dtype = h5py.vlen_dtype(np.dtype('float64'))
-            for name in measurement_names:
-                msment_in_data = getattr(self.trials.measurements, name)
-                msment_in_h5 = measurements.create_group(name)
-                msment_in_h5.create_dataset('t',
-                                            (n_trials,),
-                                            dtype=measurement_dtype)
-                msment_in_h5.create_dataset('data',
-                                            (n_trials,),
-                                            dtype=measurement_dtype)
-
-                for ind_trial in range(n_trials):
-                    msment_in_h5['t'][ind_trial] \
-                        = msment_in_data.t[ind_trial]
-                    msment_in_h5['data'][ind_trial] \
-                        = msment_in_data.data[ind_trial]
-
-            # Trial attributes
-            # -----------------
-
-            # Fill datasets for trial attributes: t_start, etc.
-            # ex: /trials/name[ind_trial]
-            trial_attr_names = ['name', 't_start', 't_end']
-            trial_attr_dtypes = {'name': h5py.string_dtype(encoding='utf-8'),
-                                 't_start': 'f',
-                                 't_end': 'f'}
-            for ind, attr_name in enumerate(trial_attr_names):
-                trials.create_dataset(attr_name,
-                                      (n_trials,),
-                                      data=getattr(self.trials, attr_name)
-                                      [0:n_trials],
-                                      dtype=trial_attr_dtypes[attr_name])
-
-            # Init datasets for event attributes: name, t_event_start, etc.
-            # ex: /trials/events/t_event_start[ind_trial, ind_event]
-            shared_event_attr_names = ['name', 't_start', 't_end']
-            sh_ev_attr_dtypes = {'name': h5py.string_dtype(encoding='utf-8'),
-                                 't_start': 'f',
-                                 't_end': 'f'}
-            for ind, attr_name in enumerate(shared_event_attr_names):
-                events.create_dataset(attr_name,
-                                      (n_trials, max_n_events),
-                                      dtype=sh_ev_attr_dtypes[attr_name],
-                                      fillvalue=None)
-
-            # Fill datasets for event attributes
-            for ind_trial in range(n_trials):
-                f.create_group(f'trial{ind_trial}')
-                _curr_trial = self.trials.events[ind_trial]
-                _curr_event_names = _curr_trial.__dict__.keys()
-
-                for ind_event, event_name in enumerate(_curr_event_names):
-                    _curr_event = getattr(_curr_trial, event_name)
-                    _curr_h5 = f.create_group(
-                        f'trial{ind_trial}/{_curr_event.name}')
-
-                    for shared_attr in shared_event_attr_names:
-                        shared_attr_val = getattr(_curr_event, shared_attr)
-
-                        # 1. Store fast indexing
-                        f[f'trials/events/{shared_attr}'][ind_trial, ind_event]\
-                            = shared_attr_val
-
-                        # 2. Store POSIX-indexed .attr
-                        _curr_h5.attrs[f'{shared_attr}'] = shared_attr_val
-
-                    # Consider non-shared attrs for events.
-                    _misc_attr_names = list(_curr_event.__dict__.keys())
-
-                    for attr in shared_event_attr_names:
-                        _misc_attr_names.remove(attr)  # rm shared
-
-                    for attr in _misc_attr_names:
-                        if attr.startswith('_') is False:
-                            nonshared_attr_val = getattr(_curr_event, attr)
-                            _curr_h5.attrs[f'{attr}'] = str(nonshared_attr_val)
+        for name in self.trials.measurements.__dict__.keys():
+            msment_in_data = getattr(self.trials.measurements, name)
+            msment_in_data.t[ind_trial] = None
+            msment_in_data.data[ind_trial] = None
+        self.trials.events[ind_trial] = None
 
 
 def infer_hdf5_dtype(val):
@@ -306,13 +722,64 @@ def infer_hdf5_dtype(val):
         calling .create_dataset() in h5py.
     """
 
-    dtype = str(type(val))
-
-    if 'str' in dtype:
+    if isinstance(val, str):
         return h5py.string_dtype(encoding='utf-8')
-    elif 'float' in dtype:
+    elif isinstance(val, (float, np.floating)):
         return 'f'
-    elif 'int' in dtype:
+    elif isinstance(val, (int, np.integer)) and not isinstance(val, bool):
         return 'i8'
-    elif 'numpy' in dtype:
+    elif isinstance(val, np.ndarray):
         return h5py.vlen_dtype(np.dtype('int32'))
+
+
+def _to_column(vals, dtype):
+    """Converts a list of values (None if missing) to an array of a
+    column dtype of the event table.
+    """
+    if h5py.check_string_dtype(dtype) is not None:
+        return np.array(['' if val is None else str(val) for val in vals],
+                        dtype=object)
+
+    _fill = np.nan if dtype.kind == 'f' else 0
+    _col = np.full(len(vals), _fill, dtype=dtype)
+    for ind, val in enumerate(vals):
+        if val is not None:
+            _col[ind] = val
+    return _col
+
+
+def read_measurement(msment_group):
+    """Reads a measurement group written by Data.write_hdf5(), with
+    the 'vlen', 'flat' or 'packed' layout (which is decoded).
+
+    Parameters
+    -----------
+    msment_group : h5py.Group
+        Group of the measurement (eg f['trials/measurements/licks']).
+
+    Returns
+    -----------
+    t : RaggedArray
+        Time of each datapoint. t[ind_trial] is a view, not a copy.
+    data : RaggedArray
+        Value of each datapoint. data[ind_trial] is a view, not a copy.
+    """
+    layout = msment_group.attrs.get('layout', 'vlen')
+
+    if layout == 'flat':
+        offsets = msment_group['offsets'][()]
+        t = RaggedArray(msment_group['t'][()], offsets)
+        data = RaggedArray(msment_group['data'][()], offsets)
+    elif layout == 'packed':
+        offsets = msment_group['offsets'][()]
+        t = RaggedArray(decode_t_us(msment_group['t'][()], offsets),
+                        offsets)
+        _data = msment_group['data'][()]
+        if msment_group.attrs['data_codec'] == 'packbits':
+            _data = unpack_binary(_data, offsets)
+        data = RaggedArray(_data, offsets)
+    else:
+        t = RaggedArray.from_list(msment_group['t'][()], dtype=np.float64)
+        data = RaggedArray.from_list(msment_group['data'][()],
+                                     dtype=np.float64)
+    return t, data
@@ -0,0 +1,216 @@
+"""
+Encodings for binary measurements (eg licks).
+
+Binary measurements can be stored in two ways:
+    'samples' : one datum per sample, taken at a regular sampling rate.
+        data = [0, 0, 1, 1, 1, 0, ...], t = time of each sample
+    'edges' : one datum per change of state, plus the state at the start
+        and at the end of the measurement.
+        data = [0, 1, 0, ...], t = time of each change of state
+
+In both encodings, an onset is a datum of 1 preceded by a datum of 0.
+
+With the 'packed' measurement layout of Data, trials are also compressed
+for storage:
+    t : delta-encoded int32 microseconds (see encode_t_us())
+    data : bit-packed, for binary measurements (see pack_binary())
+"""
+
+import numpy as np
+
+__all__ = ['count_onsets', 'samples_to_edges', 'edges_to_samples',
+           'encode_t_us', 'decode_t_us', 'pack_binary', 'unpack_binary']
+
+
+def count_onsets(t, data, t_start, t_end):
+    """Counts the onsets (0 -> 1 transitions) of a binary measurement
+    occurring between t_start and t_end.
+
+    Works with both the 'samples' and 'edges' encodings.
+
+    Parameters
+    -----------
+    t : np.ndarray
+        Sorted times of each datum (s)
+    data : np.ndarray
+        Binary data
+    t_start : float
+        Start of the window (s)
+    t_end : float
+        End of the window (s)
+
+    Returns
+    -----------
+    n_onsets : int
+        Number of onsets in the window.
+    """
+    ind_start, ind_end = np.searchsorted(t, [t_start, t_end])
+    ind_start = max(ind_start, 1)  # onsets need a preceding datum
+    if ind_end <= ind_start:
+        return 0
+
+    _section = np.asarray(data[ind_start-1:ind_end])
+    return int(np.count_nonzero((_section[1:] > 0.5)
+                                & (_section[:-1] < 0.5)))
+
+
+def samples_to_edges(t, data):
+    """Converts a binary measurement from the 'samples' encoding to
+    the 'edges' encoding.
+
+    Parameters
+    -----------
+    t : np.ndarray
+        Time of each sample (s)
+    data : np.ndarray
+        Binary value of each sample
+
+    Returns
+    -----------
+    t_edges : np.ndarray
+        Time of the first sample, of each change of state, and of
+        the last sample (s)
+    data_edges : np.ndarray
+        State after each change of state
+    """
+    t = np.asarray(t)
+    data = np.asarray(data)
+    if len(data) == 0:
+        return t.copy(), data.copy()
+
+    _inds = np.flatnonzero(np.diff(data)) + 1
+    _inds = np.unique(np.concatenate(([0], _inds, [len(data)-1])))
+    return t[_inds], data[_inds]
+
+
+def edges_to_samples(t, data, sampling_rate, t_end=None):
+    """Converts a binary measurement from the 'edges' encoding to
+    the 'samples' encoding, by sampling its state at a regular rate.
+
+    Parameters
+    -----------
+    t : np.ndarray
+        Time of each change of state (s)
+    data : np.ndarray
+        State after each change of state
+    sampling_rate : float
+        Rate at which to sample the state (Hz)
+    t_end : float (optional)
+        Time of the last sample (s). Defaults to the last time in t.
+
+    Returns
+    -----------
+    t_samples : np.ndarray
+        Time of each sample (s)
+    data_samples : np.ndarray
+        State at each sample
+    """
+    t = np.asarray(t)
+    data = np.asarray(data)
+    if len(data) == 0:
+        return t.copy(), data.copy()
+
+    if t_end is None:
+        t_end = t[-1]
+
+    t_samples = np.arange(t[0], t_end + 0.5/sampling_rate, 1/sampling_rate)
+    _inds = np.searchsorted(t, t_samples, side='right') - 1
+    return t_samples, data[_inds]
+
+
+def encode_t_us(t):
+    """Encodes the times of a trial as int32 differences between
+    consecutive times, in microseconds (the first relative to 0, ie to
+    the start of the trial). Times are rounded to the microsecond.
+
+    Consecutive differences are nearly constant for regularly sampled
+    measurements, so that they compress well.
+
+    Parameters
+    -----------
+    t : np.ndarray
+        Sorted times of a trial (s)
+
+    Returns
+    -----------
+    dt_us : np.ndarray (int32)
+    """
+    _t_us = np.round(np.asarray(t, dtype=np.float64) * 1e6).astype(np.int64)
+    dt_us = np.diff(_t_us, prepend=0)
+    if len(dt_us) > 0 and (dt_us.min() < np.iinfo(np.int32).min
+                           or dt_us.max() > np.iinfo(np.int32).max):
+        raise ValueError('Intervals between times must be shorter than '
+                         '2147s to be encoded as int32 microseconds.')
+    return dt_us.astype(np.int32)
+
+
+def decode_t_us(dt_us, offsets):
+    """Decodes the times of all trials from their concatenated
+    encode_t_us() differences, in a single pass.
+
+    Parameters
+    -----------
+    dt_us : np.ndarray
+        Concatenated encode_t_us() of each trial
+    offsets : np.ndarray
+        Start of each trial in dt_us, and its length (as in RaggedArray)
+
+    Returns
+    -----------
+    t : np.ndarray (float64)
+        Concatenated times of each trial (s)
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    _t_us = np.cumsum(dt_us, dtype=np.int64)
+    # remove the running sum of the preceding trials
+    _sum_before = np.concatenate(([0], _t_us))[offsets[:-1]]
+    _t_us -= np.repeat(_sum_before, np.diff(offsets))
+    return _t_us / 1e6
+
+
+def pack_binary(data):
+    """Packs the binary data of a trial into bits (8 samples per byte).
+
+    Parameters
+    -----------
+    data : np.ndarray
+        Binary data (0 or 1)
+
+    Returns
+    -----------
+    packed : np.ndarray (uint8)
+        ceil(len(data) / 8) bytes.
+    """
+    data = np.asarray(data)
+    if len(data) > 0 and data.max() > 1:
+        raise ValueError('Only binary data (0 or 1) can be bit-packed.')
+    return np.packbits(data.astype(bool))
+
+
+def unpack_binary(packed, offsets):
+    """Unpacks the binary data of all trials from their concatenated
+    pack_binary() bytes, in a single pass.
+
+    Parameters
+    -----------
+    packed : np.ndarray
+        Concatenated pack_binary() of each trial, each padded to a
+        whole byte
+    offsets : np.ndarray
+        Start of each trial in the unpacked data, and its length
+        (as in RaggedArray)
+
+    Returns
+    -----------
+    data : np.ndarray (uint8)
+        Concatenated data of each trial
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    _lengths = np.diff(offsets)
+    _bit_starts = np.zeros(len(_lengths), dtype=np.int64)
+    np.cumsum((_lengths[:-1] + 7) // 8 * 8, out=_bit_starts[1:])
+
+    _bits = np.unpackbits(np.asarray(packed, dtype=np.uint8))
+    _inds = np.arange(offsets[-1]) \
+        + np.repeat(_bit_starts - offsets[:-1], _lengths)
+    return _bits[_inds]
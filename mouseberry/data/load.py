@@ -0,0 +1,386 @@
+"""
+Fast loading and querying of hdf5 files written by Data.write_hdf5().
+"""
+
+import numpy as np
+import h5py
+
+from mouseberry.data.core import read_measurement
+from mouseberry.data.ragged import RaggedArray
+from mouseberry.groups.plan import plan_from_hdf5
+
+__all__ = ['Session']
+
+
+class Session(object):
+    """A session (experiment) file, opened read-only and loaded lazily.
+
+    Datasets are only read when first accessed, and are then cached.
+    Flat, uncompressed measurement datasets are memory-mapped rather
+    than read.
+
+    Parameters
+    -----------
+    fname : str
+        Path to the hdf5 file.
+    mmap : bool
+        Whether to memory-map flat measurement datasets when possible.
+
+    Example
+    -----------
+    >> with Session('data/mouse1_2020.Jul.16_10:00.hdf5') as sess:
+    >>     sess.trials['name']  # trialtype of each trial
+    >>     sess.event_times('tone_sm')  # tone start time in each trial
+    >>     inds, licks = sess.onsets_between('licks', 'tone_sm', 'rew_sm',
+    >>                                       trialtype='trial_sm')
+    >>     licks[0]  # lick onset times between tone and reward, 1st trial
+    """
+
+    def __init__(self, fname, mmap=True):
+        self.fname = fname
+        self.mmap = mmap
+        self._file = h5py.File(fname, 'r')
+        self.attrs = dict(self._file.attrs)
+
+        self._cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def n_trials(self):
+        return self._file['trials/t_start'].shape[0]
+
+    @property
+    def trials(self):
+        """Structured array with one entry per trial.
+
+        Fields
+        -----------
+        ind_trial : int
+        name : str (name of the trialtype)
+        t_start : float (s, from the start of the experiment)
+        t_end : float (s, from the start of the experiment)
+        """
+        if 'trials' not in self._cache:
+            _names = self._file['trials/name'].asstr()[()]
+            _max_len = max([len(name) for name in _names], default=1)
+            trials = np.empty(self.n_trials,
+                              dtype=[('ind_trial', np.int64),
+                                     ('name', f'U{_max_len}'),
+                                     ('t_start', np.float64),
+                                     ('t_end', np.float64)])
+            trials['ind_trial'] = np.arange(self.n_trials)
+            trials['name'] = _names
+            trials['t_start'] = self._file['trials/t_start'][()]
+            trials['t_end'] = self._file['trials/t_end'][()]
+            self._cache['trials'] = trials
+        return self._cache['trials']
+
+    @property
+    def plan(self):
+        """Session plan (see mouseberry.groups.plan), or None if the
+        experiment did not have one.
+        """
+        if 'plan' not in self._file:
+            return None
+        if 'plan' not in self._cache:
+            self._cache['plan'] = plan_from_hdf5(self._file['plan'])
+        return self._cache['plan']
+
+    @property
+    def measurement_names(self):
+        return list(self._file['trials/measurements'].keys())
+
+    def trial_mask(self, trialtype=None):
+        """Boolean mask of trials belonging to one or more trialtypes.
+
+        Parameters
+        -----------
+        trialtype : str or list (optional)
+            Name(s) of trialtypes. If None, all trials are selected.
+        """
+        if trialtype is None:
+            return np.ones(self.n_trials, dtype=bool)
+        if isinstance(trialtype, str):
+            trialtype = [trialtype]
+        return np.isin(self.trials['name'], trialtype)
+
+    def event_column(self, attr):
+        """Reads a column of the event table, with one entry per event
+        of each trial.
+
+        Parameters
+        -----------
+        attr : str
+            Name of the event attribute (eg 'name', 't_start', 'freq').
+            'ind_trial' and 'ind_event' give the trial and event index
+            of each entry.
+        """
+        _key = f'events/{attr}'
+        if _key not in self._cache:
+            if 'trials/events/table' in self._file:
+                _dset = self._file[f'trials/events/table/{attr}']
+                if h5py.check_string_dtype(_dset.dtype) is not None:
+                    _col = _dset.asstr()[()]
+                else:
+                    _col = _dset[()]
+            else:
+                _col = self._event_column_from_matrix(attr)
+            self._cache[_key] = _col
+        return self._cache[_key]
+
+    def _event_column_from_matrix(self, attr):
+        """Builds an event table column from the [trial, event] datasets
+        in trials/events, for files written without an event table.
+        """
+        _names = self._file['trials/events/name'].asstr()[()]
+        _exists = _names != ''
+        if attr == 'ind_trial':
+            return np.nonzero(_exists)[0]
+        elif attr == 'ind_event':
+            return np.nonzero(_exists)[1]
+        elif attr == 'name':
+            return _names[_exists]
+        return self._file[f'trials/events/{attr}'][()][_exists]
+
+    def event_times(self, event, attr='t_start'):
+        """Returns an attribute of an event for every trial.
+
+        Parameters
+        -----------
+        event : str
+            Name of the event.
+        attr : str
+            Name of the attribute (default 't_start', in s from the
+            start of the trial).
+
+        Returns
+        -----------
+        vals : np.ndarray
+            Value for each trial (nan where the event did not occur).
+        """
+        _mask = self.event_column('name') == event
+        vals = np.full(self.n_trials, np.nan)
+        vals[self.event_column('ind_trial')[_mask]] = \
+            self.event_column(attr)[_mask]
+        return vals
+
+    def measurement(self, name):
+        """Returns the times and data of a measurement.
+
+        Parameters
+        -----------
+        name : str
+            Name of the measurement.
+
+        Returns
+        -----------
+        t : RaggedArray
+            Time of each datapoint (s, from the start of the trial).
+            t[ind_trial] is a view.
+        data : RaggedArray
+            Value of each datapoint. data[ind_trial] is a view.
+        """
+        _key = f'measurements/{name}'
+        if _key not in self._cache:
+            _group = self._file[f'trials/measurements/{name}']
+            if self.mmap is True and _group.attrs.get('layout') == 'flat':
+                _offsets = _group['offsets'][()]
+                _t = RaggedArray(self._read_mmap(_group['t']), _offsets)
+                _data = RaggedArray(self._read_mmap(_group['data']),
+                                    _offsets)
+            else:
+                _t, _data = read_measurement(_group)
+            self._cache[_key] = (_t, _data)
+        return self._cache[_key]
+
+    def _read_mmap(self, dset):
+        """Memory-maps a dataset if it is stored contiguously and
+        uncompressed. Otherwise, reads it into memory.
+        """
+        _offset = dset.id.get_offset()
+        if dset.chunks is not None or _offset is None:
+            return dset[()]
+        return np.memmap(self.fname, mode='r', dtype=dset.dtype,
+                         offset=_offset, shape=dset.shape)
+
+    def onsets(self, name):
+        """Returns the onset times (0 -> 1 transitions) of a binary
+        measurement, for every trial.
+
+        Works for both the 'samples' and 'edges' encodings
+        (see mouseberry.data.encoding).
+
+        Parameters
+        -----------
+        name : str
+            Name of the measurement.
+
+        Returns
+        -----------
+        onsets : RaggedArray
+            onsets[ind_trial] holds the onset times of that trial (s).
+        """
+        _key = f'onsets/{name}'
+        if _key not in self._cache:
+            _t, _data = self.measurement(name)
+            _vals = np.asarray(_data.values)
+
+            _is_onset = np.zeros(len(_vals), dtype=bool)
+            _is_onset[1:] = (_vals[1:] > 0.5) & (_vals[:-1] < 0.5)
+            _is_onset[_t.offsets[:-1][_t.lengths > 0]] = False  # trial start
+
+            _counts = np.bincount(_t.row_inds[_is_onset],
+                                  minlength=len(_t))
+            _offsets = np.zeros(len(_t)+1, dtype=np.int64)
+            np.cumsum(_counts, out=_offsets[1:])
+            self._cache[_key] = RaggedArray(
+                np.asarray(_t.values)[_is_onset], _offsets)
+        return self._cache[_key]
+
+    def onsets_between(self, name, t_start, t_end, trialtype=None):
+        """Returns the onsets of a binary measurement within a window
+        of each trial, eg all licks between a tone and a reward.
+
+        Parameters
+        -----------
+        name : str
+            Name of the measurement.
+        t_start : str, float or tuple
+            Start of the window: an event name (its start time is used
+            on each trial), a time from the start of the trial (s), or
+            an event marker, ('rank', k) or ('prefix', s).
+            See window_bound().
+        t_end : str, float, tuple or None
+            End of the window: as for t_start, or None for the end
+            of the trial.
+        trialtype : str or list (optional)
+            Only consider trials of these trialtypes.
+
+        Returns
+        -----------
+        inds_trial : np.ndarray
+            Index of each selected trial (trials of the trialtype(s)
+            in which both window bounds exist).
+        onsets : RaggedArray
+            onsets[i] holds the onset times in the window of trial
+            inds_trial[i] (s, from the start of the trial).
+        """
+        _t_start = self.window_bound(t_start)
+        _t_end = self.window_bound(t_end)
+        _trial_mask = self.trial_mask(trialtype) \
+            & ~np.isnan(_t_start) & ~np.isnan(_t_end)
+        inds_trial = np.flatnonzero(_trial_mask)
+
+        _onsets = self.onsets(name)
+        _rows = _onsets.row_inds
+        _vals = _onsets.values
+        _keep = _trial_mask[_rows] & (_vals >= _t_start[_rows]) \
+            & (_vals < _t_end[_rows])
+
+        # Reindex kept onsets from trial index to selected-trial index
+        _counts = np.bincount(_rows[_keep], minlength=self.n_trials)
+        _offsets = np.zeros(len(inds_trial)+1, dtype=np.int64)
+        np.cumsum(_counts[inds_trial], out=_offsets[1:])
+        return inds_trial, RaggedArray(_vals[_keep], _offsets)
+
+    def nth_event_times(self, n, attr='t_start'):
+        """Returns an attribute of the n-th event (ordered by start time)
+        of every trial, regardless of its name.
+
+        Parameters
+        -----------
+        n : int
+            Rank of the event in the trial (0 for the first event).
+        attr : str
+            Name of the attribute (default 't_start').
+
+        Returns
+        -----------
+        vals : np.ndarray
+            Value for each trial (nan where the trial has fewer events).
+        """
+        _ind_trial = self.event_column('ind_trial')
+        _order = np.lexsort((self.event_column('t_start'), _ind_trial))
+        _ind_trial_sorted = _ind_trial[_order]
+
+        # rank of each event within its trial
+        _first = np.searchsorted(_ind_trial_sorted, _ind_trial_sorted)
+        _rank = np.arange(len(_order)) - _first
+
+        _mask = _rank == n
+        vals = np.full(self.n_trials, np.nan)
+        vals[_ind_trial_sorted[_mask]] = \
+            self.event_column(attr)[_order][_mask]
+        return vals
+
+    def prefix_event_times(self, prefix, attr='t_start'):
+        """Returns an attribute of the first event (by start time) of
+        every trial whose name starts with prefix, eg 'tone' for the
+        tone of each trialtype (tone_sm, tone_lg, ...).
+
+        Parameters
+        -----------
+        prefix : str
+            Start of the event names.
+        attr : str
+            Name of the attribute (default 't_start').
+
+        Returns
+        -----------
+        vals : np.ndarray
+            Value for each trial (nan where no event matches).
+        """
+        _names = np.asarray(self.event_column('name'), dtype=str)
+        _ind_trial = self.event_column('ind_trial')
+        _order = np.lexsort((self.event_column('t_start'), _ind_trial))
+        _order = _order[np.char.startswith(_names[_order], prefix)]
+
+        # first matching event of each trial
+        _inds_trial, _first = np.unique(_ind_trial[_order],
+                                        return_index=True)
+        vals = np.full(self.n_trials, np.nan)
+        vals[_inds_trial] = self.event_column(attr)[_order[_first]]
+        return vals
+
+    def window_bound(self, bound):
+        """Converts a window bound into a time for every trial.
+
+        Parameters
+        -----------
+        bound : str, float, tuple or None
+            - An event name.
+            - A time from the start of the trial (s). Any number, int
+            or float, is a time.
+            - ('rank', k): the k-th event of each trial, by start time
+            (0 for the first event), whatever its name.
+            - ('prefix', s): the first event of each trial whose name
+            starts with s.
+            - None for the end of the trial.
+
+        Returns
+        -----------
+        t : np.ndarray
+            Time of the bound in each trial (s, from the start of the
+            trial; nan where it does not exist).
+        """
+        if bound is None:
+            return self.trials['t_end'] - self.trials['t_start']
+        elif isinstance(bound, str):
+            return self.event_times(bound)
+        elif isinstance(bound, tuple):
+            _kind, _val = bound
+            if _kind == 'rank':
+                return self.nth_event_times(_val)
+            elif _kind == 'prefix':
+                return self.prefix_event_times(_val)
+            raise ValueError(f"Window bound markers are ('rank', k) or "
+                             f"('prefix', s), not {bound}.")
+        return np.full(self.n_trials, float(bound))
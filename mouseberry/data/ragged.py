@@ -0,0 +1,80 @@
+"""
+Ragged arrays: one flat array of values, split into rows by offsets.
+"""
+
+import numpy as np
+
+__all__ = ['RaggedArray']
+
+
+class RaggedArray(object):
+    """A list of 1d arrays of varying length (eg one per trial), stored
+    as a single flat array plus an offsets index (like a CSR matrix).
+
+    Row i is values[offsets[i]:offsets[i+1]], and indexing returns a
+    view of the flat array rather than a copy.
+
+    Parameters
+    -----------
+    values : np.ndarray
+        Flat array of all values, row after row.
+    offsets : np.ndarray
+        Start of each row in values, followed by the total length
+        (len(offsets) = n_rows + 1).
+
+    Example
+    -----------
+    >> licks = RaggedArray.from_list([np.array([0, 1]), np.array([1])])
+    >> licks[0]  # array([0, 1])
+    >> licks.values  # array([0, 1, 1])
+    >> licks.offsets  # array([0, 2, 3])
+    """
+
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_list(cls, arrays, dtype=None):
+        """Builds a RaggedArray by concatenating a list of 1d arrays.
+        """
+        _lengths = np.array([len(array) for array in arrays], dtype=np.int64)
+        offsets = np.zeros(len(arrays)+1, dtype=np.int64)
+        np.cumsum(_lengths, out=offsets[1:])
+
+        if len(arrays) > 0:
+            values = np.concatenate([np.asarray(array) for array in arrays])
+        else:
+            values = np.empty(0)
+        if dtype is not None:
+            values = values.astype(dtype, copy=False)
+        return cls(values, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ind):
+        if ind < 0:
+            ind += len(self)
+        return self.values[self.offsets[ind]:self.offsets[ind+1]]
+
+    def __iter__(self):
+        for ind in range(len(self)):
+            yield self[ind]
+
+    @property
+    def lengths(self):
+        """Length of each row.
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def row_inds(self):
+        """Row index of each value in .values.
+        """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def to_list(self):
+        """Returns a list of views, one per row.
+        """
+        return [row for row in self]
@@ -3,20 +3,13 @@ Classes for generating audio stimuli.
 """
 
 import os
+import numpy as np
 from mouseberry.groups.core import Event
+from mouseberry.tools.audio import get_engine, resolve_engine
 
 __all__ = ['Tone']
 
 
-def _prepare_temp_folder():
-    """Prepares temp folder for sound storage
-    """
-    if os.path.isdir('temp'):
-        return
-    else:
-        os.mkdir('temp')
-
-
 class Tone(Event):
     """Event creating a pure tone of a certain length.
 
@@ -32,9 +25,32 @@ class Tone(Event):
         Frequency of the tone (Hz)
     db : float (default -10)
         Decibels of the tone (dB)
+    hw_sound_dev : int
+        ALSA card of the sound device, on the RPi.
+    engine : str or AudioEngine
+        Audio engine (see mouseberry.tools.audio).
+        - 'auto' (default) uses 'stream' if the sounddevice package and
+        PortAudio are installed, and 'sox' otherwise.
+        - 'stream' synthesizes the tone once as a NumPy buffer, and plays
+        it through an output stream which is kept open during the
+        experiment. Requires the sounddevice package.
+        - 'sox' writes the tone to a .wav file and plays it with the sox
+        `play` binary on every trigger (original behavior).
+        - 'null' plays nothing (eg for testing without a sound device).
+
+    Notes
+    ----------
+    The onset latency of the tone on each trigger (s, from the start of
+    .on_trigger() to the tone reaching the output) is stored as
+    .onset_latency (nan if the engine cannot measure it), and summarized
+    at the end of each experiment.
+
+    The tone is prepared by the engine when the experiment starts.
+    Tones using the same engine and device share it. It is closed at the
+    end of the experiment, once every Tone has released it.
     """
     def __init__(self, name, t_start, t_dur, freq, db=-10,
-                 hw_sound_dev=1):
+                 hw_sound_dev=1, engine='auto'):
         super().__init__(name=name)
         self.t_start = t_start
         self.t_dur = t_dur
@@ -42,13 +58,34 @@ class Tone(Event):
         self.db = db
         self.hw_sound_dev = hw_sound_dev
 
-        _prepare_temp_folder()
-        self.filename = 'temp/' + f'{self.name}.wav'
+        engine = resolve_engine(engine)
+        self._engine = get_engine(engine, device=self._device(engine))
+        self.engine = self._engine.__class__.__name__
+        self._sound = None
+        self._onset_latencies = []
 
-        # create a waveform called self.name from frequency and tone_length
-        os.system(f'sox -V0 -r 44100 -n -b 8 -c 2 '
-                  + f'{self.filename} synth {self.t_dur} '
-                  + f'sin {self.freq} vol {db}dB')
+    def _device(self, engine):
+        """Output device of the engine. The default device is used
+        except on the RPi.
+        """
+        if not os.uname()[4].startswith('arm'):
+            return None
+        if engine == 'stream':
+            return f'hw:{self.hw_sound_dev},0'
+        return self.hw_sound_dev
+
+    def on_exp_start(self):
+        self._onset_latencies = []
+        self._engine.acquire()
+
+        try:
+            self._sound = self._engine.prepare_tone(self.freq, self.t_dur,
+                                                    self.db)
+        except AttributeError:
+            reporter = self._parent._parent.reporter
+            reporter.error((f'Cannot prepare {self.name}. .prepare_tone() '
+                            f'method in {self._engine.__class__} is not '
+                            f'set.'))
 
     def on_assign_tstart(self):
         try:
@@ -57,15 +94,25 @@ class Tone(Event):
             return self.t_start  # float or int class
 
     def on_trigger(self):
-        # send the wav file to the sound card
-        if os.uname()[4].startswith('arm'):
-            os.system(f'AUDIODRIVER=alsa AUDIODEV=hw:{self.hw_sound_dev},0 '
-                      + f'play -V0 -q {self.filename}')
-        else:
-            os.system(f'play -V0 -q {self.filename}')
+        reporter = self._parent._parent.reporter
+
+        try:
+            self.onset_latency = self._engine.play(self._sound)
+        except AttributeError:
+            reporter.error((f'Cannot play {self.name}. .play() method in '
+                            f'{self._engine.__class__} is not set.'))
+            self.onset_latency = np.nan
+        self._onset_latencies.append(self.onset_latency)
+
+        reporter.debug(f'{self.name} onset latency: '
+                       f'{self.onset_latency*1e3:.2f}ms')
 
     def on_cleanup(self):
-        if os.path.isdir('temp'):
-            os.system(f'rm -r temp')
-        else:
-            pass
+        _latencies = np.array(self._onset_latencies, dtype=float)
+        if np.any(~np.isnan(_latencies)):
+            reporter = self._parent._parent.reporter
+            reporter.info(f'{self.name} onset latency: '
+                          f'{np.nanmean(_latencies)*1e3:.2f}ms '
+                          f'(jitter {np.nanstd(_latencies)*1e3:.2f}ms, '
+                          f'n={len(_latencies)})')
+        self._engine.release()
@@ -4,8 +4,7 @@ by another RPi) and for an aversive airpuff.
 """
 
 from mouseberry.groups.core import Event
-import paramiko
-import threading
+from mouseberry.tools.remote import get_client, DEFAULT_CMD
 
 __all__ = ['Looming']
 
@@ -13,7 +12,10 @@ __all__ = ['Looming']
 class Looming(Event):
     """Event for visual looming stimulus.
 
-    Controls a second Raspberry Pi through SSH.
+    Controls a second Raspberry Pi through a persistent connection to a
+    StimulusServer running on it (see mouseberry.tools.remote). The
+    connection is opened once, shared by all Looming events on the same
+    Pi, kept alive and reopened automatically if it drops.
 
     Parameters
     -----------
@@ -28,41 +30,61 @@ class Looming(Event):
     pi_password : str
         Password of the second pi which will run the vid.
     pi_port : int
-        Port for SSH tunneling on the second pi.
+        Port for SSH tunneling on the second pi (transport='ssh'), or
+        of the StimulusServer (transport='socket').
     file_looming : str
         Filepath to the looming stim on the second pi.
+    transport : str
+        - 'ssh' (default): starts the StimulusServer on the second pi
+        through SSH, and talks to it over one persistent SSH channel.
+        Requires mouseberry on the second pi.
+        - 'socket': connects over TCP to a StimulusServer already running
+        on the second pi (python3 -m mouseberry.tools.remote --port ...).
+    player_cmd : str
+        Command playing the stimulus on the second pi, with {file} as
+        placeholder (transport='ssh' only).
+
+    Notes
+    ----------
+    The round-trip time from sending the play request to the second pi
+    confirming that the player started is stored as .onset_latency (s).
     """
 
     def __init__(self, name, t_start=2,
                  pi_hostname='lab.local', pi_username='pi',
                  pi_password='raspberry', pi_port=22,
-                 file_looming='/home/pi/Videos/looming.mp4'):
-        super.__init__(name=name)
+                 file_looming='/home/pi/Videos/looming.mp4',
+                 transport='ssh', player_cmd=DEFAULT_CMD):
+        super().__init__(name=name)
         self.t_start = t_start
         self.pi_hostname = pi_hostname
         self.pi_username = pi_username
         self.pi_password = pi_password
         self.pi_port = pi_port
         self.file_looming = file_looming
+        self.transport = transport
 
-        # Setup an SSH client
-        self.ssh = paramiko.SSHClient()
-        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.ssh.connect(hostname=self.pi_hostname, port=self.pi_port,
-                         username=self.pi_username, password=self.pi_password)
-
-    def send_vid(self):
-        stdin, stdout, stderr = self.ssh.exec_command(
-            f"omxplayer --no-osd -o hdmi {self.file_looming}")
-        opt = stdout.readlines()
-        opt = "".join(opt)
+        # Connect (or reuse a connection), and load the stimulus
+        self._client = get_client(self.pi_hostname, transport=self.transport,
+                                  port=self.pi_port,
+                                  username=self.pi_username,
+                                  password=self.pi_password,
+                                  cmd=player_cmd)
+        self._client.load(self.name, self.file_looming)
 
     def on_trigger(self):
-        self.thread = threading.Thread(target=self.send_vid)
-        self.thread.start()
+        try:
+            self.onset_latency = self._client.play(self.name)
+        except (OSError, RuntimeError) as err:
+            self.onset_latency = float('nan')
+            self._parent._parent.reporter.error(
+                f'{self.name} could not be played: {err}')
 
     def on_assign_tstart(self):
         try:
             return self.t_start()  # TimeDist class
         except TypeError:
             return self.t_start  # float or int class
+
+    def on_cleanup(self):
+        self._client.close()
@@ -1,4 +1,4 @@
-from mouseberry.groups.core import (Event, Measurement)
+from mouseberry.groups.core import (Event, BufferedMeasurement)
 
 from types import SimpleNamespace
 import threading
@@ -7,7 +7,7 @@ import random
 import os
 
 
-class MeasurementMock(Measurement):
+class MeasurementMock(BufferedMeasurement):
     """Mock measurement class for use with MacOS, etc.
 
     Parameters
@@ -16,17 +16,18 @@ class MeasurementMock(Measurement):
         Name for class instance and associated attribute
     sampling_rate : float
         Sampling rate for mock data generation
+    thresh : float
+        Probability of a lick on each sample
+    t_buffer : float
+        Longest storable trial duration (s). See BufferedMeasurement.
     """
 
-    def __init__(self, name, sampling_rate, thresh=0.01):
-        self.name = name
-        self.sampling_rate = sampling_rate
+    def __init__(self, name, sampling_rate, thresh=0.01, t_buffer=600):
+        super().__init__(name=name, sampling_rate=sampling_rate,
+                         t_buffer=t_buffer)
         self.thresh = thresh
 
     def on_start(self):
-        self.data = []
-        self.t = []
-
         self.thread = SimpleNamespace()
         self.thread.stop_signal = threading.Event()
         self.thread.measure = threading.Thread(target=self.measure_loop)
@@ -36,20 +37,21 @@ class MeasurementMock(Measurement):
         _t_meas = time.time()
         while not self.thread.stop_signal.is_set():
 
-            while time.time() < _t_meas + 1/self.sampling_rate:
-                time.sleep(0.0001)
+            # sleep until the next sample, re-checking in case of an
+            # early wake-up
+            _t_next = _t_meas + 1/self.sampling_rate
+            while time.time() < _t_next:
+                time.sleep(max(_t_next - time.time(), 0))
 
             _datum = random.random()
             if _datum < self.thresh:
                 # register lick
-                self.data.append(1)
                 _t_meas = time.time()
-                self.t.append(_t_meas - self.t_start_trial)
+                self._append(_t_meas - self.t_start_trial, 1)
             elif _datum > self.thresh:
                 # register no lick
-                self.data.append(0)
                 _t_meas = time.time()
-                self.t.append(_t_meas - self.t_start_trial)
+                self._append(_t_meas - self.t_start_trial, 0)
 
     def on_stop(self):
         self.thread.stop_signal.set()
@@ -1,8 +1,9 @@
 '''
 Functions to control all GPIO-related inputs and outputs.
 '''
-from mouseberry.groups.core import Event, Measurement
+from mouseberry.groups.core import Event, BufferedMeasurement
 from mouseberry.tools.time import pick_time
+from mouseberry.tools.pulses import step_intervals, make_pulse_backend
 
 import math
 import time
@@ -47,8 +48,9 @@ class GPIOEvent(Event):
                 f'associated to pin {self.pin}')
 
 
-class GPIOMeasurement(Measurement):
-    """Base class for GPIO Measurements (inputs). Inherits from Measurement class.
+class GPIOMeasurement(BufferedMeasurement):
+    """Base class for GPIO Measurements (inputs). Inherits from
+    BufferedMeasurement class.
 
     Parmaeters
     -----------
@@ -58,10 +60,14 @@ class GPIOMeasurement(Measurement):
         Pin of the GPIO measurement
     sampling_rate : float
         Sampling rate of the pin (Hz)
+    t_buffer : float
+        Longest storable trial duration (s). See BufferedMeasurement.
     """
-    def __init__(self, name, pin, sampling_rate, pull_up_down=None):
+    def __init__(self, name, pin, sampling_rate, pull_up_down=None,
+                 t_buffer=600):
         self.pin = pin
-        super().__init__(name=name, sampling_rate=sampling_rate)
+        super().__init__(name=name, sampling_rate=sampling_rate,
+                         t_buffer=t_buffer)
         _GPIOSetupHelper(self.pin, gpio.IN, pull_up_down=pull_up_down)
 
     def __str__(self):
@@ -136,10 +142,30 @@ class RewardStepper(Event):
 
     t_start : float or TimeDist instance
         Delivery time of the reward (seconds)
+
+    step_rate : float
+        Step rate of the motor (steps/s).
+    ramp_steps : int
+        Number of steps over which the step rate ramps up from
+        step_rate/10 at the start of a delivery (and back down at the end).
+        0 (default) for no ramp.
+    backend : str or PulseBackend
+        How step pulses are generated (see mouseberry.tools.pulses).
+        - 'auto' (default): hardware-timed waveforms through the pigpio
+        daemon if it is running, otherwise 'software'.
+        - 'pigpio': hardware-timed waveforms through the pigpio daemon.
+        - 'software': pin writes from Python at precomputed times.
+
+    Notes
+    ----------
+    After each delivery, the number of steps delivered, the duration of
+    the delivery (s) and the corresponding volume (uL) are stored as
+    .n_steps_delivered, .t_delivery and .volume_delivered.
     """
 
     def __init__(self, name, pin_motor_off, pin_step, pin_dir,
-                 pin_not_at_lim, rate, volume, t_start):
+                 pin_not_at_lim, rate, volume, t_start, step_rate=5000,
+                 ramp_steps=0, backend='auto'):
         super().__init__(name=name)
         gpio.setmode(gpio.BCM)
 
@@ -168,6 +194,14 @@ class RewardStepper(Event):
         self.volume = volume
         self.n_steps = int(self.volume * self.rate)
 
+        # Precompute the step waveform of a reward
+        self.step_rate = step_rate
+        self.ramp_steps = ramp_steps
+        self._pulses = make_pulse_backend(backend, output=gpio.output)
+        self.backend = self._pulses.__class__.__name__
+        self._intervals = step_intervals(self.n_steps, self.step_rate,
+                                         ramp_steps=self.ramp_steps)
+
     def on_assign_tstart(self):
         """Returns a t_start for this trial
         """
@@ -181,57 +215,58 @@ class RewardStepper(Event):
         Trigger sequence for the reward
         """
         if gpio.input(self.pin_not_at_lim):
-            gpio.output(self.pin_motor_off, 0)
-            gpio.output(self.pin_dir, 1)
-
-            for step in range(self.n_steps):
-                gpio.output(self.pin_step, 1)
-                time.sleep(0.0001)
-                gpio.output(self.pin_step, 0)
-                time.sleep(0.0001)
-
-            gpio.output(self.pin_motor_off, 1)
+            _n_steps, self.t_delivery = self._step(self._intervals,
+                                                   direction=1)
         else:
+            _n_steps, self.t_delivery = 0, 0.
             print('Motor is at its limit.')
 
-    def refill(self):
-        gpio.output(self.pin_motor_off, 0)
-        gpio.output(self.pin_dir, 0)
+        self.n_steps_delivered = _n_steps
+        self.volume_delivered = _n_steps / self.rate
 
-        for step in range(9600):
-            if gpio.input(self.pin_not_at_lim):
-                gpio.output(self.pin_step, 1)
-                time.sleep(0.0001)
-                gpio.output(self.pin_step, 0)
-                time.sleep(0.0001)
+    def _step(self, intervals, direction):
+        """Enables the motor and steps it in a direction, stopping early
+        if the motor reaches its limit.
 
-        gpio.output(self.pin_motor_off, 1)
-
-    def empty(self):
+        Returns
+        ----------
+        n_steps : int
+            Number of steps delivered.
+        t_duration : float
+            Duration of the steps (s).
+        """
         gpio.output(self.pin_motor_off, 0)
-        gpio.output(self.pin_dir, 1)
+        gpio.output(self.pin_dir, direction)
 
-        for step in range(9600):
-            if gpio.input(self.pin_not_at_lim):
-                gpio.output(self.pin_step, 1)
-                time.sleep(0.0001)
-                gpio.output(self.pin_step, 0)
-                time.sleep(0.0001)
+        try:
+            n_steps, t_duration = self._pulses.run(
+                self.pin_step, intervals,
+                check=lambda: gpio.input(self.pin_not_at_lim))
+        except AttributeError:
+            print(f'Cannot step the motor. .run() method in '
+                  f'{self._pulses.__class__} is not set.')
+            n_steps, t_duration = 0, 0.
 
         gpio.output(self.pin_motor_off, 1)
+        return n_steps, t_duration
 
-    def calibrate(self, n_steps=1000):
-        gpio.output(self.pin_motor_off, 0)
-        gpio.output(self.pin_dir, 1)
+    def refill(self):
+        return self._step(step_intervals(9600, self.step_rate,
+                                         ramp_steps=self.ramp_steps),
+                          direction=0)
 
-        for step in range(n_steps):
-            if gpio.input(self.pin_not_at_lim):
-                gpio.output(self.pin_step, 1)
-                time.sleep(0.0001)
-                gpio.output(self.pin_step, 0)
-                time.sleep(0.0001)
+    def empty(self):
+        return self._step(step_intervals(9600, self.step_rate,
+                                         ramp_steps=self.ramp_steps),
+                          direction=1)
 
-        gpio.output(self.pin_motor_off, 1)
+    def calibrate(self, n_steps=1000):
+        return self._step(step_intervals(n_steps, self.step_rate,
+                                         ramp_steps=self.ramp_steps),
+                          direction=1)
+
+    def on_cleanup(self):
+        self._pulses.close()
 
 
 class GenericStim(GPIOEvent):
@@ -285,13 +320,33 @@ class Lickometer(GPIOMeasurement):
         (LED is turned on before each measurement period, and turned off
         at the end of the measurement period.)
     sampling_rate : float
-        Sampling rate of the pin (Hz)
+        Sampling rate of the pin (Hz). Only used if mode='poll'.
+    mode : str
+        Acquisition mode.
+        - 'poll' (default): the pin is polled at sampling_rate in a
+        background thread, and every sample is stored
+        (.encoding = 'samples').
+        - 'edge': GPIO edge detection calls back on every change of state
+        of the pin, and only the lick onsets and offsets are stored
+        (.encoding = 'edges'). No polling thread is used.
+    bouncetime : int (optional)
+        Debounce period for mode='edge' (ms).
+    t_buffer : float
+        Longest storable trial duration (s). See BufferedMeasurement.
     """
 
-    def __init__(self, name, pin_in, pin_led, sampling_rate):
+    def __init__(self, name, pin_in, pin_led, sampling_rate,
+                 mode='poll', bouncetime=None, t_buffer=600):
         # Setup IR LED out
         super().__init__(name=name, pin=pin_in, sampling_rate=sampling_rate,
-                         pull_up_down=gpio.PUD_DOWN)
+                         pull_up_down=gpio.PUD_DOWN, t_buffer=t_buffer)
+        assert mode in ['poll', 'edge'], \
+            f"mode must be 'poll' or 'edge', not {mode}."
+        self.mode = mode
+        self.bouncetime = bouncetime
+        if self.mode == 'edge':
+            self.encoding = 'edges'
+
         self.pin_led = pin_led
         if type(self.pin_led) is list:
             for _pin in self.pin_led:
@@ -304,7 +359,7 @@ class Lickometer(GPIOMeasurement):
         1. Activates IR-LED for lickometer.
         2. Then starts measuring lickrate for a given frequency.
         3. Lick events and associated times are stored in
-        self.data and self.t.
+        the measurement buffer (self.data and self.t).
         """
         assert hasattr(self, 't_start_trial'), \
             ('.t_start_trial must be set before'
@@ -318,39 +373,80 @@ class Lickometer(GPIOMeasurement):
         elif type(self.pin_led) is int:
             gpio.output(self.pin_led, True)
 
-        self.data = []
-        self.t = []
+        if self.mode == 'edge':
+            self._start_edge_detect()
+            return
 
         self.thread = SimpleNamespace()
         self.thread.stop_signal = threading.Event()
         self.thread.measure = threading.Thread(target=self.measure_loop)
         self.thread.measure.start()
 
+    def _start_edge_detect(self):
+        """Stores the initial state of the pin, then registers
+        ._edge_callback() to be called on every change of state.
+        """
+        self._level = int(gpio.input(self.pin))
+        self._append(time.time() - self.t_start_trial, self._level)
+
+        _kwargs = {}
+        if self.bouncetime is not None:
+            _kwargs['bouncetime'] = self.bouncetime
+        gpio.add_event_detect(self.pin, gpio.BOTH,
+                              callback=self._edge_callback, **_kwargs)
+
+    def _edge_callback(self, channel):
+        """Called by RPi.GPIO from its own thread on each edge.
+
+        The pin is read, so that the stored state re-syncs with it after
+        edges dropped by RPi.GPIO (eg within bouncetime). If the pin is
+        still at the stored state, the state changed and changed back
+        before it was read (a short lick, or a missed edge): both edges
+        are stored.
+        """
+        _t_edge = time.time() - self.t_start_trial
+        _level = int(gpio.input(self.pin))
+        if _level == self._level:
+            self._append(_t_edge, 1 - _level)
+        self._level = _level
+        self._append(_t_edge, _level)
+
+    def _stop_edge_detect(self):
+        """Removes edge detection and stores the final state of the pin.
+        """
+        gpio.remove_event_detect(self.pin)
+        self._append(time.time() - self.t_start_trial,
+                     int(gpio.input(self.pin)))
+
     def measure_loop(self):
         _t_meas = time.time()
         while not self.thread.stop_signal.is_set():
 
-            while time.time() < _t_meas + 1/self.sampling_rate:
-                time.sleep(0.0005)
+            # sleep until the next sample, re-checking in case of an
+            # early wake-up
+            _t_next = _t_meas + 1/self.sampling_rate
+            while time.time() < _t_next:
+                time.sleep(max(_t_next - time.time(), 0))
 
             if gpio.input(self.pin):
                 # register lick
-                self.data.append(1)
                 _t_meas = time.time()
-                self.t.append(_t_meas - self.t_start_trial)
+                self._append(_t_meas - self.t_start_trial, 1)
             else:
                 # register no lick
-                self.data.append(0)
                 _t_meas = time.time()
-                self.t.append(_t_meas - self.t_start_trial)
+                self._append(_t_meas - self.t_start_trial, 0)
 
     def on_stop(self):
         """
-        Stops lickometer measurement thread, then turns off
-        IR-LED.
+        Stops lickometer measurement thread (or edge detection),
+        then turns off IR-LED.
         """
-        self.thread.stop_signal.set()
-        self.thread.measure.join()
+        if self.mode == 'edge':
+            self._stop_edge_detect()
+        else:
+            self.thread.stop_signal.set()
+            self.thread.measure.join()
 
         if type(self.pin_led) is list:
             for _pin in self.pin_led:
@@ -1,6 +1,12 @@
-from mouseberry.data.core import Data
+from mouseberry.data.encoding import count_onsets
+from mouseberry.data.buffer import MeasurementBuffer
 from mouseberry.tools.interrupt import InterruptionHandler
 from mouseberry.tools.reporting import Reporter
+from mouseberry.tools.scheduler import HybridScheduler
+from mouseberry.tools.workers import WorkerPool
+from mouseberry.tools.time import TimeDist
+from mouseberry.groups.plan import make_plan
+from mouseberry.groups.reactive import Contingency
 
 import time
 import logging
@@ -8,7 +14,8 @@ import threading
 import numpy as np
 from types import SimpleNamespace
 
-__all__ = ['Event', 'Measurement', 'TrialType', 'Experiment']
+__all__ = ['Event', 'Measurement', 'BufferedMeasurement', 'TrialType',
+           'Experiment']
 
 
 class BaseGroup(object):
@@ -108,10 +115,21 @@ class Event(object):
         when the event is triggered.
         - Called by .trigger() in the base Event class at the time of
         the event.
+    .on_exp_start(): optional
+        - Method can define a set of steps to occur when the experiment
+        starts, before the first trial (eg resetting statistics).
+        - Called once by .exp_start() in the base Event class.
     .on_cleanup(): optional
         - Method can define a set of steps to occur when the experiment ends,
         to clean up variables, etc.
-        - Called by .cleanup() in the base Event class at the end of the trial.
+        - Called once by .cleanup() in the base Event class at the end of
+        the experiment.
+
+    Notes on response-contingent events
+    ---------
+    .respond_to() makes the event contingent on a measurement: it is
+    triggered by a response within a window, rather than at the time
+    from .on_assign_tstart(). (see mouseberry.groups.reactive)
     """
 
     def __init__(self, name):
@@ -120,6 +138,46 @@ class Event(object):
     def __str__(self):
         return self.name
 
+    def respond_to(self, measurement, t_open, t_window, condition='onset',
+                   n_responses=1):
+        """Makes the event contingent on a measurement. The event is
+        triggered as soon as the measurement meets the condition within
+        the response window, and is not triggered if it does not.
+
+        Parameters
+        ----------
+        measurement : str or Measurement
+            The measurement (or its name) to respond to, eg a Lickometer.
+        t_open : float or TimeDist
+            Start of the response window (s, from the start of the trial).
+        t_window : float
+            Duration of the response window (s).
+        condition : str or function
+            'onset' (eg a lick), 'offset', or a function
+            f(t, datum) -> bool.
+        n_responses : int
+            Number of times the condition must be met.
+
+        Returns
+        ----------
+        self : Event
+            The event, to allow eg
+            reward = mb.RewardSolenoid(...).respond_to('licks', 1, 2)
+        """
+        self._contingency = Contingency(self, measurement, t_open, t_window,
+                                        condition=condition,
+                                        n_responses=n_responses)
+        return self
+
+    def _draw_t_start(self):
+        """Returns a start time for the event this trial: the start of
+        the response window for contingent events, and the time from
+        .on_assign_tstart() otherwise.
+        """
+        if getattr(self, '_contingency', None) is not None:
+            return self._contingency.assign_t_open()
+        return self.on_assign_tstart()
+
     def trial_start(self):
         """
         Wrapper around .on_init() and .on_assign_tstart() methods
@@ -135,22 +193,38 @@ class Event(object):
             pass
 
         try:
-            self._t_start = self.on_assign_tstart()
+            if getattr(self, '_t_start_planned', None) is not None:
+                self._t_start = self._t_start_planned  # from session plan
+            else:
+                self._t_start = self._draw_t_start()
         except AttributeError:
             reporter.error((f"Cannot call .on_assign_tstart() method "
                             f"in Event class. "
                             f"Please set it in {self.__class__} child class."))
 
-        self._trigger_thread = threading.Thread(
-            target=self.trigger_thread_target)
+        self._workers = self._parent._parent._workers
+        if self._workers is None:
+            self._trigger_thread = threading.Thread(
+                target=self.trigger_thread_target)
 
     def trigger(self):
         """Triggers the event in a background thread.
 
-        Starts the thread targeting .trigger_thread_target(), which itself
-        logs start and stop times and runs .on_trigger().
+        Dispatches .trigger_thread_target(), which itself logs start and
+        stop times and runs .on_trigger(), onto the worker pool of the
+        Experiment. If the Experiment has no worker pool, a new thread
+        is started instead.
+
+        For contingent events (see .respond_to()), opens the response
+        window instead.
         """
-        self._trigger_thread.start()
+        if getattr(self, '_contingency', None) is not None:
+            self._contingency.arm()
+        elif self._workers is None:
+            self._trigger_thread.start()
+        else:
+            self._trigger_thread = self._workers.submit(
+                self.trigger_thread_target)
 
     def trigger_thread_target(self):
         """
@@ -174,6 +248,8 @@ class Event(object):
 
         reporter.info((f'-->{self.name} started at '
                        f'{self._logged_t_start:.2f}s'))
+        reporter.debug((f'{self.name} scheduling latency: '
+                        f'{self._logged_t_latency*1e6:.0f}us'))
 
         try:
             self.on_trigger()
@@ -186,12 +262,23 @@ class Event(object):
         self._parent._parent._curr_ttype._prev_event_t_end = self._logged_t_end
 
         reporter.tabin()
-        self._parent._print_measurement_stats(t_start=self._logged_t_start,
-                                              t_end=self._logged_t_end)
+        self._logged_msmt_stats = self._parent._print_measurement_stats(
+            t_start=self._logged_t_start, t_end=self._logged_t_end)
         reporter.info((f'{self.name} ended at '
                        f'{self._logged_t_end:.2f}s'))
         reporter.tabout()
 
+    def exp_start(self):
+        """
+        Wrapper around .on_exp_start() method of the child class.
+
+        Called by the experiment when it starts.
+        """
+        try:
+            self.on_exp_start()
+        except AttributeError:
+            pass
+
     def cleanup(self):
         """
         Wrapper around .on_cleanup() method of the child class.
@@ -232,8 +319,31 @@ class Measurement(object):
         - Method must include a way to stop the measurement thread.
         - It is called by .stop_measurement() in the base class at the
         end of the trial.
+
+    Notes on encoding
+    ---------
+    .encoding : str
+        - 'samples' (default) if child.data holds one datum per sample.
+        - 'edges' if child.data only holds the state at the start, at each
+        change of state, and at the end of the measurement.
+        (see mouseberry.data.encoding)
+    .report_stats : bool
+        - Whether onset counts and rates of the measurement are reported
+        (and stored) for each event. True by default; False for
+        non-binary measurements.
+
+    Notes on subscribers
+    ---------
+    Functions registered with .subscribe() are called with (t, datum)
+    for each new datum, from the measurement thread. BufferedMeasurement
+    calls them on every ._append(); other child classes must call
+    ._publish(t, datum) themselves.
     """
 
+    encoding = 'samples'
+    report_stats = True
+    _subscribers = ()
+
     def __init__(self, name, sampling_rate):
         self.name = name
         self.sampling_rate = sampling_rate
@@ -272,6 +382,112 @@ class Measurement(object):
                                  f'in Measurement class. .on_stop() method '
                                  f'in {self.__class__} is not set.'))
 
+    def subscribe(self, callback):
+        """Registers callback(t, datum) to be called on each new datum.
+        It is called from the measurement thread, and must return quickly.
+        """
+        self._subscribers = self._subscribers + (callback,)
+
+    def unsubscribe(self, callback):
+        """Removes a callback registered with .subscribe().
+        """
+        self._subscribers = tuple(_callback for _callback in self._subscribers
+                                  if _callback != callback)
+
+    def _publish(self, t, datum):
+        for callback in self._subscribers:
+            callback(t, datum)
+
+    def _views(self):
+        """Returns the measurement times and data as arrays.
+        """
+        return np.asarray(self.t), np.asarray(self.data)
+
+    def count_onsets(self, t_start, t_end):
+        """Counts the onsets (0 -> 1 transitions) of the measurement
+        between t_start and t_end (s, from the start of the trial).
+        """
+        _t, _data = self._views()
+        return count_onsets(_t, _data, t_start, t_end)
+
+
+class BufferedMeasurement(Measurement):
+    """
+    Base class for measurements which store their data in a preallocated
+    MeasurementBuffer, rather than in growing lists.
+
+    .data and .t are zero-copy views on the buffer. The buffer is
+    emptied at the start of each trial.
+
+    Parameters
+    ----------
+    name : str
+        Unique name for the Measurement. Used for data storage.
+    sampling_rate : float
+        Sampling rate (Hz)
+    t_buffer : float
+        Longest trial duration which can be stored without overwriting
+        the start of the trial (s). The buffer holds
+        t_buffer * sampling_rate datapoints.
+    data_dtype : np.dtype
+        Dtype of the stored data. (Default uint8, for binary measurements)
+
+    Notes on child class methods
+    ---------
+    .on_start() and .on_stop(): required
+        - As for Measurement, except that datapoints are stored by calling
+        ._append(t, datum) from the measurement thread.
+    """
+
+    def __init__(self, name, sampling_rate, t_buffer=600,
+                 data_dtype=np.uint8):
+        super().__init__(name=name, sampling_rate=sampling_rate)
+        self._buffer = MeasurementBuffer(
+            capacity=int(t_buffer * sampling_rate) + 1,
+            data_dtype=data_dtype)
+
+    @property
+    def t(self):
+        return self._buffer.t
+
+    @property
+    def data(self):
+        return self._buffer.data
+
+    def _append(self, t, datum):
+        self._buffer.append(t, datum)
+        if self._subscribers:
+            self._publish(t, datum)
+
+    def _views(self):
+        """Returns zero-copy views of the measurement times and data,
+        with a matching number of datapoints.
+        """
+        return self._buffer.views()
+
+    def count_onsets(self, t_start, t_end):
+        """Counts the onsets (0 -> 1 transitions) of the measurement
+        between t_start and t_end, in O(log n) time from the running
+        onset count of the buffer.
+        """
+        return self._buffer.count_onsets(t_start, t_end)
+
+    def start_measurement(self, **kwargs):
+        """Empties the buffer and initializes measurement.
+        """
+        self._buffer.reset()
+        super().start_measurement(**kwargs)
+
+    def stop_measurement(self, **kwargs):
+        """Stop measurement, and report any overwritten datapoints.
+        """
+        super().stop_measurement(**kwargs)
+
+        if self._buffer.n_dropped > 0:
+            self.reporter.error((f'[msmt] {self.name}: buffer full, '
+                                 f'{self._buffer.n_dropped} datapoints '
+                                 f'overwritten. Increase t_buffer.'))
+
 
 class TrialType(BaseGroup):
     """
@@ -336,7 +552,7 @@ class TrialType(BaseGroup):
             meas = getattr(self.measurements, meas_name)
             meas.stop_measurement()
 
-    def _setup_events(self):
+    def _setup_events(self, ind_trial):
         """Performs start-of-trial setup for each event in the trial.
 
         For each event, the .trial_start() method is invoked, which
@@ -346,11 +562,18 @@ class TrialType(BaseGroup):
             2. Assigns a start time (.on_assign_tstart())
                 * Set time is located in ._t_start.
 
+        If the experiment has a session plan, the planned start times
+        of trial ind_trial are used instead of .on_assign_tstart().
+
         The events are then sorted by time (self._sort_events_by_time).
         """
+        _plan = self._parent._plan
         list_event_names = list(self.events.__dict__)
         for event_name in list_event_names:
             event = getattr(self.events, event_name)
+            if _plan is not None:
+                event._t_start_planned = \
+                    _plan[f't_start_{event_name}'][ind_trial]
             event.trial_start()
 
         self._sort_events_by_time()
@@ -374,13 +597,15 @@ class TrialType(BaseGroup):
         """
         events_by_time = self.event_workspace._sort_by_time
 
-        # Schedule events by time
+        wait_until = self._parent._wait_until  # get from Experiment() inst.
+
+        # Schedule events by time (ns on the scheduler clock)
         # --------------
-        t_scheduled = np.ones(len(events_by_time))\
-            * self._t_start_trial_abs
+        t_scheduled = np.empty(len(events_by_time), dtype=np.int64)
         for ind, event_name in enumerate(events_by_time):
             _curr_event = getattr(self.events, event_name)
-            t_scheduled[ind] += _curr_event._t_start
+            t_scheduled[ind] = self._t_start_trial_ns \
+                + int(_curr_event._t_start * 1e9)
 
         # Proceed through events, triggering and waiting as required.
         # --------------
@@ -389,16 +614,16 @@ class TrialType(BaseGroup):
         for ind, event_name in enumerate(events_by_time):
             _curr_event = getattr(self.events, event_name)
 
-            while time.time() < t_scheduled[ind]:
-                time.sleep(0.0001)
+            _t_woke = wait_until(t_scheduled[ind])
+            _curr_event._logged_t_latency = (_t_woke - t_scheduled[ind]) / 1e9
+            _t_end_rel = time.time() - self._t_start_trial_abs
+            _curr_event.trigger()
 
             # Print interevent period stats for all measurements
-            _t_end_rel = time.time() - self._t_start_trial_abs
             _t_start_rel = self._prev_event_t_end
             self._print_measurement_stats(t_start=_t_start_rel,
                                           t_end=_t_end_rel,
                                           interevent_period=True)
-            _curr_event.trigger()
 
         # Join all event threads
         # ------------
@@ -427,24 +652,25 @@ class TrialType(BaseGroup):
             Start time for which to analyze measurement stats
         t_end : float
             End time for which to analyze measurement stats
+
+        Returns
+        ------------
+        msmt_stats : dict
+            Maps the name of each measurement with data to a tuple of
+            (number of onsets, rate of onsets (Hz)) in the period.
         """
         reporter = self._parent.reporter  # get from Experiment() inst.
+        msmt_stats = {}
 
         for msmt_key in self.measurements.__dict__:
             _msmt = self.measurements.__dict__[msmt_key]
 
-            # Find corresponding inds of given times
-            _ind_t_start = np.argmin(np.abs(np.array(_msmt.t) - t_start))
-            _ind_t_end = np.argmin(np.abs(np.array(_msmt.t) - t_end))
-
-            # Extract parts of the data
-            _data_section = _msmt.data[_ind_t_start:_ind_t_end]
-
-            if len(_data_section) > 0:
-                _data_sect_diff = np.diff(_data_section)
-                _n_events = np.sum(
-                    _data_sect_diff[_data_sect_diff > 0.5])
+            if _msmt.report_stats is True and len(_msmt.t) > 0:
+                # Count onsets; works for both 'samples' and 'edges'
+                # encodings of the measurement.
+                _n_events = _msmt.count_onsets(t_start, t_end)
                 _rate = _n_events / (t_end - t_start)
+                msmt_stats[_msmt.name] = (_n_events, _rate)
 
                 # Print
                 if interevent_period is False:
@@ -457,6 +683,8 @@ class TrialType(BaseGroup):
                                    f'{_n_events} events; '
                                    f'{_rate:.2f}Hz'))
 
+        return msmt_stats
+
 
 class Experiment(BaseGroup):
     """
@@ -471,12 +699,75 @@ class Experiment(BaseGroup):
         is always assigned. If a TimeDist class instance,
         the TimeDist parameters are used to assign stochastic
         ITIs.
+    exp_cond : str
+        Experimental condition, appended to the filename.
+    scheduler : Scheduler class instance (optional)
+        Scheduler used to wait for the start time of each event.
+        Defaults to HybridScheduler(), which sleeps coarsely and then
+        spins for the final sub-millisecond before each event.
+    worker_pool : bool
+        If True, events are triggered on a pool of worker threads
+        which is started once with the experiment. If False, a new
+        thread is started for every event on every trial.
+    stream_data : bool
+        If True, each trial is appended to the hdf5 file during the
+        following ITI, instead of writing the whole file at the end
+        of the experiment.
+    msment_layout : str
+        Layout of measurements in the hdf5 file: 'vlen' (one
+        variable-length row per trial), 'flat' (one flat dataset plus
+        an offsets index) or 'packed' (as 'flat', with times stored as
+        int32 microsecond differences and binary data bit-packed, for
+        smaller files). See Data.
+    msment_compression : str (optional)
+        Compression of the measurement datasets in the 'flat' and
+        'packed' layouts: 'gzip', 'lzf' or 'none'. Defaults to 'gzip'
+        for 'packed' and 'none' for 'flat'. See Data.
+    event_groups : bool
+        Whether to also store the attributes of each event in a group
+        trial{ind_trial}/{event} of the hdf5 file. See Data.
+    async_logging : bool
+        If True, progress messages are written to the log file and
+        console by a background thread, so that event threads never
+        wait on logging. See Reporter.
+    plan : bool or np.ndarray
+        If True, the trialtype, event start times and ITI of every trial
+        are generated before the experiment starts (see
+        mouseberry.groups.plan.make_plan()), and stored in the hdf5 file.
+        A plan array (eg read with plan_from_hdf5()) is replayed as is.
+        If False (default), they are drawn at the start of each trial.
+    seed : int (optional)
+        Seed of the session plan. The same seed gives the same plan.
+    block_size : int (optional)
+        If set, the session plan balances trialtypes within blocks
+        of block_size trials.
+    mouse : str (optional)
+        ID of the mouse. If None, it is asked for when the experiment
+        starts.
     """
 
-    def __init__(self, n_trials, iti, exp_cond=''):
+    def __init__(self, n_trials, iti, exp_cond='', scheduler=None,
+                 worker_pool=True, stream_data=False, msment_layout='vlen',
+                 msment_compression=None, event_groups=True,
+                 async_logging=True, plan=False, seed=None, block_size=None,
+                 mouse=None):
         self.n_trials = n_trials
         self.iti = iti
         self.exp_cond = exp_cond
+        self.worker_pool = worker_pool
+        self.stream_data = stream_data
+        self.msment_layout = msment_layout
+        self.msment_compression = msment_compression
+        self.event_groups = event_groups
+        self.async_logging = async_logging
+        self.plan = plan
+        self.seed = seed
+        self.block_size = block_size
+        self.mouse = mouse
+
+        if scheduler is None:
+            scheduler = HybridScheduler()
+        self.scheduler = scheduler
 
     def run(self, *args):
         """Main method of Experiment class. Runs the experiment by
@@ -484,6 +775,11 @@ class Experiment(BaseGroup):
         and triggering within each trialtype, as well as threaded background
         measurements and data storage.
 
+        Trials are pipelined: during the ITI following each trial, the
+        trial is stored and the next trial is prepared (trialtype picked,
+        event times assigned), so that the next trial starts as soon as
+        the ITI is over. The ITI is timed from the end of the trial.
+
         An HDF5 file is created after the experiment terminates.
 
         Parameters
@@ -495,18 +791,19 @@ class Experiment(BaseGroup):
 
         self._parse_run_args(args)
         self._start_experiment()
+        self._prepare_trial(0)
 
         with InterruptionHandler() as h:
             for ind_trial, trial in enumerate(range(self.n_trials)):
                 self._start_curr_trial(ind_trial)
 
                 self._curr_ttype._start_all_measurements()
-                self._curr_ttype._setup_events()
                 self._curr_ttype._trigger_events_sequentially()
                 self._curr_ttype._stop_all_measurements()
 
                 self._end_curr_trial()
-                self._pick_iti_and_sleep()
+                self._iti(prepare_next=not h.interrupted
+                          and ind_trial+1 < self.n_trials)
 
                 if h.interrupted:
                     self.reporter.info('*** Stopping experiment... *** ')
@@ -528,6 +825,10 @@ class Experiment(BaseGroup):
             all_class_names = str(arg.__class__) + str(arg.__class__.__bases__)
             if 'Video' in all_class_names:
                 self.vid = arg
+                self._store_in_child(self.vid)
+                for measurement in self.vid.measurements:
+                    setattr(self.measurements, measurement.name,
+                            measurement)
             elif 'TrialType' in all_class_names:
                 setattr(self.ttypes, arg.name, arg)
                 self._store_in_child(getattr(self.ttypes, arg.name))
@@ -545,15 +846,30 @@ class Experiment(BaseGroup):
     def _start_experiment(self):
         """Starts the experiment.
         """
-        self.mouse = input('Enter the mouse ID: ')
+        # imported here, so that events and measurements can be used
+        # without loading h5py
+        from mouseberry.data.core import Data
+
+        if self.mouse is None:
+            self.mouse = input('Enter the mouse ID: ')
 
         self._t_start_exp = time.time()
         self._set_fname()
 
-        self.data = Data(self)
-        self.reporter = Reporter(self)
+        self._setup_plan()
+        self._prime_time_dists()
+
+        self.data = Data(self, stream=self.stream_data,
+                         msment_layout=self.msment_layout,
+                         compression=self.msment_compression,
+                         event_groups=self.event_groups)
+        self.reporter = Reporter(self, async_mode=self.async_logging)
+
+        for event in self._all_events():
+            event.exp_start()
 
         self._setup_trial_chooser()
+        self._setup_workers()
         self._n_trials_completed = 0
 
     def _set_fname(self):
@@ -578,11 +894,80 @@ class Experiment(BaseGroup):
         _temp_p = np.array(self._tr_chooser.p)
         self._tr_chooser.p = _temp_p / np.sum(_temp_p)
 
+    def _setup_workers(self):
+        """Starts the worker pool onto which events are dispatched.
+
+        The pool holds one worker per event of the largest TrialType,
+        so that all events of a trial can run at the same time.
+        """
+        if self.worker_pool is False:
+            self._workers = None
+            return
+
+        max_n_events = max(len(ttype.events.__dict__)
+                           for ttype in self.ttypes.__dict__.values())
+        self._workers = WorkerPool(n_workers=max_n_events)
+        self._workers.start()
+
+    def _setup_plan(self):
+        """Generates the session plan (or uses the one given), if
+        the experiment has one.
+        """
+        if isinstance(self.plan, np.ndarray):
+            assert len(self.plan) >= self.n_trials, \
+                'The plan must have at least n_trials trials.'
+            self._plan = self.plan
+            self._plan_seed = self.seed
+        elif self.plan is True:
+            self._plan, self._plan_seed = make_plan(
+                list(self.ttypes.__dict__.values()), self.n_trials,
+                self.iti, seed=self.seed, block_size=self.block_size)
+        else:
+            self._plan = None
+            self._plan_seed = None
+
+    def _all_events(self):
+        """Returns every event of the experiment once, including events
+        shared between trialtypes.
+        """
+        events = []
+        for ttype in self.ttypes.__dict__.values():
+            for event in ttype.events.__dict__.values():
+                if not any(event is _event for _event in events):
+                    events.append(event)
+        return events
+
+    def _prime_time_dists(self):
+        """Draws the first batch of values of every TimeDist used for the
+        ITI or by an event attribute, so that no values are drawn
+        during the first trials.
+        """
+        _candidates = [self.iti]
+        for ttype in self.ttypes.__dict__.values():
+            for event in ttype.events.__dict__.values():
+                _candidates.extend(event.__dict__.values())
+
+        for candidate in _candidates:
+            if isinstance(candidate, TimeDist):
+                candidate.prime()
+
+    def _prepare_trial(self, ind_trial):
+        """Prepares a trial before it starts (during the previous ITI):
+        picks its trialtype (self._next_ttype), sets up its events
+        (assigning their start times), and requests the split of the
+        video recording (self.vid.prepare()).
+        """
+        self._next_ttype = self._pick_ttype(ind_trial)
+        self._next_ttype._setup_events(ind_trial)
+
+        if hasattr(self, 'vid'):
+            self.vid.prepare(trial=ind_trial)
+
     def _start_curr_trial(self, ind_trial):
         """Initializes a trial.
 
         0. Reports current trial number and increments reporter level
-        1. Picks a current trialtype (self.pick_curr_ttype())
+        1. Makes the prepared trialtype current (self._curr_ttype)
         2. Starts video (self.vid.run())
         3. Logs start time of trial (self._curr_ttype._t_start_trial)
         """
@@ -590,58 +975,99 @@ class Experiment(BaseGroup):
         self.reporter.tabin()
 
         self._curr_n_trial = ind_trial
-        self._pick_curr_ttype()
+        self._curr_ttype = self._next_ttype
+        self.reporter.info(f'trialtype: {self._curr_ttype.name}')
 
         if hasattr(self, 'vid'):
             self.vid.run(trial=ind_trial)
 
-        self._curr_ttype._t_start_trial = time.time() - self._t_start_exp
+        self._curr_ttype._t_start_trial_ns = self.scheduler.now_ns()
         self._curr_ttype._t_start_trial_abs = time.time()
+        self._curr_ttype._t_start_trial = \
+            self._curr_ttype._t_start_trial_abs - self._t_start_exp
+
+        if hasattr(self, '_t_end_prev_trial_ns'):
+            _iti_real = (self._curr_ttype._t_start_trial_ns
+                         - self._t_end_prev_trial_ns) / 1e9
+            self.reporter.debug(f'effective ITI: {_iti_real:.4f}s')
 
         self.reporter.info('events:')
         self.reporter.tabin()
 
-    def _pick_curr_ttype(self):
+    def _pick_ttype(self, ind_trial):
         """
-        Chooses a trialtype to proceed, based on occurence
-        probabilities. Stores it in self._curr_ttype
+        Chooses the trialtype of a trial, based on occurence
+        probabilities (or on the session plan).
+
+        Returns
+        ----------
+        ttype : TrialType
         """
-        _curr_ttype_name = np.random.choice(self._tr_chooser.names,
-                                            p=self._tr_chooser.p)
-        self._curr_ttype = getattr(self.ttypes, _curr_ttype_name)
-        self.reporter.info(f'trialtype: {self._curr_ttype.name}')
+        if self._plan is not None:
+            _ttype_name = self._plan['trialtype'][ind_trial]
+        else:
+            _ttype_name = np.random.choice(self._tr_chooser.names,
+                                           p=self._tr_chooser.p)
+        return getattr(self.ttypes, _ttype_name)
 
     def _end_curr_trial(self):
         """Ends the current trial.
 
         1. Logs end time of trial (self._curr_ttype._t_end_trial)
         2. Stops video (self.vid.stop())
-        3. Stores measurements (self.data.store_attrs_from_curr_trial())
         """
-
+        self._t_end_prev_trial_ns = self.scheduler.now_ns()
         self._curr_ttype._t_end_trial = time.time() - self._t_start_exp
 
         if hasattr(self, 'vid'):
             self.vid.stop()
 
-        self.data.store_attrs_from_curr_trial()
-        self._n_trials_completed = self._curr_n_trial
         self.reporter.tabout()
 
-    def _pick_iti_and_sleep(self):
+    def _pick_iti(self):
         """
         Returns an inter-trial value which is either a singular value,
-        or which is drawn from a scipy.stats distribution.
+        or which is drawn from a TimeDist (or taken from the session plan).
         """
+        if self._plan is not None:
+            return self._plan['iti'][self._curr_n_trial]
         try:
-            iti = self.iti()  # TimeDist class
+            return self.iti()  # TimeDist class
         except TypeError:
-            iti = self.iti  # float or int class
+            return self.iti  # float or int class
 
+    def _iti(self, prepare_next=True):
+        """Runs the ITI following the current trial.
+
+        1. Stores the trial (self.data.store_attrs_from_curr_trial())
+        2. Prepares the next trial (self._prepare_trial()), if
+        prepare_next is True
+        3. Waits until the ITI has elapsed since the end of the trial.
+        """
+        iti = self._pick_iti()
         self.reporter.info(f'ITI: {iti:.2f}s')
         self.reporter.tabout()
 
-        time.sleep(iti)
+        self.data.store_attrs_from_curr_trial()
+        self._n_trials_completed = self._curr_n_trial + 1
+
+        if prepare_next is True:
+            self._prepare_trial(self._curr_n_trial + 1)
+
+        self._wait_until(self._t_end_prev_trial_ns + int(iti * 1e9))
+
+    def _wait_until(self, t_target_ns):
+        """Wrapper around .wait_until() method of the scheduler.
+
+        Returns the time at which it woke up (ns, on the scheduler clock).
+        """
+        try:
+            return self.scheduler.wait_until(t_target_ns)
+        except AttributeError:
+            self.reporter.error((f'Cannot wait for the scheduled time. '
+                                 f'.wait_until() method in '
+                                 f'{self.scheduler.__class__} is not set.'))
+            return self.scheduler.now_ns()
 
     def _write_file(self):
         """ Writes an hdf5 file from self.data.
@@ -649,11 +1075,16 @@ class Experiment(BaseGroup):
         self.data.write_hdf5()
 
     def _cleanup(self):
-        """Run cleanup functions for each event at end of exp
+        """Run cleanup functions for each event at end of exp,
+        stop the worker pool, close the video and the reporter.
         """
-        for ttype in self.ttypes.__dict__.values():
-            for event in ttype.events.__dict__.values():
-                try:
-                    event.on_cleanup()
-                except AttributeError:
-                    pass
+        if self._workers is not None:
+            self._workers.stop()
+
+        for event in self._all_events():
+            event.cleanup()
+
+        if hasattr(self, 'vid'):
+            self.vid.close()
+
+        self.reporter.close()
@@ -0,0 +1,164 @@
+"""
+Precomputed session plans: the trialtype, event start times and ITI
+of every trial, generated before the experiment starts.
+"""
+
+import numpy as np
+
+from mouseberry.tools.time import TimeDist
+
+__all__ = ['make_plan', 'plan_to_hdf5', 'plan_from_hdf5']
+
+
+def make_plan(ttypes, n_trials, iti, seed=None, block_size=None):
+    """Generates the plan of a whole session.
+
+    The trialtype sequence, the event start times (from
+    .on_assign_tstart() of each event, or the start of the response
+    window of contingent events) and the ITIs are all drawn from
+    random streams derived from seed, so that the same seed gives the
+    same plan. (TimeDist instances are reseeded, and np.random is seeded
+    for events drawing times with it directly. Its previous state is
+    restored once the plan is drawn.)
+
+    Parameters
+    -----------
+    ttypes : list
+        TrialType instances.
+    n_trials : int
+        Number of trials.
+    iti : float or TimeDist
+        The ITI of the experiment.
+    seed : int (optional)
+        Seed of the plan. If None, a random seed is chosen.
+    block_size : int (optional)
+        If set, trialtypes are balanced within consecutive blocks of
+        block_size trials: each block holds a number of trials of each
+        trialtype proportional to its probability p, in random order.
+        If None, each trialtype is drawn independently with
+        probability p.
+
+    Returns
+    -----------
+    plan : np.ndarray
+        Structured array with one entry per trial, and fields
+        'ind_trial', 'trialtype', 'iti', and 't_start_{event}' for every
+        event (nan on trials of trialtypes without the event).
+    seed : int
+        Seed of the plan.
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    _seeds = np.random.SeedSequence(seed).spawn(2)
+
+    _state = np.random.get_state()
+    np.random.seed(_seeds[1].generate_state(1)[0])
+    try:
+        plan = _draw_plan(ttypes, n_trials, iti, _seeds[0], block_size)
+    finally:
+        np.random.set_state(_state)
+
+    return plan, seed
+
+
+def _draw_plan(ttypes, n_trials, iti, seed_seq, block_size):
+    """Draws the plan of make_plan() from the np.random.SeedSequence
+    seed_seq (and the already seeded np.random).
+    """
+    _rng = np.random.default_rng(seed_seq)
+
+    # Reseed all TimeDists, in a fixed order
+    # ----------
+    _candidates = [iti]
+    for ttype in ttypes:
+        for event in ttype.events.__dict__.values():
+            _candidates.extend(event.__dict__.values())
+    _time_dists = []
+    for candidate in _candidates:
+        if isinstance(candidate, TimeDist) \
+                and not any(candidate is td for td in _time_dists):
+            _time_dists.append(candidate)
+    for time_dist, _seed in zip(_time_dists,
+                                seed_seq.spawn(len(_time_dists))):
+        time_dist.reseed(_seed)
+
+    # Trialtype sequence
+    # ----------
+    _names = [ttype.name for ttype in ttypes]
+    _p = np.array([ttype.p for ttype in ttypes], dtype=float)
+    _p = _p / np.sum(_p)
+    if block_size is None:
+        _inds_ttype = _rng.choice(len(ttypes), size=n_trials, p=_p)
+    else:
+        _inds_ttype = _balanced_blocks(_p, n_trials, block_size, _rng)
+
+    # Event start times and ITIs
+    # ----------
+    _event_names = []
+    for ttype in ttypes:
+        for event_name in ttype.events.__dict__.keys():
+            if event_name not in _event_names:
+                _event_names.append(event_name)
+
+    _max_len = max([len(name) for name in _names], default=1)
+    plan = np.empty(n_trials,
+                    dtype=[('ind_trial', np.int64),
+                           ('trialtype', f'U{_max_len}'),
+                           ('iti', np.float64)]
+                    + [(f't_start_{name}', np.float64)
+                       for name in _event_names])
+    plan['ind_trial'] = np.arange(n_trials)
+    plan['trialtype'] = np.array(_names)[_inds_ttype]
+    for name in _event_names:
+        plan[f't_start_{name}'] = np.nan
+
+    for ind_trial, ind_ttype in enumerate(_inds_ttype):
+        for event in ttypes[ind_ttype].events.__dict__.values():
+            plan[f't_start_{event.name}'][ind_trial] = \
+                event._draw_t_start()
+        try:
+            plan['iti'][ind_trial] = iti()  # TimeDist class
+        except TypeError:
+            plan['iti'][ind_trial] = iti  # float or int class
+
+    return plan
+
+
+def _balanced_blocks(p, n_trials, block_size, rng):
+    """Returns trialtype indices in blocks of block_size trials, with
+    round(p * block_size) trials of each trialtype per block
+    (remainders go to the largest fractional parts), shuffled within
+    each block.
+    """
+    _counts_exact = p * block_size
+    _counts = np.floor(_counts_exact).astype(int)
+    _n_left = block_size - np.sum(_counts)
+    _counts[np.argsort(_counts - _counts_exact)[:_n_left]] += 1
+    _block = np.repeat(np.arange(len(p)), _counts)
+
+    _n_blocks = -(-n_trials // block_size)
+    inds = np.concatenate([rng.permutation(_block)
+                           for _ in range(_n_blocks)])
+    return inds[:n_trials]
+
+
+def plan_to_hdf5(plan):
+    """Converts a plan to an array storable by h5py (str fields become
+    fixed-length bytes).
+    """
+    _dtype = [(name, plan.dtype[name].str.replace('<U', 'S'))
+              if plan.dtype[name].kind == 'U' else (name, plan.dtype[name])
+              for name in plan.dtype.names]
+    return plan.astype(_dtype)
+
+
+def plan_from_hdf5(dset):
+    """Reads a plan stored in an hdf5 file (eg f['plan']), converting
+    bytes fields back to str. The plan can be passed to
+    Experiment(plan=...) to replay it.
+    """
+    _arr = dset[()]
+    _dtype = [(name, _arr.dtype[name].str.replace('|S', 'U'))
+              if _arr.dtype[name].kind == 'S' else (name, _arr.dtype[name])
+              for name in _arr.dtype.names]
+    return _arr.astype(_dtype)
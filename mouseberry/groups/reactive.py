@@ -0,0 +1,157 @@
+"""
+Response-contingent events: events triggered by a measurement (eg the
+first lick in a response window) rather than at a scheduled time.
+"""
+
+import math
+import time
+import threading
+
+__all__ = ['Contingency']
+
+
+class Contingency(object):
+    """Makes an event contingent on a measurement: the event is triggered
+    as soon as the measurement meets a condition within a window of the
+    trial, or not at all.
+
+    Created by Event.respond_to(). When the window opens (at its
+    scheduled time in the trial), the contingency subscribes to the
+    measurement, and each new datum is checked against the condition in
+    the measurement thread. Once the condition has been met n_responses
+    times, a thread waiting on the window (on the worker pool of the
+    Experiment) is woken and triggers the event immediately, without
+    going through the scheduler. The window closes t_window after it
+    opens, or at the first datum measured after that.
+
+    The time of the response (s, from the start of the trial) is stored
+    as the attribute .t_response of the event, and the reaction latency
+    (s, from the response to the trigger) as its t_latency.
+
+    Parameters
+    -----------
+    event : Event
+        The contingent event.
+    measurement : str or Measurement
+        The measurement (or its name) the event responds to. Must publish
+        its data to subscribers (eg any BufferedMeasurement).
+    t_open : float or TimeDist
+        Start of the response window (s, from the start of the trial).
+    t_window : float
+        Duration of the response window (s).
+    condition : str or function
+        'onset' (a datum of 1 preceded by a datum of 0, eg a lick onset),
+        'offset' (a datum of 0 preceded by a datum of 1), or a function
+        f(t, datum) -> bool (eg lambda t, x: x > 10 for an ROI).
+    n_responses : int
+        Number of times the condition must be met to trigger the event.
+    """
+
+    def __init__(self, event, measurement, t_open, t_window,
+                 condition='onset', n_responses=1):
+        self.event = event
+        self.measurement = measurement
+        self.t_open = t_open
+        self.t_window = t_window
+        self.condition = condition
+        self.n_responses = n_responses
+
+        if not callable(condition) and condition not in ['onset', 'offset']:
+            raise ValueError(f"condition must be 'onset', 'offset' or a "
+                             f"function, not {condition}.")
+
+        self._responded = threading.Event()
+
+    def assign_t_open(self):
+        """Returns the start of the response window for this trial.
+        """
+        try:
+            return self.t_open()  # TimeDist class
+        except TypeError:
+            return self.t_open  # float or int class
+
+    def arm(self):
+        """Opens the response window: subscribes to the measurement, and
+        waits for a response in the background.
+
+        Called by Event.trigger() at the start of the window.
+        """
+        _event = self.event
+        _exp = _event._parent._parent
+        self._msmt = self._get_measurement()
+        self._t_start_trial_abs = _exp._curr_ttype._t_start_trial_abs
+        self._t_close = time.time() + self.t_window
+        self._t_close_rel = self._t_close - self._t_start_trial_abs
+
+        self._responded.clear()
+        self._n_matched = 0
+        self._t_response = math.nan
+        _event.t_response = math.nan
+        _event._logged_t_start = math.nan
+        _event._logged_t_end = math.nan
+        _event._logged_t_latency = math.nan
+        _event._logged_msmt_stats = {}
+
+        _t, _data = self._msmt._views()
+        self._prev_datum = _data[-1] if len(_data) > 0 else None
+        self._msmt.subscribe(self._on_datum)
+
+        _exp.reporter.debug(f'{_event.name} waiting for a response '
+                            f'({self._msmt.name}) for {self.t_window}s')
+        if _event._workers is None:
+            _event._trigger_thread = threading.Thread(
+                target=self._wait_target)
+            _event._trigger_thread.start()
+        else:
+            _event._trigger_thread = _event._workers.submit(
+                self._wait_target)
+
+    def _get_measurement(self):
+        if type(self.measurement) is str:
+            return getattr(self.event._parent.measurements,
+                           self.measurement)
+        return self.measurement
+
+    def _on_datum(self, t, datum):
+        """Called by the measurement thread on every new datum.
+        """
+        if self._responded.is_set():
+            return
+        if t >= self._t_close_rel:
+            # the window has closed (on the clock of the measurement)
+            self._responded.set()
+            return
+
+        if self.condition == 'onset':
+            _matched = self._prev_datum is not None \
+                and self._prev_datum < 0.5 and datum > 0.5
+        elif self.condition == 'offset':
+            _matched = self._prev_datum is not None \
+                and self._prev_datum > 0.5 and datum < 0.5
+        else:
+            _matched = self.condition(t, datum)
+        self._prev_datum = datum
+
+        if _matched:
+            self._n_matched += 1
+            if self._n_matched >= self.n_responses:
+                self._t_response = t
+                self._responded.set()
+
+    def _wait_target(self):
+        """Waits for a response until the window closes, then triggers
+        the event if there was one.
+        """
+        _event = self.event
+        self._responded.wait(timeout=max(self._t_close - time.time(), 0))
+        self._responded.set()  # ignore later data
+        self._msmt.unsubscribe(self._on_datum)
+
+        if not math.isnan(self._t_response):
+            _event.t_response = self._t_response
+            _event._logged_t_latency = time.time() \
+                - (self._t_start_trial_abs + self._t_response)
+            _event.trigger_thread_target()
+        else:
+            _event._parent._parent.reporter.info(
+                f'-->{_event.name}: no response in window')
@@ -0,0 +1,270 @@
+"""
+A discrete-event virtual clock, which replaces the time functions used by
+mouseberry to run experiments faster than real time.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+__all__ = ['VirtualClock']
+
+
+class _Waiter(object):
+    """A thread blocked on the clock, until woken up by the clock (at
+    .t_wake) or by a threading.Event.
+    """
+
+    def __init__(self, ident, t_wake=None):
+        self.ident = ident
+        self.t_wake = t_wake
+        self.woken = False
+        self._lock = threading.Lock()
+        self._lock.acquire()
+
+    def block(self):
+        self._lock.acquire()
+
+    def wake(self):
+        self.woken = True
+        self._lock.release()
+
+
+class VirtualClock(object):
+    """Discrete-event clock shared by all threads of an experiment.
+
+    Virtual time only advances when no thread is running: it then jumps
+    to the earliest time at which a sleeping thread should wake up, and
+    wakes that thread. Sleeps therefore take no real time, and a session
+    runs as fast as its threads can compute.
+
+    A thread is running from when it starts or wakes up, until it sleeps,
+    waits on a threading.Event (see .wait_event()) or becomes idle (see
+    .idle()) again. Computations therefore take no virtual time. A
+    thread which does not call the clock for t_quiet (real) seconds is
+    considered blocked on something else (eg a queue or a socket), and
+    no longer counts as running. Starting a thread, or handing a job to
+    a worker, holds the clock (see .hold()) until the new thread has
+    started.
+
+    Parameters
+    -----------
+    t_start : float (optional)
+        Virtual time.time() at the start of the clock. Defaults to the
+        real time.
+    t_quiet : float
+        Real time without calls to the clock after which a thread is
+        considered blocked (s).
+    t_quiet_new : float
+        Same as t_quiet, for threads which have started but not yet
+        called the clock (s).
+
+    Notes
+    -----------
+    The time functions (.time(), .sleep(), .perf_counter_ns(), ...)
+    have the same signatures as those of the time module, which they
+    replace in a Simulation.
+    """
+
+    def __init__(self, t_start=None, t_quiet=0.5, t_quiet_new=0.005):
+        self._real_time = time.time
+        self._real_sleep = time.sleep
+        self._real_clock = time.perf_counter
+
+        self.t_start = self._real_time() if t_start is None else t_start
+        self.t_quiet = t_quiet
+        self.t_quiet_new = t_quiet_new
+        self._now = 0.
+
+        self._lock = threading.Lock()
+        self._sleepers = []  # heap of (t_wake, seq, _Waiter)
+        self._seq = itertools.count()
+        self._waiters = set()
+        # thread ident -> (real time of its last call to the clock, t_quiet)
+        # or None if woken up, but not yet resumed
+        self._running = {}
+        self._n_held = 0
+        self.n_wakeups = 0
+
+        self._stop_signal = threading.Event()
+        self._driver = None
+
+    @property
+    def now(self):
+        """Virtual time elapsed since the start of the clock (s).
+        """
+        return self._now
+
+    def start(self):
+        """Starts the driver thread, which advances the clock when all
+        running threads have become quiet.
+        """
+        self._stop_signal.clear()
+        self._driver = threading.Thread(target=self._drive, daemon=True,
+                                        name='mb-virtual-clock')
+        self._driver.start()
+
+    def stop(self):
+        """Stops the driver thread, and wakes all blocked threads.
+        """
+        self._stop_signal.set()
+        if self._driver is not None:
+            self._driver.join()
+            self._driver = None
+        with self._lock:
+            for waiter in list(self._waiters):
+                if waiter.woken is False:
+                    waiter.wake()
+            self._waiters = set()
+            self._sleepers = []
+
+    # Time functions
+    # ----------
+    def time(self):
+        self._touch()
+        return self.t_start + self._now
+
+    def time_ns(self):
+        return int(self.time() * 1e9)
+
+    def monotonic(self):
+        self._touch()
+        return self._now
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1e9)
+
+    perf_counter = monotonic
+    perf_counter_ns = monotonic_ns
+
+    def sleep(self, secs):
+        """Blocks the calling thread for secs of virtual time.
+        """
+        if secs < 0:
+            raise ValueError('sleep length must be non-negative')
+        self._block(t_wake=self._now + secs)
+
+    def sleep_until(self, t):
+        """Blocks the calling thread until the virtual .monotonic()
+        time t.
+        """
+        self._block(t_wake=max(t, self._now))
+
+    # threading.Event
+    # ----------
+    def wait_event(self, event, timeout=None):
+        """Blocks the calling thread until event is set, or for at most
+        timeout seconds of virtual time. Replaces threading.Event.wait().
+        """
+        _t_wake = None if timeout is None else self._now + max(timeout, 0)
+        self._block(t_wake=_t_wake, event=event)
+        return event._flag
+
+    def set_event(self, event):
+        """Wakes up the threads waiting on event with .wait_event(). To be
+        called after threading.Event.set().
+        """
+        with self._lock:
+            for waiter in getattr(event, '_clock_waiters', []):
+                self._wake(waiter)
+            event._clock_waiters = []
+
+    # Holds on the clock
+    # ----------
+    def hold(self):
+        """Prevents the clock from advancing, until .release(). Used
+        while handing work to a thread which has not called the clock yet.
+        """
+        with self._lock:
+            self._n_held += 1
+
+    def release(self):
+        """Releases a .hold(), marking the calling thread as running.
+        """
+        with self._lock:
+            self._n_held -= 1
+            self._running[threading.get_ident()] = (self._real_clock(),
+                                                    self.t_quiet_new)
+
+    def idle(self):
+        """Marks the calling thread as no longer running (eg a worker
+        waiting for its next job, or a thread which has finished).
+        """
+        with self._lock:
+            self._running.pop(threading.get_ident(), None)
+
+    # Internals
+    # ----------
+    def _touch(self):
+        with self._lock:
+            self._running[threading.get_ident()] = (self._real_clock(),
+                                                    self.t_quiet)
+
+    def _block(self, t_wake=None, event=None):
+        """Blocks the calling thread until it is woken up at t_wake (if
+        not None) or by event (if not None).
+        """
+        _ident = threading.get_ident()
+        waiter = _Waiter(_ident, t_wake)
+        with self._lock:
+            if self._stop_signal.is_set():
+                # stopped: threads still running keep a real clock rate
+                if t_wake is not None and event is None:
+                    self._real_sleep(max(t_wake - self._now, 0))
+                return
+            if event is not None and event._flag is True:
+                self._running[_ident] = (self._real_clock(), self.t_quiet)
+                return
+            self._running.pop(_ident, None)
+            self._waiters.add(waiter)
+            if t_wake is not None:
+                heapq.heappush(self._sleepers,
+                               (t_wake, next(self._seq), waiter))
+            if event is not None:
+                if not hasattr(event, '_clock_waiters'):
+                    event._clock_waiters = []
+                event._clock_waiters.append(waiter)
+            self._advance()
+        waiter.block()
+
+        with self._lock:
+            self._running[_ident] = (self._real_clock(), self.t_quiet)
+
+    def _wake(self, waiter):
+        """Wakes up a waiter. Must be called with ._lock held.
+        """
+        if waiter.woken is False:
+            self._running[waiter.ident] = None
+            self._waiters.discard(waiter)
+            self.n_wakeups += 1
+            waiter.wake()
+
+    def _advance(self):
+        """Advances the clock to the next wake-up time, and wakes the
+        corresponding threads, if no thread is running. Must be called
+        with ._lock held.
+        """
+        # discard sleepers already woken up by an event
+        while len(self._sleepers) > 0 and self._sleepers[0][2].woken:
+            heapq.heappop(self._sleepers)
+        if len(self._sleepers) == 0 or self._n_held > 0:
+            return False
+
+        _t_real = self._real_clock()
+        for ident, running in list(self._running.items()):
+            if running is None or _t_real - running[0] < running[1]:
+                return False
+            del self._running[ident]  # quiet: blocked elsewhere
+
+        self._now = max(self._now, self._sleepers[0][0])
+        while len(self._sleepers) > 0 and self._sleepers[0][0] <= self._now:
+            _t_wake, _seq, waiter = heapq.heappop(self._sleepers)
+            self._wake(waiter)
+        return True
+
+    def _drive(self):
+        while not self._stop_signal.is_set():
+            self._real_sleep(self.t_quiet_new / 4)
+            with self._lock:
+                self._advance()
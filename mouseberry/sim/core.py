@@ -0,0 +1,269 @@
+"""
+Simulated experiments: runs whole sessions on a virtual clock, with fake
+GPIO, audio and camera, faster than real time.
+
+Experiment scripts can be run unchanged in a simulation with
+    python -m mouseberry.sim.core my_experiment.py --mouse-id sim
+"""
+
+import argparse
+import builtins
+import importlib
+import runpy
+import sys
+import threading
+import time
+import types
+
+import mouseberry
+from mouseberry.groups.core import Event
+from mouseberry.sim.clock import VirtualClock
+from mouseberry.sim.hardware import SimMouse, FakeGPIO, null_engine
+from mouseberry.tools import audio, scheduler, workers
+from mouseberry.video.fake import FakeCamera
+
+__all__ = ['Simulation']
+
+_missing = object()
+
+
+class Simulation(object):
+    """Context manager running experiments on a virtual clock, with fake
+    hardware.
+
+    Within the simulation:
+        - The time functions of the time module (time, sleep, monotonic,
+        perf_counter and their _ns variants) and threading.Event.wait()
+        are replaced by those of a VirtualClock, so that waits (ITIs,
+        event durations, sampling periods) take no real time.
+        - Schedulers wait on the virtual clock.
+        - RPi.GPIO is replaced by a FakeGPIO whose lickometer inputs are
+        driven by a SimMouse, picamera.PiCamera by FakeCamera, and audio
+        engines by NullEngine. pigpio is disabled, so that rewards are
+        stepped by the software pulse backend.
+        - The GPIO event and measurement classes (eg mb.Lickometer) are
+        available from mouseberry on any platform.
+        - input() (eg the mouse ID prompt of Experiment) returns mouse_id.
+
+    Events, measurements and experiments must be created within the
+    simulation. The experiment writes its .hdf5 file and log as usual.
+
+    Parameters
+    -----------
+    mouse : SimMouse (optional)
+        Model of the mouse. Defaults to SimMouse().
+    inputs : dict (optional)
+        Additional GPIO inputs (see FakeGPIO).
+    mouse_id : str
+        Answer to input() prompts.
+    t_quiet : float
+        See VirtualClock.
+
+    Examples
+    -----------
+    with Simulation(mouse=SimMouse(lick_rate=3)) as sim:
+        licks = mb.Lickometer('licks', pin_in=10, pin_led=11,
+                              sampling_rate=200)
+        ...
+        exp.run(trial_a, trial_b, licks)
+    print(sim.t_virtual, sim.t_real)
+    """
+
+    def __init__(self, mouse=None, inputs=None, mouse_id='sim',
+                 t_quiet=0.5):
+        self.mouse = mouse if mouse is not None else SimMouse()
+        self.inputs = inputs
+        self.mouse_id = mouse_id
+        self.t_quiet = t_quiet
+
+        self._patches = []
+        self.t_virtual = None
+        self.t_real = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """Installs the virtual clock and fake hardware.
+        """
+        self.clock = VirtualClock(t_quiet=self.t_quiet)
+        self.gpio = FakeGPIO(self.clock, mouse=self.mouse,
+                             inputs=self.inputs)
+        self._t_real_start = time.perf_counter()
+
+        self.clock.start()
+        self._patch_time()
+        self._patch_threads()
+        self._patch_hardware()
+        self._patch(builtins, 'input', lambda *args: self.mouse_id)
+
+    def stop(self):
+        """Stops the virtual clock and restores everything.
+        """
+        self.clock.stop()
+        for obj, attr, val in reversed(self._patches):
+            if obj is sys.modules:
+                if val is _missing:
+                    sys.modules.pop(attr, None)
+                else:
+                    sys.modules[attr] = val
+            elif val is _missing:
+                delattr(obj, attr)
+            else:
+                setattr(obj, attr, val)
+        self._patches = []
+
+        self.t_real = time.perf_counter() - self._t_real_start
+        self.t_virtual = self.clock.now
+
+    def _patch(self, obj, attr, val):
+        if obj is sys.modules:
+            self._patches.append((obj, attr, sys.modules.get(attr, _missing)))
+            sys.modules[attr] = val
+        else:
+            if isinstance(obj, types.ModuleType):
+                # without importing lazy attributes (see mouseberry)
+                _val = vars(obj).get(attr, _missing)
+            else:
+                _val = getattr(obj, attr, _missing)
+            self._patches.append((obj, attr, _val))
+            setattr(obj, attr, val)
+
+    def _patch_time(self):
+        clock = self.clock
+        for name in ['time', 'time_ns', 'sleep', 'monotonic', 'monotonic_ns',
+                     'perf_counter', 'perf_counter_ns']:
+            self._patch(time, name, getattr(clock, name))
+
+        def now_ns(sched):
+            return clock.perf_counter_ns()
+
+        def wait_until(sched, t_target_ns):
+            clock.sleep_until(t_target_ns / 1e9)
+            return clock.perf_counter_ns()
+
+        self._patch(scheduler.Scheduler, 'now_ns', now_ns)
+        self._patch(scheduler.SleepScheduler, 'wait_until', wait_until)
+        self._patch(scheduler.HybridScheduler, 'wait_until', wait_until)
+
+    def _patch_threads(self):
+        """Holds the clock from the start of each thread (or the
+        submission of each job to a worker) until it runs.
+        """
+        clock = self.clock
+        _start = threading.Thread.start
+        _submit = workers.WorkerPool.submit
+
+        _join = threading.Thread.join
+
+        def start(thread):
+            _run = thread.run
+            thread._clock_done = threading.Event()
+
+            def run():
+                clock.release()
+                try:
+                    _run()
+                finally:
+                    thread._clock_done.set()
+                    clock.idle()
+            thread.run = run
+            clock.hold()
+            _start(thread)
+
+        def join(thread, timeout=None):
+            if hasattr(thread, '_clock_done'):
+                if not clock.wait_event(thread._clock_done, timeout):
+                    return
+                timeout = None
+            _join(thread, timeout)
+
+        def submit(pool, target, args=()):
+            def _target(*args):
+                clock.release()
+                try:
+                    return target(*args)
+                finally:
+                    clock.idle()
+            clock.hold()
+            return _submit(pool, _target, args)
+
+        self._patch(threading.Thread, 'start', start)
+        self._patch(threading.Thread, 'join', join)
+        self._patch(workers.WorkerPool, 'submit', submit)
+
+        # Wait on threading.Events in virtual time
+        _set = threading.Event.set
+
+        def set(event):
+            _set(event)
+            clock.set_event(event)
+
+        def wait(event, timeout=None):
+            return clock.wait_event(event, timeout)
+
+        self._patch(threading.Event, 'set', set)
+        self._patch(threading.Event, 'wait', wait)
+
+        # Let the mouse react to events
+        mouse = self.mouse
+        _trigger_thread_target = Event.trigger_thread_target
+
+        def trigger_thread_target(event):
+            mouse.notify(event.name, clock.monotonic())
+            _trigger_thread_target(event)
+        self._patch(Event, 'trigger_thread_target', trigger_thread_target)
+
+    def _patch_hardware(self):
+        _rpi = types.ModuleType('RPi')
+        _rpi.GPIO = self.gpio
+        self._patch(sys.modules, 'RPi', _rpi)
+        self._patch(sys.modules, 'RPi.GPIO', self.gpio)
+
+        _picamera = types.ModuleType('picamera')
+        _picamera.PiCamera = FakeCamera
+        self._patch(sys.modules, 'picamera', _picamera)
+        self._patch(sys.modules, 'pigpio', None)  # import raises ImportError
+
+        self._patch(audio, 'get_engine', null_engine)
+        if 'mouseberry.eventtypes.audio' in sys.modules:
+            self._patch(sys.modules['mouseberry.eventtypes.audio'],
+                        'get_engine', null_engine)
+
+        # GPIO events and measurements, using the fake GPIO
+        if 'mouseberry.eventtypes.pi_io' in sys.modules:
+            pi_io = sys.modules['mouseberry.eventtypes.pi_io']
+            self._patch(pi_io, 'gpio', self.gpio)
+        else:
+            # imported with the fake GPIO, and removed at the end
+            self._patches.append((sys.modules, 'mouseberry.eventtypes.pi_io',
+                                  _missing))
+            pi_io = importlib.import_module('mouseberry.eventtypes.pi_io')
+        for name in pi_io.__all__:
+            self._patch(mouseberry, name, getattr(pi_io, name))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs an experiment script '
+                                     'in a simulation, faster than real '
+                                     'time.')
+    parser.add_argument('script', help='Experiment script.')
+    parser.add_argument('--mouse-id', default='sim',
+                        help='Mouse ID entered at the start of the '
+                        'experiment.')
+    parser.add_argument('--lick-rate', type=float, default=2.,
+                        help='Baseline lick rate of the mouse (Hz).')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the mouse model.')
+    args = parser.parse_args()
+
+    sim = Simulation(mouse=SimMouse(lick_rate=args.lick_rate, seed=args.seed),
+                     mouse_id=args.mouse_id)
+    with sim:
+        runpy.run_path(args.script, run_name='__main__')
+    print(f'Simulated {sim.t_virtual:.1f}s in {sim.t_real:.1f}s '
+          f'({sim.t_virtual / sim.t_real:.0f}x real time).')
@@ -0,0 +1,231 @@
+"""
+Fake hardware for simulated experiments: GPIO, a mouse model driving
+the inputs, and null audio. (The fake camera is
+mouseberry.video.fake.FakeCamera.)
+"""
+
+import math
+import threading
+import types
+import numpy as np
+
+from mouseberry.tools.audio import NullEngine
+
+__all__ = ['SimMouse', 'FakeGPIO', 'null_engine']
+
+
+class SimMouse(object):
+    """Model of a mouse licking at random, driving the lickometer inputs
+    of a simulated experiment.
+
+    Licks start as a Poisson process, and each lasts t_lick. The lick
+    rate can increase for a period after given events (eg anticipatory
+    licking after a tone).
+
+    Parameters
+    -----------
+    lick_rate : float
+        Baseline rate of licks (Hz).
+    t_lick : float
+        Duration of each lick (s).
+    responses : dict (optional)
+        Maps event names to a tuple (lick_rate, t_response): after the
+        event starts, the mouse licks at lick_rate (Hz) for t_response
+        seconds.
+    seed : int (optional)
+        Seed of the random number generator.
+    """
+
+    def __init__(self, lick_rate=2., t_lick=0.05, responses=None, seed=None):
+        self.lick_rate = lick_rate
+        self.t_lick = t_lick
+        self.responses = responses if responses is not None else {}
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._windows = []  # (t_start, t_end, lick_rate)
+        self._t_lick_end = -math.inf
+        self._t_next_onset = self._draw_interval(0.)
+
+    def _rate(self, t):
+        _rate = self.lick_rate
+        for t_start, t_end, lick_rate in self._windows:
+            if t_start <= t < t_end:
+                _rate = max(_rate, lick_rate)
+        return _rate
+
+    def _draw_interval(self, t):
+        _rate = self._rate(t)
+        if _rate <= 0:
+            return math.inf
+        return t + self._rng.exponential(1 / _rate)
+
+    def _advance(self, t):
+        while self._t_next_onset <= t:
+            self._t_lick_end = self._t_next_onset + self.t_lick
+            self._t_next_onset = self._draw_interval(self._t_lick_end)
+
+    def notify(self, event_name, t):
+        """Called when an event starts at time t (s, on the clock of the
+        simulation).
+        """
+        if event_name not in self.responses:
+            return
+        _lick_rate, _t_response = self.responses[event_name]
+        with self._lock:
+            self._advance(t)
+            self._windows = [window for window in self._windows
+                             if window[1] > t]
+            self._windows.append((t, t + _t_response, _lick_rate))
+            if t >= self._t_lick_end:
+                self._t_next_onset = min(self._t_next_onset,
+                                         self._draw_interval(t))
+
+    def state(self, t):
+        """Returns 1 if the mouse is licking at time t, and 0 otherwise.
+        """
+        with self._lock:
+            self._advance(t)
+            return int(t < self._t_lick_end)
+
+    def next_edge(self, t):
+        """Returns the time of the next change of state after t.
+        """
+        with self._lock:
+            self._advance(t)
+            if t < self._t_lick_end:
+                return self._t_lick_end
+            return self._t_next_onset
+
+
+class FakeGPIO(types.ModuleType):
+    """Module replacing RPi.GPIO in a simulation.
+
+    Outputs are stored in .levels. Inputs read from .inputs if set
+    there, from the mouse if they have a pull-down resistor (as
+    lickometers do), and otherwise from their pull resistor (eg 1 for
+    the limit switch of a RewardStepper).
+
+    Parameters
+    -----------
+    clock : VirtualClock
+        Clock of the simulation.
+    mouse : SimMouse (optional)
+        Mouse driving the pulled-down inputs.
+    inputs : dict (optional)
+        Maps pins to a SimMouse-like object (with .state(t), and
+        optionally .next_edge(t)) or a function f(t) returning the level
+        of the pin at time t (s).
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, clock, mouse=None, inputs=None):
+        super().__init__('RPi.GPIO')
+        self.clock = clock
+        self.mouse = mouse
+        self.inputs = dict(inputs) if inputs is not None else {}
+
+        self.t_step = 0.001
+        self.levels = {}
+        self.n_writes = {}
+        self._pulls = {}
+        self._edge_threads = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        for pin in self._pins(channel):
+            if direction == self.IN:
+                self._pulls[pin] = pull_up_down
+            elif initial is not None:
+                self.levels[pin] = int(initial)
+
+    def output(self, channel, value):
+        for pin in self._pins(channel):
+            self.levels[pin] = int(value)
+            self.n_writes[pin] = self.n_writes.get(pin, 0) + 1
+
+    def input(self, channel):
+        _source = self._source(channel)
+        if _source is None:
+            return int(self._pulls.get(channel) == self.PUD_UP)
+
+        _t = self.clock.monotonic()
+        if hasattr(_source, 'state'):
+            return int(_source.state(_t))
+        return int(_source(_t))
+
+    def add_event_detect(self, channel, edge, callback=None,
+                         bouncetime=None):
+        """Calls callback(channel) in a background thread on every change
+        of state of the input (rising and falling edges alike). The input
+        is checked at its next edge, and at least every .t_step (s).
+        """
+        _stop_signal = threading.Event()
+        _thread = threading.Thread(target=self._edge_loop,
+                                   args=(channel, callback, _stop_signal),
+                                   daemon=True)
+        self._edge_threads[channel] = (_thread, _stop_signal)
+        _thread.start()
+
+    def remove_event_detect(self, channel):
+        _thread, _stop_signal = self._edge_threads.pop(channel)
+        _stop_signal.set()
+
+    def cleanup(self, channel=None):
+        pass
+
+    def _pins(self, channel):
+        if type(channel) in [list, tuple]:
+            return channel
+        return [channel]
+
+    def _source(self, pin):
+        if pin in self.inputs:
+            return self.inputs[pin]
+        elif self._pulls.get(pin) == self.PUD_DOWN:
+            return self.mouse
+        return None
+
+    def _edge_loop(self, channel, callback, stop_signal):
+        _source = self._source(channel)
+        if _source is None:
+            return
+        _level = self.input(channel)
+        while not stop_signal.is_set():
+            _t = self.clock.monotonic()
+            # check at least every t_step, since the next edge of the
+            # source may change (eg after an event)
+            _t_next = _t + self.t_step
+            if hasattr(_source, 'next_edge'):
+                _t_next = min(_source.next_edge(_t), _t_next)
+            self.clock.sleep_until(_t_next)
+
+            _new_level = self.input(channel)
+            if _new_level != _level and not stop_signal.is_set():
+                _level = _new_level
+                if callback is not None:
+                    callback(channel)
+
+
+def null_engine(engine='auto', device=None):
+    """Replaces mouseberry.tools.audio.get_engine() in a simulation:
+    sounds are not played, but take as long as they would.
+    """
+    return NullEngine()
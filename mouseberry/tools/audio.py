@@ -0,0 +1,313 @@
+"""
+Audio engines for synthesizing and playing sounds with low onset latency.
+"""
+
+import os
+import time
+import shutil
+import threading
+import functools
+import numpy as np
+
+__all__ = ['synth_tone', 'AudioEngine', 'StreamEngine', 'SoxEngine',
+           'NullEngine', 'resolve_engine', 'get_engine']
+
+
+@functools.lru_cache(maxsize=64)
+def synth_tone(freq, t_dur, db, sampling_rate=44100, n_channels=2):
+    """Synthesizes a pure tone as a NumPy buffer.
+
+    Buffers are cached, so that a tone with the same parameters is only
+    synthesized once. The returned buffer is read-only.
+
+    Parameters
+    -----------
+    freq : float
+        Frequency of the tone (Hz)
+    t_dur : float
+        Duration of the tone (s)
+    db : float
+        Volume of the tone (dB relative to full scale)
+    sampling_rate : int
+        Sampling rate (Hz)
+    n_channels : int
+        Number of (identical) channels.
+
+    Returns
+    -----------
+    buffer : np.ndarray
+        float32 array of shape (n_samples, n_channels).
+    """
+    _t = np.arange(int(round(t_dur * sampling_rate))) / sampling_rate
+    _wave = (10**(db/20) * np.sin(2*np.pi*freq*_t)).astype(np.float32)
+
+    buffer = np.repeat(_wave[:, None], n_channels, axis=1)
+    buffer.flags.writeable = False
+    return buffer
+
+
+class AudioEngine(object):
+    """Base class for audio engines.
+
+    An engine prepares sounds ahead of time and plays them on request,
+    returning the onset latency of each sound.
+
+    Notes on child class methods
+    ---------
+    .prepare_tone(freq, t_dur, db): required
+        - Method must return a sound (in any format) which .play() accepts.
+    .play(sound): required
+        - Method must play the sound, block until it has finished, and
+        return the onset latency (s) of the sound, from the call to
+        .play() to the sound reaching the output (nan if unknown).
+        - Both are called by Tone (mouseberry.eventtypes.audio), which
+        reports an error if they are not set.
+    .close(): optional
+        - Method can release the resources (eg devices) of the engine.
+        It must be safe to call more than once.
+
+    Notes on sharing
+    ---------
+    Engines are shared between sounds (see get_engine()). Each user
+    calls .acquire() when an experiment starts and .release() when it
+    ends; the engine is closed when its last user releases it.
+    """
+    _n_users = 0
+
+    def acquire(self):
+        """Registers a user of the engine.
+        """
+        self._n_users += 1
+
+    def release(self):
+        """Unregisters a user of the engine, and closes the engine if it
+        has no users left.
+        """
+        self._n_users = max(self._n_users - 1, 0)
+        if self._n_users == 0:
+            self.close()
+
+    def close(self):
+        pass
+
+
+class StreamEngine(AudioEngine):
+    """Engine playing NumPy buffers through a persistent, already-open
+    output stream (requires the sounddevice package).
+
+    The stream is opened when the engine is acquired (at the start of
+    an experiment) and keeps running, writing silence between sounds,
+    so that playing a sound only requires handing its buffer to the
+    stream callback. Sounds are played one at a time.
+
+    The onset latency of each sound is measured from the stream clock, as
+    the time between the call to .play() and the time at which the first
+    block containing the sound reaches the output (DAC).
+
+    Parameters
+    -----------
+    device : int or str (optional)
+        Output device, as accepted by sounddevice (eg 'hw:1,0').
+        Defaults to the default output device.
+    sampling_rate : int
+        Sampling rate (Hz).
+    n_channels : int
+        Number of output channels.
+    blocksize : int
+        Number of frames written by each call of the stream callback.
+        Smaller blocks reduce onset jitter, at a higher CPU cost.
+    """
+
+    def __init__(self, device=None, sampling_rate=44100, n_channels=2,
+                 blocksize=256):
+        try:
+            import sounddevice
+        except (ImportError, OSError) as err:
+            # (OSError if the PortAudio library is missing)
+            raise ImportError(f'StreamEngine requires the sounddevice package '
+                              f'and PortAudio (pip install sounddevice): '
+                              f"{err}. Alternatively, use engine='sox'.")
+        self._sd = sounddevice
+
+        self.device = device
+        self.sampling_rate = sampling_rate
+        self.n_channels = n_channels
+        self.blocksize = blocksize
+
+        self._stream = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._sound = None
+        self._pos = 0
+        self._t_dac_onset = np.nan
+
+    def acquire(self):
+        super().acquire()
+        self.open()
+
+    def open(self):
+        """Opens and starts the output stream, if it is not running.
+        """
+        if self._stream is not None:
+            return
+        self._stream = self._sd.OutputStream(
+            samplerate=self.sampling_rate, channels=self.n_channels,
+            dtype='float32', blocksize=self.blocksize, latency='low',
+            device=self.device, callback=self._callback)
+        self._stream.start()
+
+    def prepare_tone(self, freq, t_dur, db):
+        return synth_tone(freq, t_dur, db, sampling_rate=self.sampling_rate,
+                          n_channels=self.n_channels)
+
+    def play(self, sound):
+        self.open()
+        with self._lock:
+            self._done.clear()
+            self._t_dac_onset = np.nan
+            self._pos = 0
+            _t_request = self._stream.time
+            self._sound = sound  # publish last; picked up by the callback
+
+            self._done.wait(timeout=len(sound)/self.sampling_rate + 1)
+            return self._t_dac_onset - _t_request
+
+    def _callback(self, outdata, frames, time_info, status):
+        """Stream callback. Writes the current sound, or silence.
+        """
+        _sound = self._sound
+        if _sound is None:
+            outdata.fill(0)
+            return
+
+        _pos = self._pos
+        _n = min(frames, len(_sound) - _pos)
+        outdata[:_n] = _sound[_pos:_pos+_n]
+        outdata[_n:] = 0
+
+        if _pos == 0:
+            self._t_dac_onset = time_info.outputBufferDacTime
+        self._pos = _pos + _n
+
+        if self._pos >= len(_sound):
+            self._sound = None
+            self._done.set()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class SoxEngine(AudioEngine):
+    """Engine writing sounds to .wav files with sox, and playing each one
+    in a new `play` process (requires the sox binary).
+
+    This is the original mouseberry behavior. A new process is started
+    and the sound device is opened on every call to .play(), so the onset
+    latency is variable and cannot be measured (it is returned as nan).
+
+    Parameters
+    -----------
+    device : int (optional)
+        ALSA card of the output device, on the RPi.
+    folder : str
+        Folder for temporary .wav files.
+    """
+
+    def __init__(self, device=None, folder='temp'):
+        self.device = device
+        self.folder = folder
+
+    def prepare_tone(self, freq, t_dur, db):
+        if not os.path.isdir(self.folder):
+            os.mkdir(self.folder)
+
+        fname = os.path.join(self.folder, f'tone_{freq}_{t_dur}_{db}.wav')
+        if not os.path.isfile(fname):
+            os.system(f'sox -V0 -r 44100 -n -b 8 -c 2 '
+                      + f'{fname} synth {t_dur} '
+                      + f'sin {freq} vol {db}dB')
+        return fname
+
+    def play(self, sound):
+        if self.device is not None:
+            os.system(f'AUDIODRIVER=alsa AUDIODEV=hw:{self.device},0 '
+                      + f'play -V0 -q {sound}')
+        else:
+            os.system(f'play -V0 -q {sound}')
+        return np.nan
+
+    def close(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+
+
+class NullEngine(AudioEngine):
+    """Engine which plays nothing, but takes as long as the sound would.
+    Useful to run experiments without an audio device.
+    """
+
+    def __init__(self, sampling_rate=44100):
+        self.sampling_rate = sampling_rate
+
+    def prepare_tone(self, freq, t_dur, db):
+        return t_dur
+
+    def play(self, sound):
+        time.sleep(sound)
+        return 0.0
+
+
+_engine_classes = {'stream': StreamEngine,
+                   'sox': SoxEngine,
+                   'null': NullEngine}
+_engines = {}
+
+
+@functools.lru_cache(maxsize=1)
+def _stream_available():
+    try:
+        import sounddevice  # noqa: F401
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def resolve_engine(engine):
+    """Returns the engine used for engine='auto': 'stream' if the
+    sounddevice package and PortAudio are available, otherwise 'sox'.
+    Other engines are returned as-is.
+    """
+    if isinstance(engine, str) and engine == 'auto':
+        return 'stream' if _stream_available() else 'sox'
+    return engine
+
+
+def get_engine(engine='auto', device=None):
+    """Returns a shared audio engine, creating it on first use.
+
+    All sounds played through the same engine type and device share
+    one engine (and so, for 'stream', one open output stream).
+
+    Parameters
+    -----------
+    engine : str or AudioEngine
+        'stream' (StreamEngine), 'sox' (SoxEngine), 'null' (NullEngine)
+        or 'auto' (see resolve_engine()). An AudioEngine instance is
+        returned as-is.
+    device : int or str (optional)
+        Output device, passed to the engine.
+    """
+    if isinstance(engine, AudioEngine):
+        return engine
+    engine = resolve_engine(engine)
+
+    _key = (engine, device)
+    if _key not in _engines:
+        if engine == 'null':
+            _engines[_key] = NullEngine()
+        else:
+            _engines[_key] = _engine_classes[engine](device=device)
+    return _engines[_key]
@@ -0,0 +1,231 @@
+"""
+Lightweight, vectorized distributions of times, using only numpy.
+
+Each distribution has the .rvs(size, random_state, **args) method of
+scipy.stats distributions, so it can be used in TimeDist and pick_time
+in place of one (eg dists.norm instead of scipy.stats.norm). They also
+draw values strictly between two limits exactly (.rvs_between()), by
+inverting their cumulative distribution function over the limits,
+rather than by rejection sampling.
+
+Examples
+-----------
+from mouseberry.tools import dists
+iti = mb.TimeDist(t_dist=dists.norm, t_args={'loc': 4, 'scale': 1},
+                  t_min=2, t_max=6)
+"""
+
+import math
+import numpy as np
+
+__all__ = ['Dist', 'norm', 'expon', 'uniform', 'hazard', 'discrete']
+
+
+def _get_rng(random_state):
+    # None draws from the global np.random state (np.random.random,
+    # .uniform and .choice), as scipy.stats does, so that np.random.seed()
+    # (eg by make_plan()) makes draws reproducible
+    if random_state is None:
+        return np.random
+    if isinstance(random_state, (np.random.Generator,
+                                 np.random.RandomState)):
+        return random_state
+    return np.random.default_rng(random_state)
+
+
+def _ndtr(x):
+    """Standard normal cumulative distribution function (scalar).
+    """
+    return 0.5 * math.erfc(-x / math.sqrt(2))
+
+
+# Coefficients of the rational approximations of the inverse of the
+# standard normal cdf (P. J. Acklam), with a relative error < 1.2e-9.
+_A = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+_B = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01]
+_C = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+_D = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00]
+
+
+def _ndtri(p):
+    """Inverse of the standard normal cumulative distribution function
+    (vectorized, for 0 < p < 1).
+    """
+    p = np.asarray(p, dtype=np.float64)
+    x = np.empty_like(p)
+    _p_low = 0.02425
+
+    _low = p < _p_low
+    _high = p > 1 - _p_low
+    _mid = ~(_low | _high)
+
+    q = np.sqrt(-2 * np.log(p[_low]))
+    x[_low] = (((((_C[0]*q + _C[1])*q + _C[2])*q + _C[3])*q + _C[4])*q
+               + _C[5]) / ((((_D[0]*q + _D[1])*q + _D[2])*q + _D[3])*q + 1)
+
+    q = np.sqrt(-2 * np.log1p(-p[_high]))
+    x[_high] = -(((((_C[0]*q + _C[1])*q + _C[2])*q + _C[3])*q + _C[4])*q
+                 + _C[5]) / ((((_D[0]*q + _D[1])*q + _D[2])*q + _D[3])*q + 1)
+
+    q = p[_mid] - 0.5
+    r = q * q
+    x[_mid] = (((((_A[0]*r + _A[1])*r + _A[2])*r + _A[3])*r + _A[4])*r
+               + _A[5]) * q / (((((_B[0]*r + _B[1])*r + _B[2])*r + _B[3])*r
+                                + _B[4])*r + 1)
+    return x
+
+
+class Dist(object):
+    """Base class for distributions.
+
+    Notes on child class methods
+    -----------
+    Child classes define ._draw(rng, size, t_min, t_max, **args), which
+    returns size values strictly between t_min and t_max (which can be
+    infinite), from rng (a np.random.Generator or RandomState: only
+    their common methods are used).
+    """
+
+    def rvs(self, size=None, random_state=None, **args):
+        """Draws random values, like scipy.stats distributions.
+
+        Parameters
+        -----------
+        size : int (optional)
+            Number of values. If None, a single float is returned.
+        random_state : int, np.random.Generator, np.random.RandomState
+            or None (optional)
+            Seed or generator. If None, values are drawn from the global
+            np.random state.
+        **args
+            Parameters of the distribution (eg loc, scale).
+        """
+        return self.rvs_between(-math.inf, math.inf, size=size,
+                                random_state=random_state, **args)
+
+    def rvs_between(self, t_min, t_max, size=None, random_state=None,
+                    **args):
+        """Draws random values strictly between t_min and t_max, from the
+        distribution truncated to these limits. See .rvs().
+        """
+        if not t_min < t_max:
+            raise ValueError(f't_min ({t_min}) must be smaller than '
+                             f't_max ({t_max}).')
+        _size = 1 if size is None else size
+        vals = self._draw(_get_rng(random_state), _size, t_min, t_max,
+                          **args)
+        return float(vals[0]) if size is None else vals
+
+
+class _Norm(Dist):
+    """Normal distribution, with mean loc and standard deviation scale.
+    """
+
+    def _draw(self, rng, size, t_min, t_max, loc=0., scale=1.):
+        a, b = (t_min - loc) / scale, (t_max - loc) / scale
+        # sample the lower tail when possible, where the cdf is precise
+        _flip = a > 0
+        if _flip:
+            a, b = -b, -a
+        p_a, p_b = _ndtr(a), _ndtr(b)
+        if not p_b > p_a:
+            raise ValueError(f'No values can be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+
+        p = p_a + rng.random(size) * (p_b - p_a)
+        p = np.clip(p, np.nextafter(p_a, 1), np.nextafter(p_b, 0))
+        x = np.clip(_ndtri(p), a, b)
+        if _flip:
+            x = -x
+        return loc + scale * x
+
+
+class _Expon(Dist):
+    """Exponential distribution, starting at loc with mean loc + scale.
+    """
+
+    def _draw(self, rng, size, t_min, t_max, loc=0., scale=1.):
+        # the exponential is memoryless: truncating it to [a, b] gives
+        # a + an exponential truncated to [0, b - a]
+        a = max((t_min - loc) / scale, 0.)
+        b = (t_max - loc) / scale
+        if not b > a:
+            raise ValueError(f'No values can be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+
+        _p_max = -math.expm1(-(b - a))  # cdf of b - a
+        x = a - np.log1p(-rng.random(size) * _p_max)
+        return loc + scale * x
+
+
+class _Uniform(Dist):
+    """Uniform distribution between loc and loc + scale.
+    """
+
+    def _draw(self, rng, size, t_min, t_max, loc=0., scale=1.):
+        a, b = max(t_min, loc), min(t_max, loc + scale)
+        if not b > a:
+            raise ValueError(f'No values can be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+        return rng.uniform(a, b, size)
+
+
+class _Hazard(Dist):
+    """Geometric (flat hazard) distribution: at each step of t_step
+    seconds after loc, the time is reached with probability p. Values
+    are loc + k * t_step, with k = 1, 2, ...
+
+    With a small t_step, this approximates an exponential distribution
+    with mean loc + t_step / p, on a grid of t_step.
+    """
+
+    def _draw(self, rng, size, t_min, t_max, p=0.1, t_step=1., loc=0.):
+        if not 0 < p <= 1:
+            raise ValueError(f'p must be between 0 and 1, not {p}.')
+        # steps strictly between t_min and t_max
+        k_min = 1 if math.isinf(t_min) \
+            else max(math.floor((t_min - loc) / t_step) + 1, 1)
+        k_max = math.inf if math.isinf(t_max) \
+            else math.ceil((t_max - loc) / t_step) - 1
+        if not k_max >= k_min:
+            raise ValueError(f'No values can be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+        if p == 1:
+            return np.full(size, loc + k_min * t_step)
+
+        # memoryless: k_min + a geometric truncated to n_steps values
+        _log_q = math.log1p(-p)
+        _n_steps = k_max - k_min + 1
+        _p_max = 1. if math.isinf(_n_steps) \
+            else -math.expm1(_n_steps * _log_q)
+        j = np.floor(np.log1p(-rng.random(size) * _p_max) / _log_q)
+        j = np.minimum(j, _n_steps - 1)
+        return loc + (k_min + j) * t_step
+
+
+class _Discrete(Dist):
+    """Distribution over a set of values, each drawn with probability p
+    (uniform if p is None).
+    """
+
+    def _draw(self, rng, size, t_min, t_max, values=(), p=None):
+        values = np.asarray(values, dtype=np.float64)
+        p = np.full(len(values), 1.) if p is None \
+            else np.asarray(p, dtype=np.float64)
+        _valid = (values > t_min) & (values < t_max) & (p > 0)
+        if not np.any(_valid):
+            raise ValueError(f'No values can be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+        values, p = values[_valid], p[_valid]
+        return rng.choice(values, size=size, p=p / np.sum(p))
+
+
+norm = _Norm()
+expon = _Expon()
+uniform = _Uniform()
+hazard = _Hazard()
+discrete = _Discrete()
@@ -0,0 +1,247 @@
+"""
+Generation of timed pulse trains (eg stepper motor steps) on a GPIO pin.
+"""
+
+import time
+import numpy as np
+
+from mouseberry.tools.scheduler import HybridScheduler
+
+__all__ = ['step_intervals', 'PulseBackend', 'PigpioBackend',
+           'SoftwareBackend', 'make_pulse_backend']
+
+
+def step_intervals(n_steps, step_rate, ramp_steps=0, start_rate=None):
+    """Computes the interval before each step of a pulse train with
+    optional linear acceleration and deceleration ramps.
+
+    Parameters
+    -----------
+    n_steps : int
+        Number of steps.
+    step_rate : float
+        Step rate after acceleration (steps/s).
+    ramp_steps : int
+        Number of steps over which the rate ramps up from start_rate to
+        step_rate (and back down at the end). Limited to n_steps // 2.
+    start_rate : float (optional)
+        Step rate at the start and end of the ramps (steps/s).
+        Defaults to step_rate / 10.
+
+    Returns
+    -----------
+    intervals : np.ndarray
+        Interval of each step (int, us).
+    """
+    n_steps = int(n_steps)
+    rates = np.full(n_steps, float(step_rate))
+
+    ramp_steps = min(int(ramp_steps), n_steps // 2)
+    if ramp_steps > 0:
+        if start_rate is None:
+            start_rate = step_rate / 10
+        _ramp = np.linspace(start_rate, step_rate, ramp_steps)
+        rates[:ramp_steps] = _ramp
+        rates[n_steps-ramp_steps:] = _ramp[::-1]
+
+    return np.round(1e6 / rates).astype(np.int64)
+
+
+class PulseBackend(object):
+    """Base class for pulse train backends.
+
+    Notes on child class methods
+    ---------
+    .run(pin, intervals, check=None): required
+        - Method must output one pulse on pin per entry of intervals
+        (us, from rising edge to rising edge, 50% duty cycle), and block
+        until the pulse train is done.
+        - If check is given, it is called repeatedly, and the pulse train
+        is stopped early as soon as it returns False.
+        - Method must return the number of pulses delivered, and the
+        duration of the pulse train (s).
+        - It is called by RewardStepper (mouseberry.eventtypes.pi_io),
+        which reports an error if it is not set.
+    .close(): optional
+        - Method can release the resources of the backend.
+    """
+
+    def close(self):
+        pass
+
+
+class PigpioBackend(PulseBackend):
+    """Backend generating hardware-timed (DMA) pulse trains with the
+    pigpio daemon (requires the pigpio package, and `sudo pigpiod`).
+
+    The pulse train is split into waveforms of .chunk_steps steps. The next
+    waveform is created while the current one is transmitted, and queued
+    to start exactly when it ends, so that long pulse trains fit in the
+    limited waveform memory of pigpio.
+
+    Parameters
+    -----------
+    host : str (optional)
+        Host running the pigpio daemon (default: localhost).
+    chunk_steps : int
+        Number of steps per waveform.
+    t_poll : float
+        Period at which check() is called during transmission (s).
+    """
+
+    def __init__(self, host=None, chunk_steps=1000, t_poll=0.001):
+        import pigpio
+        self._pigpio = pigpio
+
+        self.pi = pigpio.pi() if host is None else pigpio.pi(host)
+        if not self.pi.connected:
+            raise RuntimeError('Could not connect to the pigpio daemon. '
+                               'Start it with `sudo pigpiod`.')
+        self.chunk_steps = chunk_steps
+        self.t_poll = t_poll
+
+    def _create_wave(self, pin, intervals):
+        _pulses = []
+        for interval in intervals:
+            _t_high = int(interval) // 2
+            _pulses.append(self._pigpio.pulse(1 << pin, 0, _t_high))
+            _pulses.append(self._pigpio.pulse(0, 1 << pin,
+                                              int(interval) - _t_high))
+        self.pi.wave_add_generic(_pulses)
+        return self.pi.wave_create()
+
+    def run(self, pin, intervals, check=None):
+        intervals = np.asarray(intervals)
+        if len(intervals) == 0:
+            return 0, 0.
+
+        self.pi.set_mode(pin, self._pigpio.OUTPUT)
+        self.pi.wave_clear()
+
+        _chunks = [intervals[ind:ind+self.chunk_steps]
+                   for ind in range(0, len(intervals), self.chunk_steps)]
+        _waves = [self._create_wave(pin, _chunks[0])]
+
+        _t_start = time.perf_counter()
+        self.pi.wave_send_using_mode(_waves[0],
+                                     self._pigpio.WAVE_MODE_ONE_SHOT)
+
+        _completed = True
+        for chunk in _chunks[1:]:
+            _waves.append(self._create_wave(pin, chunk))
+
+            # queue the new wave once the previous one has started
+            if not self._wait_for_wave(_waves[-2], check):
+                _completed = False
+                break
+            self.pi.wave_send_using_mode(
+                _waves[-1], self._pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            if len(_waves) > 2:
+                self.pi.wave_delete(_waves.pop(0))
+
+        if _completed:
+            _completed = self._wait_for_wave(None, check)
+        _t_elapsed = time.perf_counter() - _t_start
+
+        self.pi.wave_tx_stop()
+        self.pi.write(pin, 0)
+        self.pi.wave_clear()
+
+        if _completed:  # hardware-timed, so the duration is exact
+            return len(intervals), float(np.sum(intervals)) / 1e6
+
+        _t_rise = np.cumsum(intervals) - intervals
+        n_pulses = int(np.searchsorted(_t_rise, _t_elapsed * 1e6,
+                                       side='right'))
+        return n_pulses, _t_elapsed
+
+    def _wait_for_wave(self, wave_id, check):
+        """Waits until the wave wave_id is being transmitted (or, if
+        wave_id is None, until transmission ends). Returns False if
+        check() failed first.
+        """
+        while True:
+            if wave_id is None and not self.pi.wave_tx_busy():
+                return True
+            if wave_id is not None and self.pi.wave_tx_at() == wave_id:
+                return True
+            if check is not None and not check():
+                return False
+            time.sleep(self.t_poll)
+
+    def close(self):
+        self.pi.stop()
+
+
+class SoftwareBackend(PulseBackend):
+    """Backend generating pulse trains from Python, by writing the pin at
+    precomputed absolute times with a Scheduler.
+
+    Since edge times are absolute, timing errors do not accumulate
+    over the pulse train. Individual edges are still subject to
+    scheduling latency (typically tens of us).
+
+    Parameters
+    -----------
+    output : function
+        Function writing a pin, output(pin, value) (eg RPi.GPIO.output).
+    scheduler : Scheduler (optional)
+        Scheduler used to wait for each edge. Defaults to
+        HybridScheduler().
+    """
+
+    def __init__(self, output, scheduler=None):
+        self.output = output
+        if scheduler is None:
+            scheduler = HybridScheduler()
+        self.scheduler = scheduler
+
+    def run(self, pin, intervals, check=None):
+        intervals = np.asarray(intervals, dtype=np.int64)
+        _t_rise = np.zeros(len(intervals), dtype=np.int64)
+        np.cumsum(intervals[:-1] * 1000, out=_t_rise[1:])
+        _t_fall = _t_rise + intervals * 500
+
+        _t_start = self.scheduler.now_ns()
+        n_pulses = 0
+        for ind in range(len(intervals)):
+            if check is not None and not check():
+                break
+            self.scheduler.wait_until(_t_start + int(_t_rise[ind]))
+            self.output(pin, 1)
+            self.scheduler.wait_until(_t_start + int(_t_fall[ind]))
+            self.output(pin, 0)
+            n_pulses += 1
+
+        if n_pulses == len(intervals) and n_pulses > 0:
+            self.scheduler.wait_until(_t_start + int(_t_rise[-1])
+                                      + int(intervals[-1]) * 1000)
+        _t_duration = (self.scheduler.now_ns() - _t_start) / 1e9
+        return n_pulses, _t_duration
+
+
+def make_pulse_backend(backend, output):
+    """Creates a pulse backend.
+
+    Parameters
+    -----------
+    backend : str or PulseBackend
+        'pigpio' (PigpioBackend), 'software' (SoftwareBackend) or 'auto'
+        (PigpioBackend if pigpio is installed and its daemon is running,
+        otherwise SoftwareBackend). A PulseBackend is returned as-is.
+    output : function
+        Function writing a pin, used by SoftwareBackend.
+    """
+    if isinstance(backend, PulseBackend):
+        return backend
+    elif backend == 'pigpio':
+        return PigpioBackend()
+    elif backend == 'software':
+        return SoftwareBackend(output=output)
+    elif backend == 'auto':
+        try:
+            return PigpioBackend()
+        except (ImportError, RuntimeError):
+            return SoftwareBackend(output=output)
+    raise ValueError(f"backend must be 'auto', 'pigpio' or 'software', "
+                     f"not {backend}.")
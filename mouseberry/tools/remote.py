@@ -0,0 +1,390 @@
+"""
+Low-latency control of stimuli (eg videos) played on a remote computer.
+
+A StimulusServer runs on the remote computer and keeps players loaded,
+so that playing a stimulus only requires sending one line over an
+already-open connection. A RemoteStimulusClient holds that connection
+(either a persistent SSH channel, or a TCP socket), and reconnects
+automatically if it drops.
+
+Protocol
+-----------
+One request or reply per line. Every request carries an id, and is
+answered by 'OK {id}' (or 'ERR {id} {message}') once it is done on the
+remote side. PLAY requests are answered as soon as the player has
+started, and then by 'DONE {id} {returncode}' when it exits.
+
+    LOAD {id} {key} {file}  : prepares a player for file under key
+    PLAY {id} {key}         : starts the player of key
+    PING {id}               : does nothing (round-trip time test)
+
+Starting a server on the remote computer
+-----------
+>> python3 -m mouseberry.tools.remote --port 5005 \\
+>>     --cmd 'omxplayer --no-osd -o hdmi {file}'
+"""
+
+import sys
+import time
+import shlex
+import socket
+import argparse
+import itertools
+import threading
+import subprocess
+from types import SimpleNamespace
+
+__all__ = ['RemoteStimulusClient', 'StimulusServer', 'get_client']
+
+DEFAULT_CMD = 'omxplayer --no-osd -o hdmi {file}'
+
+
+class RemoteStimulusClient(object):
+    """Client sending stimulus commands to a StimulusServer over a
+    persistent connection.
+
+    Parameters
+    -----------
+    hostname : str
+        Hostname of the remote computer.
+    transport : str
+        - 'ssh' (default): connects through SSH (with paramiko) and starts
+        a StimulusServer on the remote computer, communicating over the
+        stdin and stdout of one persistent channel. Requires mouseberry
+        on the remote computer.
+        - 'socket': connects over TCP to a StimulusServer already
+        running on the remote computer.
+    port : int
+        SSH port ('ssh') or server port ('socket').
+    username : str
+        SSH username.
+    password : str
+        SSH password.
+    cmd : str
+        Player command run by the server for each stimulus, with {file}
+        replaced by the stimulus file ('ssh' only; a 'socket' server
+        sets its own command).
+    timeout : float
+        Time to wait for each reply (s).
+    keepalive : float
+        Interval of keep-alive packets on the connection (s).
+    n_retries : int
+        Number of times a request is retried on a new connection
+        if the connection fails.
+    """
+
+    def __init__(self, hostname, transport='ssh', port=22, username='pi',
+                 password='raspberry', cmd=DEFAULT_CMD, timeout=5.,
+                 keepalive=5., n_retries=2,
+                 remote_python='python3'):
+        assert transport in ['ssh', 'socket'], \
+            f"transport must be 'ssh' or 'socket', not {transport}."
+        self.hostname = hostname
+        self.transport = transport
+        self.port = port
+        self.username = username
+        self.password = password
+        self.cmd = cmd
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.n_retries = n_retries
+        self.remote_python = remote_python
+
+        self._conn = None
+        self._loaded = {}
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Opens the connection (if it is closed), and loads all
+        previously loaded stimuli on the server.
+        """
+        with self._lock:
+            if self._conn is not None:
+                return
+            if self.transport == 'ssh':
+                self._conn = self._open_ssh()
+            else:
+                self._conn = self._open_socket()
+
+            self._conn.reader = threading.Thread(
+                target=self._read_loop, args=(self._conn,), daemon=True)
+            self._conn.reader.start()
+
+        for key, fname in self._loaded.items():
+            self._request(f'LOAD {{id}} {key} {fname}')
+
+    def _open_socket(self):
+        _sock = socket.create_connection((self.hostname, self.port),
+                                         timeout=self.timeout)
+        _sock.settimeout(None)
+        _sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return SimpleNamespace(rfile=_sock.makefile('r'),
+                               wfile=_sock.makefile('w'),
+                               close=_sock.close)
+
+    def _open_ssh(self):
+        import paramiko
+
+        _ssh = paramiko.SSHClient()
+        _ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        _ssh.connect(hostname=self.hostname, port=self.port,
+                     username=self.username, password=self.password,
+                     timeout=self.timeout)
+        _ssh.get_transport().set_keepalive(int(self.keepalive))
+
+        _chan = _ssh.get_transport().open_session()
+        _chan.exec_command(f'{self.remote_python} -m mouseberry.tools.remote '
+                           f'--stdio --cmd {shlex.quote(self.cmd)}')
+        return SimpleNamespace(rfile=_chan.makefile('r'),
+                               wfile=_chan.makefile('w'),
+                               close=_ssh.close)
+
+    def _read_loop(self, conn):
+        """Reads replies and hands them to the waiting requests.
+        """
+        try:
+            for line in conn.rfile:
+                _reply = line.split(maxsplit=2)
+                if len(_reply) < 2 or _reply[1] not in self._pending:
+                    continue
+                _pending = self._pending[_reply[1]]
+                if _reply[0] == 'DONE':
+                    _pending.done.set()
+                else:
+                    _pending.reply = _reply
+                    _pending.t_reply = time.perf_counter()
+                    _pending.answered.set()
+        except (OSError, ValueError):
+            pass
+
+        # connection lost: wake up all waiting requests
+        for _pending in list(self._pending.values()):
+            _pending.answered.set()
+            _pending.done.set()
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+
+    def _request(self, line, wait_done=False):
+        """Sends a request on the current connection and waits for its
+        reply. Returns the round-trip time (s).
+
+        Raises OSError if the connection fails or no reply arrives.
+        """
+        _id = str(next(self._ids))
+        _pending = SimpleNamespace(answered=threading.Event(),
+                                   done=threading.Event(), reply=None)
+        self._pending[_id] = _pending
+        _started = False
+
+        try:
+            _conn = self._conn
+            if _conn is None:
+                raise OSError('Not connected.')
+
+            _t_send = time.perf_counter()
+            _conn.wfile.write(line.replace('{id}', _id) + '\n')
+            _conn.wfile.flush()
+
+            if not _pending.answered.wait(self.timeout) \
+                    or _pending.reply is None:
+                raise OSError(f'No reply from {self.hostname} '
+                              f'to "{line.split()[0]}".')
+            if _pending.reply[0] == 'ERR':
+                raise RuntimeError(f'Remote error: {_pending.reply[2]}')
+
+            _started = line.startswith('PLAY')
+            if wait_done:
+                _pending.done.wait()
+            return _pending.t_reply - _t_send
+        finally:
+            if _started and not wait_done:
+                # keep listening for DONE in the background
+                threading.Thread(target=self._forget, args=(_id,),
+                                 daemon=True).start()
+            else:
+                self._pending.pop(_id, None)
+
+    def _forget(self, _id):
+        self._pending[_id].done.wait()
+        self._pending.pop(_id, None)
+
+    def _request_with_retry(self, line, wait_done=False):
+        for ind_try in range(self.n_retries + 1):
+            try:
+                self.connect()
+                return self._request(line, wait_done=wait_done)
+            except (OSError, EOFError) as err:
+                self._drop()
+                if ind_try == self.n_retries:
+                    raise err
+                time.sleep(0.1 * 2**ind_try)
+
+    def _drop(self):
+        """Closes the current connection, if any.
+        """
+        with self._lock:
+            _conn, self._conn = self._conn, None
+        if _conn is not None:
+            try:
+                _conn.close()
+            except OSError:
+                pass
+
+    def load(self, key, fname):
+        """Loads a stimulus file on the server, under a key.
+
+        The stimulus is reloaded by .connect() after a reconnection.
+        """
+        # recorded once loaded, so that .connect() does not load it twice
+        t_latency = self._request_with_retry(f'LOAD {{id}} {key} {fname}')
+        self._loaded[key] = fname
+        return t_latency
+
+    def play(self, key, wait_done=False):
+        """Plays a loaded stimulus.
+
+        Parameters
+        -----------
+        key : str
+            Key of the stimulus (see .load()).
+        wait_done : bool
+            Whether to wait until the player exits.
+
+        Returns
+        -----------
+        t_latency : float
+            Round-trip time (s) from sending the request to receiving the
+            confirmation that the player started on the remote computer.
+        """
+        return self._request_with_retry(f'PLAY {{id}} {key}',
+                                        wait_done=wait_done)
+
+    def ping(self):
+        """Returns the round-trip time of an empty request (s).
+        """
+        return self._request_with_retry('PING {id}')
+
+    def close(self):
+        self._drop()
+
+
+_clients = {}
+
+
+def get_client(hostname, transport='ssh', port=22, **kwargs):
+    """Returns a shared RemoteStimulusClient, creating it on first use.
+
+    Stimuli on the same remote computer (same hostname, transport and
+    port) share one client, and so one connection.
+    """
+    _key = (hostname, transport, port)
+    if _key not in _clients:
+        _clients[_key] = RemoteStimulusClient(hostname, transport=transport,
+                                              port=port, **kwargs)
+    return _clients[_key]
+
+
+class StimulusServer(object):
+    """Server playing stimuli on request, run on the remote computer.
+
+    Parameters
+    -----------
+    cmd : str
+        Player command, with {file} replaced by the stimulus file.
+    """
+
+    def __init__(self, cmd=DEFAULT_CMD):
+        self.cmd = cmd
+        self._players = {}
+
+    def load(self, key, fname):
+        """Prepares the player command of a stimulus.
+        """
+        self._players[key] = shlex.split(self.cmd.format(
+            file=shlex.quote(fname)))
+
+    def handle(self, line, reply):
+        """Handles one request line, calling reply(line) with replies.
+        """
+        _request = line.split()
+        if len(_request) < 2:
+            return
+        _cmd, _id, _args = _request[0], _request[1], _request[2:]
+
+        try:
+            if _cmd == 'LOAD':
+                self.load(_args[0], ' '.join(_args[1:]))
+                reply(f'OK {_id}')
+            elif _cmd == 'PLAY':
+                _proc = subprocess.Popen(self._players[_args[0]],
+                                         stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL)
+                reply(f'OK {_id}')
+                threading.Thread(target=lambda: reply(
+                    f'DONE {_id} {_proc.wait()}'), daemon=True).start()
+            elif _cmd == 'PING':
+                reply(f'OK {_id}')
+            else:
+                reply(f'ERR {_id} unknown request {_cmd}')
+        except (KeyError, IndexError, OSError) as err:
+            reply(f'ERR {_id} {err!r}')
+
+    def serve(self, rfile, wfile):
+        """Serves requests read from rfile, writing replies to wfile,
+        until rfile is closed.
+        """
+        _lock = threading.Lock()
+
+        def reply(line):
+            with _lock:
+                wfile.write(line + '\n')
+                wfile.flush()
+
+        for line in rfile:
+            self.handle(line, reply)
+
+    def serve_socket(self, port, host='', ready=None):
+        """Serves requests from TCP connections on a port, with one
+        thread per connection.
+
+        Parameters
+        -----------
+        port : int
+            Port to listen on.
+        host : str
+            Interface to listen on (default: all).
+        ready : threading.Event (optional)
+            Set once the server is listening.
+        """
+        with socket.create_server((host, port)) as _server:
+            if ready is not None:
+                ready.set()
+            while True:
+                _sock, _ = _server.accept()
+                _sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                threading.Thread(
+                    target=self.serve,
+                    args=(_sock.makefile('r'), _sock.makefile('w')),
+                    daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves stimulus requests '
+                                     'from a RemoteStimulusClient.')
+    parser.add_argument('--port', type=int, default=None,
+                        help='Serve on this TCP port.')
+    parser.add_argument('--stdio', action='store_true',
+                        help='Serve on stdin and stdout (used over SSH).')
+    parser.add_argument('--cmd', default=DEFAULT_CMD,
+                        help='Player command, with {file} as placeholder.')
+    args = parser.parse_args()
+
+    server = StimulusServer(cmd=args.cmd)
+    if args.stdio:
+        server.serve(sys.stdin, sys.stdout)
+    else:
+        server.serve_socket(args.port if args.port is not None else 5005)
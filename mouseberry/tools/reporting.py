@@ -3,7 +3,9 @@ Tools for reporting trial progress, chosen times and measurements
 """
 
 import logging
+import logging.handlers
 import os
+import queue
 from mouseberry.tools.filesys import prepare_folder
 
 
@@ -26,6 +28,14 @@ class Reporter(object):
         Tab behavior. Can either be 'tabs' ('\t') or 'spaces' ('  ')
     n_spaces : int
         Number of spaces to use for indents, if tab_type == 'spaces'.
+    async_mode : bool
+        If True, messages are put on a queue and written to the file
+        and console by a background thread, so that reporting never
+        blocks the calling (eg event) thread. (Default False)
+    queue_size : int
+        Maximum number of messages waiting to be written, if
+        async_mode is True. Further messages are dropped and counted
+        in .n_dropped.
 
     Additional information
     ----------
@@ -37,10 +47,15 @@ class Reporter(object):
         DEBUG and higher, and additionally stores more timestamp
         info.
 
+    In async mode, the indentation level and timestamp of each message
+    are captured when it is reported, not when it is written.
+    Call .close() to write any remaining messages.
+
     """
 
     def __init__(self, parent, console_show_lvl=10, folder_name='log',
-                 tab_type='spaces', n_spaces=2):
+                 tab_type='spaces', n_spaces=2, async_mode=False,
+                 queue_size=10000):
         # Parent exp class and folder prep
         # ------------------
         self._parent = parent
@@ -64,6 +79,7 @@ class Reporter(object):
         # -------------
         self.lgr = logging.getLogger('exp')
         self.lgr.setLevel(logging.DEBUG)
+        self.lgr.propagate = False  # root handlers would print twice
 
         fh = logging.FileHandler(self.fname)
         fh.setLevel(logging.DEBUG)
@@ -77,8 +93,53 @@ class Reporter(object):
         fh.setFormatter(formatter_file)
         sh.setFormatter(formatter_stream)
 
-        self.lgr.addHandler(fh)
-        self.lgr.addHandler(sh)
+        self.async_mode = async_mode
+        self._listener = None
+        if self.async_mode is True:
+            _queue = queue.Queue(maxsize=queue_size)
+            self._handlers = [_BoundedQueueHandler(_queue)]
+            self._listener = logging.handlers.QueueListener(
+                _queue, fh, sh, respect_handler_level=True)
+            self._listener.start()
+        else:
+            self._handlers = [fh, sh]
+
+        for handler in self._handlers:
+            self.lgr.addHandler(handler)
+
+    @property
+    def n_dropped(self):
+        """Number of messages dropped because the queue was full
+        (async mode only).
+        """
+        if self.async_mode is True:
+            return self._handlers[0].n_dropped
+        return 0
+
+    def close(self):
+        """Writes any remaining messages, stops the background writer
+        (async mode) and detaches the handlers from the logger.
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            _handlers_out = self._listener.handlers
+            self._listener = None
+        else:
+            _handlers_out = self._handlers
+
+        for handler in self._handlers:
+            self.lgr.removeHandler(handler)
+
+        if self.n_dropped > 0:
+            _record = self.lgr.makeRecord(
+                self.lgr.name, logging.ERROR, __file__, 0,
+                f'Reporter dropped {self.n_dropped} messages '
+                '(queue full).', None, None)
+            for handler in _handlers_out:
+                handler.handle(_record)
+
+        for handler in _handlers_out:
+            handler.close()
 
     def tabin(self):
         """Increments current level by 1.
@@ -151,3 +212,18 @@ class Reporter(object):
         tab_prefix = self.tab_lvl * base_prefix
         new_msg = tab_prefix + msg
         return new_msg
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler which drops (and counts) records when its queue is
+    full, rather than blocking the caller.
+    """
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.n_dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.n_dropped += 1
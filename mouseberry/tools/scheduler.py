@@ -0,0 +1,102 @@
+"""
+Schedulers which wait until the scheduled start time of an event.
+"""
+
+import time
+
+__all__ = ['Scheduler', 'SleepScheduler', 'HybridScheduler']
+
+
+class Scheduler(object):
+    """Base class for event schedulers.
+
+    A scheduler waits until a target time on a monotonic nanosecond clock,
+    and returns the real time at which it woke up. The difference between
+    the two is the scheduling latency of the event.
+
+    Parameters
+    -----------
+    clock : function
+        A monotonic clock returning integer nanoseconds.
+        (Default time.perf_counter_ns; time.monotonic_ns also works.)
+
+    Notes on child class methods
+    ---------
+    .wait_until(t_target_ns): required
+        - Method must block until .now_ns() >= t_target_ns, and return
+        the value of .now_ns() upon waking.
+        - It is called by the Experiment before each event and at the end
+        of each ITI.
+    """
+
+    def __init__(self, clock=time.perf_counter_ns):
+        self.clock = clock
+
+    def now_ns(self):
+        """Returns the current time of the scheduler clock (ns).
+        """
+        return self.clock()
+
+
+class SleepScheduler(Scheduler):
+    """Scheduler which repeatedly sleeps for a short, fixed period
+    until the target time is reached.
+
+    This is the original mouseberry behavior. It keeps one core busy
+    while waiting, and wakes up to one polling period late.
+
+    Parameters
+    -----------
+    t_poll : float
+        Sleep time between checks of the clock (s).
+    clock : function
+        A monotonic clock returning integer nanoseconds.
+    """
+
+    def __init__(self, t_poll=0.0001, clock=time.perf_counter_ns):
+        super().__init__(clock=clock)
+        self.t_poll = t_poll
+
+    def wait_until(self, t_target_ns):
+        _t_now = self.clock()
+        while _t_now < t_target_ns:
+            time.sleep(self.t_poll)
+            _t_now = self.clock()
+        return _t_now
+
+
+class HybridScheduler(Scheduler):
+    """Scheduler which sleeps coarsely until shortly before the target
+    time, and then spins on the clock for the remaining period.
+
+    The coarse sleep frees the CPU for measurement threads during
+    most of the waiting period, while the final spin removes the
+    wake-up jitter of the OS sleep.
+
+    Parameters
+    -----------
+    t_spin : float
+        Period before the target time during which the scheduler spins
+        on the clock instead of sleeping (s).
+    clock : function
+        A monotonic clock returning integer nanoseconds.
+    """
+
+    def __init__(self, t_spin=0.0005, clock=time.perf_counter_ns):
+        super().__init__(clock=clock)
+        self.t_spin = t_spin
+        self._t_spin_ns = int(t_spin * 1e9)
+
+    def wait_until(self, t_target_ns):
+        # Coarse sleep. Re-check after each sleep, since the OS may
+        # wake us early or late.
+        _t_remaining = t_target_ns - self.clock() - self._t_spin_ns
+        while _t_remaining > 0:
+            time.sleep(_t_remaining / 1e9)
+            _t_remaining = t_target_ns - self.clock() - self._t_spin_ns
+
+        # Spin for the final period
+        _t_now = self.clock()
+        while _t_now < t_target_ns:
+            _t_now = self.clock()
+        return _t_now
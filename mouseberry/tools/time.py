@@ -1,20 +1,55 @@
 import math
+import threading
+import numpy as np
 
 __all__ = ['pick_time', 'TimeDist']
 
 
+def _draw_truncated(t_dist, t_args, t_min, t_max, n, random_state=None):
+    """Draws n values from a distribution, strictly between t_min and
+    t_max.
+
+    Distributions of mouseberry.tools.dists are truncated exactly.
+    Others (eg scipy.stats) use vectorized rejection sampling: values
+    are drawn in batches, each sized from the acceptance rate of the
+    previous ones, until n values have been accepted.
+    """
+    if hasattr(t_dist, 'rvs_between'):
+        return np.asarray(t_dist.rvs_between(t_min, t_max, size=n,
+                                             random_state=random_state,
+                                             **t_args), dtype=float)
+
+    vals = np.empty(0)
+    _n_drawn, _n_accepted = 0, 0
+    while len(vals) < n:
+        _p_accept = max(_n_accepted / _n_drawn, 1e-3) if _n_drawn > 0 else 1
+        _size = int(math.ceil(1.2 * (n - len(vals)) / _p_accept)) + 10
+        _batch = np.asarray(t_dist.rvs(size=_size, random_state=random_state,
+                                       **t_args), dtype=float)
+        _batch = _batch[(_batch > t_min) & (_batch < t_max)]
+
+        _n_drawn += _size
+        _n_accepted += len(_batch)
+        if _n_accepted == 0 and _n_drawn > 1e6:
+            raise ValueError(f'No values could be drawn between t_min='
+                             f'{t_min} and t_max={t_max}.')
+        vals = np.concatenate((vals, _batch))
+    return vals[:n]
+
+
 def pick_time(t, t_args=None, t_min=-math.inf, t_max=math.inf):
     """
     Flexibly generates stochastic times given a number of input arguments.
 
     Parameters
     ---------
-    t : float or sp.stats distribution
-        A fixed time, or a scipy.stats distribution which generates
-        times when the .rvs method is called on it. (seconds)
+    t : float or distribution
+        A fixed time, or a distribution which generates times when the
+        .rvs method is called on it (from mouseberry.tools.dists, or
+        scipy.stats). (seconds)
     t_args : dict (optional)
         A dictionary of arguments to pass to t.rvs when t is
-        a scipy.stats distribution (mandatory in this case).
+        a distribution (mandatory in this case).
     t_min : float (optional)
         Minimum time which can be returned.
     t_max : float (optional)
@@ -27,51 +62,124 @@ def pick_time(t, t_args=None, t_min=-math.inf, t_max=math.inf):
     """
     if type(t) is float or type(t) is int:
         return t
-    elif 'scipy.stats' in str(t.__class__):
+    elif hasattr(t, 'rvs'):
         assert t_args is not None, ("t_args must be set when t is a "
-                                    "scipy.stats distribution instance.")
-
-        # loop to pick an appropriate val between t_min, t_max
-        _t_picked = t_min-1  # set first _t_picked outside of range
-        while _t_picked <= t_min or _t_picked >= t_max:
-            _t_picked = t.rvs(size=1, **t_args)[0]
-        return _t_picked
+                                    "distribution instance.")
+        return _draw_truncated(t, t_args, t_min, t_max, n=1)[0]
 
     else:
         raise ValueError("t must be either a float, int "
-                         "or scipy.stats distribution instance")
+                         "or distribution instance")
 
 
 class TimeDist(object):
     """
-    Contains a scipy.stats distribution, parameters and limits
-    from which random values are drawn for event start times.
+    Contains a distribution (from mouseberry.tools.dists, or scipy.stats),
+    parameters and limits from which random values are drawn for event
+    start times.
+
+    Values are drawn ahead of time in batches, and each call returns
+    the next value of the current batch. When the batch runs low, the
+    next one is drawn in a background thread.
 
     Parameters
     -------------
-    t_dist : scipy.stats distribution
+    t_dist : distribution
         A distribution which generates times when the .rvs method
-        is called on it (in units of seconds).
+        is called on it (in units of seconds), eg
+        mouseberry.tools.dists.norm or scipy.stats.norm.
     t_args : dict
         A dictionary of arguments to pass to t.rvs
     t_min : float (optional)
         Minimum time which can be returned.
     t_max : float (optional)
         Maximum time which can be returned.
+    batch_size : int (optional)
+        Number of values drawn per batch.
+    seed : int (optional)
+        Seed of the random number generator. With a seed, the sequence
+        of returned values is the same on every run.
     """
     def __init__(self, t_dist, t_args,
-                 t_min=-math.inf, t_max=math.inf):
+                 t_min=-math.inf, t_max=math.inf, batch_size=1000,
+                 seed=None):
         self.t_dist = t_dist
         self.t_args = t_args
         self.t_min = t_min
         self.t_max = t_max
+        self.batch_size = batch_size
+        self.seed = seed
+
+        self._rng = np.random.default_rng(seed)
+        self._batch = np.empty(0)
+        self._ind = 0
+        self._next_batch = None
+        self._refill_thread = None
+        self._lock = threading.Lock()
 
     def __call__(self):
         """Draws a random time value from self.t_dist, using
         self.t_args as arguments and with bounds of
         self.t_min and self.t_max.
         """
-        _t_picked = self.t_min-1
-        while _t_picked <= self.t_min or _t_picked >= self.t_max:
-            _t_picked = self.t_dist.rvs(size=1, **self.t_args)[0]
-        return _t_picked
+        with self._lock:
+            if self._ind >= len(self._batch):
+                self._swap_batch()
+
+            _t_picked = self._batch[self._ind]
+            self._ind += 1
+
+            if len(self._batch) - self._ind <= self.batch_size // 4 \
+                    and self._refill_thread is None \
+                    and self._next_batch is None:
+                self._refill_thread = threading.Thread(
+                    target=self._refill, daemon=True)
+                self._refill_thread.start()
+        return float(_t_picked)
+
+    def prime(self):
+        """Draws the first batch of values now (eg at the start of the
+        experiment) rather than on the first call.
+        """
+        with self._lock:
+            if self._ind >= len(self._batch):
+                self._swap_batch()
+
+    def reseed(self, seed):
+        """Discards all drawn values and reseeds the random number
+        generator.
+
+        Parameters
+        -----------
+        seed : int or np.random.SeedSequence
+            New seed.
+        """
+        with self._lock:
+            if self._refill_thread is not None:
+                self._refill_thread.join()
+                self._refill_thread = None
+            self._rng = np.random.default_rng(seed)
+            self._batch = np.empty(0)
+            self._ind = 0
+            self._next_batch = None
+
+    def _draw_batch(self):
+        return _draw_truncated(self.t_dist, self.t_args, self.t_min,
+                               self.t_max, n=self.batch_size,
+                               random_state=self._rng)
+
+    def _refill(self):
+        self._next_batch = self._draw_batch()
+
+    def _swap_batch(self):
+        """Replaces the current batch with the next one, waiting for a
+        background refill if one is running.
+        """
+        if self._refill_thread is not None:
+            self._refill_thread.join()
+            self._refill_thread = None
+        if self._next_batch is None:
+            self._next_batch = self._draw_batch()
+
+        self._batch, self._next_batch = self._next_batch, None
+        self._ind = 0
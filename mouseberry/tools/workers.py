@@ -0,0 +1,104 @@
+"""
+Persistent worker threads onto which events are dispatched.
+"""
+
+import queue
+import threading
+import traceback
+
+__all__ = ['WorkerPool']
+
+
+class _Job(object):
+    """Handle for a function dispatched onto a WorkerPool.
+
+    Mirrors the .join() and .is_alive() methods of threading.Thread,
+    so that it can be used in place of a per-event thread.
+    """
+    def __init__(self, target, args=()):
+        self.target = target
+        self.args = args
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            self.target(*self.args)
+        except Exception:
+            traceback.print_exc()  # keep the worker alive
+        finally:
+            self._done.set()
+
+    def join(self, timeout=None):
+        self._done.wait(timeout)
+
+    def is_alive(self):
+        return not self._done.is_set()
+
+
+class WorkerPool(object):
+    """A pool of pre-started worker threads waiting on a queue.
+
+    Dispatching a function onto the pool is a queue handoff to an
+    already-running thread, rather than the creation of a new thread.
+
+    Parameters
+    -----------
+    n_workers : int
+        Number of worker threads. Functions which are dispatched while
+        all workers are busy wait in the queue, so this should be at least
+        the number of events which can run at the same time.
+    name : str
+        Prefix for the names of the worker threads.
+    """
+
+    def __init__(self, n_workers, name='mb-worker'):
+        self.n_workers = n_workers
+        self.name = name
+
+        self._queue = queue.SimpleQueue()
+        self._threads = []
+
+    def start(self):
+        """Starts all worker threads.
+        """
+        for ind in range(self.n_workers):
+            _thread = threading.Thread(target=self._worker_loop,
+                                       name=f'{self.name}{ind}',
+                                       daemon=True)
+            _thread.start()
+            self._threads.append(_thread)
+
+    def submit(self, target, args=()):
+        """Dispatches target(*args) onto the next free worker.
+
+        Parameters
+        -----------
+        target : function
+            Function to run.
+        args : tuple
+            Arguments for target.
+
+        Returns
+        -----------
+        job : _Job
+            Handle with .join() and .is_alive() methods.
+        """
+        job = _Job(target, args)
+        self._queue.put(job)
+        return job
+
+    def stop(self):
+        """Stops all worker threads after the queued jobs have finished.
+        """
+        for _thread in self._threads:
+            self._queue.put(None)
+        for _thread in self._threads:
+            _thread.join()
+        self._threads = []
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.run()
@@ -1,19 +1,106 @@
 import os
+import time
 import threading
-import picamera
-from types import SimpleNamespace
+import numpy as np
+from mouseberry.groups.core import BufferedMeasurement
 from mouseberry.tools.filesys import prepare_folder
+from mouseberry.video.roi import FrameAnalyzer
 
-__all__ = ['Video']
+__all__ = ['Video', 'VideoFrames']
+
+
+class VideoFrames(BufferedMeasurement):
+    """Measurement storing a value for each recorded video frame, created
+    by Video(record=True): the index of the frame in its video file
+    ('vid_frames'), or the trial number of this file ('vid_frame_files').
+
+    .t holds the time of each frame (s, from the start of the trial, on
+    the same clock as the events).
+
+    Parameters
+    ----------
+    name : str
+        Name of the measurement.
+    framerate : float
+        Framerate of the video (fps).
+    lock : threading.Lock
+        Lock held by the Video while it appends a frame, so that no frame
+        is appended once the measurement is stopped.
+    t_buffer : float
+        Longest storable trial duration (s). See BufferedMeasurement.
+    """
+
+    report_stats = False
+
+    def __init__(self, name, framerate, lock, t_buffer=600):
+        super().__init__(name=name, sampling_rate=framerate,
+                         t_buffer=t_buffer, data_dtype=np.uint32)
+        self._lock = lock
+        self._running = False
+
+    def on_start(self):
+        with self._lock:
+            self._running = True
+
+    def on_stop(self):
+        with self._lock:
+            self._running = False
+
+
+class _SegmentOutput(object):
+    """File-like output receiving the encoded video of one trial from the
+    camera. Reports the presentation timestamp of each complete frame
+    to the Video.
+    """
+
+    def __init__(self, video, fname, trial):
+        self._video = video
+        self._file = open(fname, 'wb')
+        self.trial = trial
+        self.n_frames = 0
+
+    def write(self, buf):
+        _n = self._file.write(buf)
+        _frame = self._video.camera.frame
+        if _frame.complete and _frame.timestamp is not None:
+            self._video._on_frame(self, _frame.timestamp)
+            self.n_frames += 1
+        return _n
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
 
 
 class Video():
 
     def __init__(self, res=(640, 480), framerate=30,
-                 preview=True, record=False):
+                 preview=True, record=False, camera=None, folder='vids',
+                 t_buffer=600, intra_period=None, rois=None,
+                 roi_res=(160, 120), roi_format='yuv'):
         """
         Creates an object to start a video stream on the local screen.
 
+        The camera is opened once. When recording, it records continuously
+        for the whole experiment, and the recording is split into one
+        .h264 file per trial ({folder}/{experiment fname}_trial{N}.h264).
+        The split of each trial is requested while the trial is prepared
+        (during the previous ITI), and takes effect on the next key
+        frame, so that it lands before the trial starts when the ITI is
+        longer than the key frame interval.
+
+        The time of each frame recorded during a trial is stored by the
+        measurement .frames, with the index of the frame in its file,
+        and by .frame_files, with the trial number of this file (see
+        VideoFrames). Both are stored in the hdf5 file along with the
+        other measurements.
+
+        ROIs (see mouseberry.video.roi.ROI) are analysed in real time,
+        on raw frames from a second output of the camera (splitter port
+        2), downscaled to roi_res. They are also stored as measurements.
+
         Parameters
         ---------------
         res : tuple (2d)
@@ -24,47 +111,178 @@ class Video():
             Whether to display a preview or not.
         record : bool
             Whether to record or not.
+        camera : camera instance (optional)
+            A picamera.PiCamera, or an object with the same interface
+            (eg mouseberry.video.fake.FakeCamera to test off the RPi).
+            Defaults to a new picamera.PiCamera.
+        folder : str
+            Folder to store videos in.
+        t_buffer : float
+            Longest trial duration for which frame times can be stored (s).
+        intra_period : int (optional)
+            Number of frames between key frames, at which the recording
+            can be split. Defaults to half a second of frames.
+        rois : list (optional)
+            ROI instances, analysed on every frame.
+        roi_res : tuple (2d)
+            Resolution of the frames on which ROIs are analysed, in pixels.
+        roi_format : str
+            Format of the analysed frames, 'yuv' (luminance only) or 'rgb'.
         """
         self.res = res
         self.framerate = framerate
         self.preview = preview
         self.record = record
+        self.folder = folder
+        self.intra_period = intra_period if intra_period is not None \
+            else max(int(round(framerate / 2)), 1)
 
-        self.camera = picamera.PiCamera()
+        if camera is None:
+            import picamera
+            camera = picamera.PiCamera()
+        self.camera = camera
         self.camera.resolution = self.res
         self.camera.framerate = self.framerate
+        # frame timestamps on the same clock as camera.timestamp
+        self.camera.clock_mode = 'raw'
+
+        self._output = None
+        self._lock = threading.Lock()
+        self._t_offset = 0.
+        self._previewing = False
+        self._rec_trial = None
 
         if self.record is True:
-            prepare_folder('vids')
+            prepare_folder(self.folder)
+            self.frames = VideoFrames('vid_frames', framerate=self.framerate,
+                                      lock=self._lock, t_buffer=t_buffer)
+            self.frame_files = VideoFrames(
+                'vid_frame_files', framerate=self.framerate,
+                lock=self._lock, t_buffer=t_buffer)
+        else:
+            self.frames = None
+            self.frame_files = None
+
+        self.rois = list(rois) if rois is not None else []
+        self.roi_res = roi_res
+        self.roi_format = roi_format
+        self._analyzing = False
+        if len(self.rois) > 0:
+            self.analyzer = FrameAnalyzer(self.rois, res=self.roi_res,
+                                          framerate=self.framerate,
+                                          format=self.roi_format)
+
+    @property
+    def measurements(self):
+        """Measurements of the video (frame times and ROIs).
+        """
+        _frames = [self.frames, self.frame_files] \
+            if self.frames is not None else []
+        return _frames + self.rois
 
     def _run_preview(self):
         """
-        Display a video preview from the rPi
+        Display a video preview from the rPi (started once)
         """
-        self.thread = SimpleNamespace()
-        self.thread.prev = threading.Thread(target=self.camera.start_preview)
-        self.thread.prev.start()
+        if self._previewing is False:
+            self.camera.start_preview()
+            self._previewing = True
 
-    def _run_rec(self, trial, fname='beh_trial',
-                 suffix='.hdf5', folder='vids'):
+    def prepare(self, trial, fname=None, suffix='.h264'):
         """
-        record a video preview from the rPi
+        Requests the recording of a trial to its own file, before the
+        trial starts (called by the experiment when it prepares the
+        trial): starts recording for the first trial, and splits the
+        recording for later trials.
         """
-        fname_full = os.path.join(folder, fname+str(trial)+suffix)
-        self.thread = SimpleNamespace()
-        self.thread.rec = threading.Thread(target=self.camera.start_recording,
-                                           args=(fname_full,))
-        self.thread.rec.start()
+        if self.record is False or self._rec_trial == trial:
+            return
+        if fname is None:
+            fname = f'{self._parent.fname}_trial'
+        fname_full = os.path.join(self.folder, fname+str(trial)+suffix)
+        _output = _SegmentOutput(self, fname_full, trial)
+        self._rec_trial = trial
+
+        if self._output is None:
+            self._sync_clock()
+            self._output = _output
+            self.camera.start_recording(_output, format='h264',
+                                        intra_period=self.intra_period)
+        else:
+            # the previous split has to land first
+            if hasattr(self, 'thread'):
+                self.thread.join()
+            # split_recording() blocks until the next key frame
+            self.thread = threading.Thread(target=self._split,
+                                           args=(_output,))
+            self.thread.start()
+
+    def _split(self, output):
+        self._sync_clock()
+        self.camera.split_recording(output)
+        with self._lock:
+            _prev_output, self._output = self._output, output
+        _prev_output.close()
+
+    def _sync_clock(self):
+        """Estimates the offset between the camera clock and time.time().
+        """
+        _t_before = time.time()
+        _t_camera = self.camera.timestamp
+        _t_after = time.time()
+        self._t_offset = (_t_before + _t_after) / 2 - _t_camera / 1e6
+
+    def _on_frame(self, output, t_camera):
+        """Called by the current output for each complete frame.
+        Stores its time, its index in the file and the trial of the file,
+        if a trial is running.
+        """
+        with self._lock:
+            if self.frames._running is True \
+                    and self.frame_files._running is True:
+                _t_frame = self._t_offset + t_camera / 1e6 \
+                    - self.frames.t_start_trial
+                self.frames._append(_t_frame, output.n_frames)
+                self.frame_files._append(_t_frame, output.trial)
+
+    def _run_analysis(self):
+        """Starts sending raw frames to the ROI analyzer (started once)
+        """
+        if self._analyzing is False:
+            self.camera.start_recording(self.analyzer,
+                                        format=self.roi_format,
+                                        splitter_port=2,
+                                        resize=self.roi_res)
+            self._analyzing = True
 
     def run(self, trial):
         if self.preview is True:
             self._run_preview()
+        if len(self.rois) > 0:
+            self._run_analysis()
         if self.record is True:
-            self._run_rec(trial=trial)
+            # (if the trial was not prepared, its split lands late)
+            self.prepare(trial=trial)
 
     def stop(self):
-        if self.preview is True:
-            self.thread.prev.join()
-        if self.record is True:
-            self.thread.rec.join()
+        """Called at the end of each trial. The camera keeps running
+        (and recording) until .close().
+        """
+        pass
+
+    def close(self):
+        """Stops recording and preview, and closes the camera.
+        """
+        if self._output is not None:
+            if hasattr(self, 'thread'):
+                self.thread.join()
             self.camera.stop_recording()
+            self._output.close()
+            self._output = None
+        if self._analyzing is True:
+            self.camera.stop_recording(splitter_port=2)
+            self._analyzing = False
+        if self._previewing is True:
+            self.camera.stop_preview()
+            self._previewing = False
+        self.camera.close()
@@ -0,0 +1,131 @@
+"""
+A fake camera, with the parts of the picamera.PiCamera interface used by
+Video, to run and test video recording off the RPi.
+"""
+
+import time
+import threading
+import numpy as np
+from types import SimpleNamespace
+
+__all__ = ['FakeCamera']
+
+
+class FakeCamera(object):
+    """Camera generating frames of dummy data at the set framerate,
+    with the interface of picamera.PiCamera used by Video.
+
+    Each frame is written to the recording output as frame_size bytes
+    (or, for 'yuv' and 'rgb' outputs, as a raw frame showing a moving
+    bar), with .frame.timestamp set to the time of the frame on the
+    camera clock (us, time.monotonic() based, as with clock_mode='raw').
+
+    As with h264 recordings on the camera, split_recording() only takes
+    effect on a key frame, every intra_period frames.
+
+    Parameters
+    -----------
+    frame_size : int
+        Number of bytes written per (encoded) frame.
+    """
+
+    def __init__(self, frame_size=1000):
+        self.resolution = (640, 480)
+        self.framerate = 30
+        self.clock_mode = 'reset'
+        self.frame_size = frame_size
+
+        self.frame = SimpleNamespace(index=0, timestamp=None, complete=False)
+        self._outputs = {}
+        self._next_output = None
+        self._split_done = threading.Event()
+        self._stop_signal = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.closed = False
+
+    @property
+    def timestamp(self):
+        return int(time.monotonic() * 1e6)
+
+    def start_preview(self):
+        pass
+
+    def stop_preview(self):
+        pass
+
+    def start_recording(self, output, format='h264', splitter_port=1,
+                        resize=None, intra_period=None):
+        self._outputs[splitter_port] = (output, format,
+                                        resize or self.resolution)
+        if splitter_port == 1:
+            self._intra_period = intra_period or 60
+            self._ind_rec_frame = 0
+        if self._thread is None:
+            self._stop_signal.clear()
+            self._thread = threading.Thread(target=self._record_loop,
+                                            daemon=True)
+            self._thread.start()
+
+    def split_recording(self, output, splitter_port=1):
+        """Switches to a new output at the next key frame, and waits
+        until it has.
+        """
+        self._split_done.clear()
+        self._next_output = output
+        self._split_done.wait()
+
+    def stop_recording(self, splitter_port=1):
+        with self._lock:
+            self._outputs.pop(splitter_port)
+        if len(self._outputs) == 0:
+            self._stop_signal.set()
+            self._thread.join()
+            self._thread = None
+
+    def _raw_frame(self, format, res, ind_frame):
+        """Returns a raw frame, black with a bright vertical bar moving
+        by one pixel per frame.
+        """
+        _w_pad = -(-res[0] // 32) * 32
+        _h_pad = -(-res[1] // 16) * 16
+        if format == 'yuv':
+            _frame = np.full(_w_pad * _h_pad * 3 // 2, 128, dtype=np.uint8)
+            _image = _frame[:_w_pad*_h_pad].reshape(_h_pad, _w_pad)
+        else:
+            _frame = np.zeros(_w_pad * _h_pad * 3, dtype=np.uint8)
+            _image = _frame.reshape(_h_pad, _w_pad, 3)
+        _image[:res[1], :res[0]] = 16
+        _x = ind_frame % res[0]
+        _image[:res[1], _x:_x+4] = 235
+        return _frame.tobytes()
+
+    def _record_loop(self):
+        _data = bytes(self.frame_size)
+        _t_frame = time.monotonic()
+        while not self._stop_signal.is_set():
+            _t_frame += 1 / self.framerate
+            time.sleep(max(_t_frame - time.monotonic(), 0))
+
+            if 1 in self._outputs:
+                _key_frame = self._ind_rec_frame % self._intra_period == 0
+                self._ind_rec_frame += 1
+                if self._next_output is not None and _key_frame:
+                    self._outputs[1] = (self._next_output,) \
+                        + self._outputs[1][1:]
+                    self._next_output = None
+                    self._split_done.set()
+
+            self.frame = SimpleNamespace(index=self.frame.index + 1,
+                                         timestamp=int(_t_frame * 1e6),
+                                         complete=True)
+            with self._lock:
+                for output, format, res in self._outputs.values():
+                    if format in ['yuv', 'rgb']:
+                        output.write(self._raw_frame(format, res,
+                                                     self.frame.index))
+                    else:
+                        output.write(_data)
+
+    def close(self):
+        self.closed = True
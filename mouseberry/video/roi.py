@@ -0,0 +1,188 @@
+"""
+Real-time analysis of video frames: statistics of regions of interest
+(ROIs), computed on every frame and stored as measurements.
+"""
+
+import time
+import numpy as np
+
+from mouseberry.groups.core import BufferedMeasurement
+from mouseberry.data.buffer import MeasurementBuffer
+
+__all__ = ['ROI', 'FrameAnalyzer']
+
+
+class ROI(BufferedMeasurement):
+    """Measurement of a statistic of a rectangular region of the video,
+    computed on each frame as it arrives from the camera.
+
+    ROIs are passed to Video(rois=[...]), and then stored like any other
+    measurement: .t holds the time of each frame (s, from the start of
+    the trial, taken when the frame has been received), and .data the
+    value of the statistic.
+
+    Parameters
+    ----------
+    name : str
+        Unique name for the Measurement. Used for data storage.
+    region : tuple
+        (x, y, width, height) of the ROI, in pixels of the analysed
+        frames (see Video(roi_res=...)).
+    stat : str or function
+        Statistic computed on the ROI of each frame:
+            'motion' : mean absolute difference with the previous frame
+                (motion energy).
+            'mean' : mean pixel value (luminance).
+            'area' : number of pixels darker than threshold
+                (eg pupil area, under IR illumination).
+        A function f(roi, roi_prev) -> float can also be passed, where
+        roi and roi_prev are views of the ROI in the current and
+        previous frames.
+    threshold : int
+        Pixel value threshold for stat='area'.
+    t_buffer : float
+        Longest trial duration which can be stored (s).
+    """
+
+    report_stats = False
+
+    def __init__(self, name, region, stat='motion', threshold=50,
+                 t_buffer=600):
+        # the buffer is allocated once the framerate is known (._bind())
+        super(BufferedMeasurement, self).__init__(name=name,
+                                                  sampling_rate=None)
+        self.region = region
+        self.stat = stat
+        self.threshold = threshold
+        self.t_buffer = t_buffer
+        self._running = False
+
+        if not callable(stat) and stat not in ['motion', 'mean', 'area']:
+            raise ValueError(f"stat must be 'motion', 'mean', 'area' or a "
+                             f"function, not {stat}.")
+
+    def _bind(self, frame, frame_prev, framerate):
+        """Sets the views of the ROI on the frame buffers of the
+        analyzer, and preallocates the working arrays and the buffer.
+        """
+        _x, _y, _w, _h = self.region
+        if _y + _h > frame.shape[0] or _x + _w > frame.shape[1]:
+            raise ValueError(f'ROI {self.name} ({self.region}) is outside '
+                             f'of the frame.')
+
+        self._roi = frame[_y:_y+_h, _x:_x+_w]
+        self._roi_prev = frame_prev[_y:_y+_h, _x:_x+_w]
+        if self.stat == 'motion':
+            self._work = np.empty(self._roi.shape, dtype=np.int16)
+        elif self.stat == 'area':
+            self._work = np.empty(self._roi.shape, dtype=bool)
+
+        self.sampling_rate = framerate
+        self._buffer = MeasurementBuffer(
+            capacity=int(self.t_buffer * framerate) + 1,
+            data_dtype=np.float64)
+
+    def _compute(self, has_prev):
+        """Computes the statistic on the current frame, without
+        allocating any array.
+        """
+        if self.stat == 'motion':
+            if has_prev is False:
+                return np.nan
+            np.subtract(self._roi, self._roi_prev, out=self._work,
+                        dtype=np.int16)
+            np.abs(self._work, out=self._work)
+            return self._work.mean()
+        elif self.stat == 'mean':
+            return self._roi.mean()
+        elif self.stat == 'area':
+            np.less(self._roi, self.threshold, out=self._work)
+            return np.count_nonzero(self._work)
+        else:
+            return self.stat(self._roi, self._roi_prev)
+
+    def _on_frame(self, t_frame, has_prev):
+        if self._running is True:
+            self._append(t_frame - self.t_start_trial,
+                         self._compute(has_prev))
+
+    def on_start(self):
+        self._running = True
+
+    def on_stop(self):
+        self._running = False
+
+
+class FrameAnalyzer(object):
+    """File-like output receiving raw (unencoded) frames from the
+    camera, and computing the statistics of a set of ROIs on each frame.
+
+    Frames are copied into a preallocated buffer as they are written
+    by the camera, and the ROI statistics are computed on views of this
+    buffer, so no array is allocated per frame.
+
+    Only the luminance (Y) plane of 'yuv' frames is analysed. 'rgb'
+    frames are analysed over all three channels.
+
+    Parameters
+    ----------
+    rois : list
+        ROI instances.
+    res : tuple
+        (width, height) of the frames, in pixels.
+    framerate : float
+        Framerate of the video (fps).
+    format : str
+        'yuv' or 'rgb'.
+    """
+
+    def __init__(self, rois, res, framerate, format='yuv'):
+        self.rois = rois
+        self.res = res
+        self.format = format
+
+        # the camera pads rows to 32 pixels and columns to 16 pixels
+        _w_pad = -(-res[0] // 32) * 32
+        _h_pad = -(-res[1] // 16) * 16
+        if format == 'yuv':
+            _shape = (_h_pad, _w_pad)  # Y plane, followed by U and V
+            self._frame_bytes = _w_pad * _h_pad * 3 // 2
+        elif format == 'rgb':
+            _shape = (_h_pad, _w_pad, 3)
+            self._frame_bytes = _w_pad * _h_pad * 3
+        else:
+            raise ValueError(f"format must be 'yuv' or 'rgb', not {format}.")
+
+        self._buf = np.zeros(self._frame_bytes, dtype=np.uint8)
+        self._n_bytes = 0
+        self.frame = self._buf[:np.prod(_shape)].reshape(_shape)
+        self.frame_prev = np.zeros_like(self.frame)
+        self.n_frames = 0
+
+        for roi in self.rois:
+            roi._bind(self.frame[:res[1], :res[0]],
+                      self.frame_prev[:res[1], :res[0]], framerate)
+
+    def write(self, buf):
+        _buf = np.frombuffer(buf, dtype=np.uint8)  # zero-copy view
+        _ind = 0
+        while _ind < len(_buf):
+            _n = min(len(_buf) - _ind, self._frame_bytes - self._n_bytes)
+            self._buf[self._n_bytes:self._n_bytes+_n] = _buf[_ind:_ind+_n]
+            self._n_bytes += _n
+            _ind += _n
+
+            if self._n_bytes == self._frame_bytes:
+                self._on_frame()
+                self._n_bytes = 0
+        return len(_buf)
+
+    def _on_frame(self):
+        _t_frame = time.time()
+        for roi in self.rois:
+            roi._on_frame(_t_frame, has_prev=self.n_frames > 0)
+        np.copyto(self.frame_prev, self.frame)
+        self.n_frames += 1
+
+    def flush(self):
+        pass
@@ -0,0 +1,91 @@
+"""Checks that event attributes mixing ints, floats and strings are
+stored in the event table without loss, when writing the file at the
+end of the experiment and when streaming it trial by trial.
+
+Runs without Raspberry Pi hardware, in a simulation:
+python pi_tests/event_table_test.py
+"""
+
+import os
+import tempfile
+import numpy as np
+
+import mouseberry as mb
+from mouseberry.groups.core import Event
+from mouseberry.sim.core import Simulation
+
+
+class CountingEvent(Event):
+    """Event whose attributes change type across trials: .volume is an
+    int on the first trial and a float afterwards, .label a number on
+    the first trial and a string afterwards, and .extra only exists
+    from the second trial on.
+    """
+    def __init__(self, name, t_start):
+        Event.__init__(self, name=name)
+        self.t_start = t_start
+        self._n_trials = 0
+
+    def on_init(self):
+        self.volume = 2 if self._n_trials == 0 else 0.5
+        self.label = 1 if self._n_trials == 0 else f'trial{self._n_trials}'
+        if self._n_trials > 0:
+            self.extra = 0
+        self._n_trials += 1
+
+    def on_assign_tstart(self):
+        return self.t_start
+
+    def on_trigger(self):
+        pass
+
+
+def _run_session(stream_data):
+    tone_a = mb.Tone(name='tone_a', t_start=0.1, t_dur=1, freq=2000)
+    tone_b = mb.Tone(name='tone_b', t_start=0.1, t_dur=0.5, freq=4000)
+    counter = CountingEvent('counter', t_start=0.2)
+    trial_a = mb.TrialType(name='trial_a', p=0.5, events=[tone_a, counter])
+    trial_b = mb.TrialType(name='trial_b', p=0.5, events=[tone_b, counter])
+
+    exp = mb.Experiment(n_trials=6, iti=0.1, mouse='test', plan=True,
+                        seed=0, stream_data=stream_data)
+    exp.run(trial_a, trial_b)
+    return exp.data.fname
+
+
+def test_event_table():
+    _cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            for stream_data in [False, True]:
+                with Simulation():
+                    fname = _run_session(stream_data)
+                with mb.Session(fname) as sess:
+                    _names = sess.trials['name']
+                    _t_dur_a = sess.event_times('tone_a', 't_dur')
+                    _t_dur_b = sess.event_times('tone_b', 't_dur')
+                    assert np.all(_t_dur_a[_names == 'trial_a'] == 1)
+                    assert np.all(_t_dur_b[_names == 'trial_b'] == 0.5)
+
+                    _volume = sess.event_times('counter', 'volume')
+                    assert np.array_equal(_volume, [2] + [0.5]*5)
+
+                    _extra = sess.event_times('counter', 'extra')
+                    assert np.isnan(_extra[0])
+                    assert np.all(_extra[1:] == 0)
+
+                    _is_counter = sess.event_column('name') == 'counter'
+                    _label = sess.event_column('label')[_is_counter]
+                    _order = sess.event_column('ind_trial')[_is_counter]
+                    assert list(_label[np.argsort(_order)]) == \
+                        ['1'] + [f'trial{ind}' for ind in range(1, 6)]
+
+                    assert sess.event_column('ind_trial').dtype == np.int64
+        finally:
+            os.chdir(_cwd)
+
+
+if __name__ == '__main__':
+    test_event_table()
+    print('Event attributes are stored without loss.')
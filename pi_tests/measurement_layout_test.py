@@ -0,0 +1,146 @@
+"""Checks that measurements read back with Session.measurement() are the
+ones which were recorded, for the 'vlen', 'flat' and 'packed' layouts,
+when writing the file at the end of the experiment and when streaming
+it trial by trial. Trials include empty trials and trials whose length
+is not a multiple of 8 (which are padded when bit-packed).
+
+Runs without Raspberry Pi hardware, in a simulation:
+python pi_tests/measurement_layout_test.py
+"""
+
+import os
+import tempfile
+import time
+import h5py
+import numpy as np
+
+import mouseberry as mb
+from mouseberry.data.encoding import samples_to_edges
+from mouseberry.groups.core import Event, BufferedMeasurement
+from mouseberry.sim.core import Simulation
+
+N_SAMPLES = [5, 0, 13, 8, 1, 16, 0, 9]
+
+
+class ReplayMeasurement(BufferedMeasurement):
+    """Measurement which stores a fixed (t, data) on each trial.
+    """
+    def __init__(self, name, trials, data_dtype=np.uint8,
+                 encoding='samples', report_stats=True):
+        super().__init__(name=name, sampling_rate=1000,
+                         data_dtype=data_dtype)
+        self.trials = trials
+        self.encoding = encoding
+        self.report_stats = report_stats
+        self._ind_trial = 0
+
+    def on_start(self):
+        for t, datum in zip(*self.trials[self._ind_trial]):
+            self._append(t, datum)
+        self._ind_trial += 1
+
+    def on_stop(self):
+        pass
+
+
+class WaitEvent(Event):
+    """Event which waits for t_dur.
+    """
+    def __init__(self, name, t_dur):
+        Event.__init__(self, name=name)
+        self.t_dur = t_dur
+
+    def on_assign_tstart(self):
+        return 0.1
+
+    def on_trigger(self):
+        time.sleep(self.t_dur)
+
+
+def _make_trials(seed=0):
+    """Returns the (t, data) of each trial of a binary measurement in
+    the 'samples' encoding, of the same measurement in the 'edges'
+    encoding, and of a non-binary measurement.
+    """
+    rng = np.random.default_rng(seed)
+    samples, edges, analog = [], [], []
+    for n in N_SAMPLES:
+        # irregular times, on whole microseconds
+        _t = np.cumsum(rng.integers(500, 1500, n)) / 1e6
+        _data = rng.integers(0, 2, n).astype(np.uint8)
+        samples.append((_t, _data))
+        edges.append(samples_to_edges(_t, _data))
+        analog.append((_t, rng.normal(size=n)))
+    return {'licks': samples, 'lever': edges, 'position': analog}
+
+
+def _run_session(trials, msment_layout, stream_data):
+    measurements = [
+        ReplayMeasurement('licks', trials['licks']),
+        ReplayMeasurement('lever', trials['lever'], encoding='edges'),
+        ReplayMeasurement('position', trials['position'],
+                          data_dtype=np.float64, report_stats=False)]
+    trial = mb.TrialType(name='trial', p=1, events=[WaitEvent('wait', 0.1)])
+
+    exp = mb.Experiment(n_trials=len(N_SAMPLES), iti=0.1, mouse='test',
+                        stream_data=stream_data,
+                        msment_layout=msment_layout)
+    exp.run(trial, *measurements)
+    return exp.data.fname
+
+
+def test_measurement_layout():
+    trials = _make_trials()
+
+    _cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            for msment_layout in ['vlen', 'flat', 'packed']:
+                for stream_data in [False, True]:
+                    with Simulation():
+                        fname = _run_session(trials, msment_layout,
+                                             stream_data)
+                    _check_file(fname, msment_layout)
+                    _check_session(fname, trials, msment_layout)
+        finally:
+            os.chdir(_cwd)
+
+
+def _check_file(fname, msment_layout):
+    with h5py.File(fname, 'r') as f:
+        _msments = f['trials/measurements']
+        assert _msments['lever'].attrs['encoding'] == 'edges'
+        assert _msments['licks'].attrs['encoding'] == 'samples'
+        if msment_layout == 'packed':
+            # binary data is bit-packed, each trial padded to a whole byte
+            assert _msments['licks'].attrs['data_codec'] == 'packbits'
+            assert len(_msments['licks/data']) \
+                == sum((n + 7) // 8 for n in N_SAMPLES)
+            assert _msments['position'].attrs['data_codec'] != 'packbits'
+
+
+def _check_session(fname, trials, msment_layout):
+    with mb.Session(fname) as sess:
+        assert sess.n_trials == len(N_SAMPLES)
+        for name, _trials in trials.items():
+            _t, _data = sess.measurement(name)
+            assert list(_t.lengths) == [len(t) for t, _ in _trials], \
+                f'{name} ({msment_layout}): trial lengths differ.'
+            for ind, (t, data) in enumerate(_trials):
+                assert np.allclose(_t[ind], t, rtol=0, atol=1e-9), \
+                    f'{name} ({msment_layout}): t differs on trial {ind}.'
+                assert np.array_equal(_data[ind], data), \
+                    f'{name} ({msment_layout}): data differs on trial {ind}.'
+
+        # onsets are the same whether stored as samples or edges
+        _onsets = sess.onsets('licks')
+        _onsets_edges = sess.onsets('lever')
+        for ind in range(len(N_SAMPLES)):
+            assert np.allclose(_onsets[ind], _onsets_edges[ind],
+                               rtol=0, atol=1e-9)
+
+
+if __name__ == '__main__':
+    test_measurement_layout()
+    print('Measurements are read back as recorded, with every layout.')
@@ -0,0 +1,53 @@
+"""Checks that session plans with the same seed draw the same event
+start times, including for events which call pick_time() on a
+distribution directly (which draws from the global np.random state,
+seeded by make_plan()), and that the global state is restored after.
+
+Runs without Raspberry Pi hardware:
+python pi_tests/plan_seed_test.py
+"""
+
+import numpy as np
+
+import mouseberry as mb
+from mouseberry.groups.core import Event
+from mouseberry.groups.plan import make_plan
+
+
+class PickTimeEvent(Event):
+    """Event whose start time is drawn with pick_time() on each trial.
+    """
+    def __init__(self, name, t_dist, t_args):
+        Event.__init__(self, name=name)
+        self.t_dist = t_dist
+        self.t_args = t_args
+
+    def on_assign_tstart(self):
+        return mb.pick_time(self.t_dist, self.t_args, t_min=1, t_max=4)
+
+    def on_trigger(self):
+        pass
+
+
+def test_plan_seed():
+    events = [PickTimeEvent('norm', mb.dists.norm, {'loc': 2, 'scale': 1}),
+              PickTimeEvent('expon', mb.dists.expon, {'scale': 1})]
+    trial = mb.TrialType(name='trial', p=1, events=events)
+
+    np.random.seed(0)
+    _expected = np.random.random(3)
+    np.random.seed(0)
+    plans = [make_plan([trial], n_trials=20, iti=1, seed=seed)[0]
+             for seed in [1, 1, 2]]
+    assert np.array_equal(np.random.random(3), _expected), \
+        'make_plan() changed the global np.random state.'
+    for name in ['t_start_norm', 't_start_expon']:
+        assert np.array_equal(plans[0][name], plans[1][name]), \
+            f'{name} differs between plans with the same seed.'
+        assert not np.array_equal(plans[0][name], plans[2][name]), \
+            f'{name} is the same for plans with different seeds.'
+
+
+if __name__ == '__main__':
+    test_plan_seed()
+    print('Plans with the same seed draw the same times.')
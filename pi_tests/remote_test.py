@@ -0,0 +1,72 @@
+"""Checks RemoteStimulusClient against a StimulusServer running in this
+process on a local socket: loading and playing stimuli, reconnecting
+after the connection is closed, and remote errors.
+
+Runs without a second Raspberry Pi:
+python pi_tests/remote_test.py
+"""
+
+import socket
+import threading
+
+from mouseberry.tools.remote import RemoteStimulusClient, StimulusServer
+
+
+def _start_server():
+    """Starts a StimulusServer (with a player which exits immediately) on
+    a free local port, and returns the server, the port and the list of
+    keys it loaded.
+    """
+    with socket.socket() as _sock:
+        _sock.bind(('127.0.0.1', 0))
+        port = _sock.getsockname()[1]
+
+    server = StimulusServer(cmd='true {file}')
+    loaded = []
+    _load = server.load
+
+    def load(key, fname):
+        loaded.append(key)
+        _load(key, fname)
+    server.load = load
+
+    _ready = threading.Event()
+    threading.Thread(target=server.serve_socket,
+                     args=(port, '127.0.0.1', _ready), daemon=True).start()
+    _ready.wait()
+    return server, port, loaded
+
+
+def test_remote():
+    server, port, loaded = _start_server()
+    client = RemoteStimulusClient('127.0.0.1', transport='socket',
+                                  port=port, timeout=5, n_retries=2)
+
+    # the first load opens the connection, and is only sent once
+    t_latency = client.load('looming', 'looming.mp4')
+    assert t_latency > 0
+    assert loaded == ['looming']
+
+    assert client.play('looming', wait_done=True) > 0
+    assert client.play('looming') > 0
+
+    # a closed connection is reopened, and stimuli are loaded again
+    client.close()
+    assert client.play('looming', wait_done=True) > 0
+    assert loaded == ['looming', 'looming']
+
+    # remote errors are raised, and the connection stays usable
+    try:
+        client.play('unknown')
+    except RuntimeError as err:
+        assert 'Remote error' in str(err)
+    else:
+        raise AssertionError('Playing an unknown stimulus did not raise.')
+    assert client.play('looming', wait_done=True) > 0
+
+    client.close()
+
+
+if __name__ == '__main__':
+    test_remote()
+    print('The remote stimulus client works against a local server.')
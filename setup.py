@@ -8,9 +8,9 @@ setup(name='mouseberry',
       url='https://github.com/micllynn/mouseberry/',
       license='MIT',
       packages='mouseberry',
-      install_requires=['python>=3.6',
-                        'numpy',
-                        'scipy',
-                        'h5py>=2.10.0',
+      python_requires='>=3.8',
+      install_requires=['numpy>=1.17',
+                        'h5py>=3.0',
                         'RPi',
-                        'paramiko'])
+                        'paramiko',
+                        'sounddevice'])